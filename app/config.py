@@ -52,9 +52,43 @@ def add_server_config(app):
     app.config['pending_work_timeout'] = server_config.get('pending_work_timeout', 30)
     app.config['become_zombie_interval'] = server_config.get('become_zombie_interval', 120)
     app.config['mark_zombie_interval'] = server_config.get('mark_zombie_interval', 10)
-    app.config['check_work_interval'] = server_config.get('check_work_interval', 1)
+    app.config['run_work'] = server_config.get('run_work', True)
+    app.config['check_work_interval'] = server_config.get('check_work_interval', 30)
     app.config['max_parallel_work'] = server_config.get('max_parallel_work', 3)
+    app.config['max_parallel_lightweight_work'] = server_config.get('max_parallel_lightweight_work', 10)
     app.config['pause_between_keys'] = server_config.get('pause_between_keys', 5)
+    app.config['pause_between_chars'] = server_config.get('pause_between_chars', 0.2)
+    app.config['keystroke_pacing'] = server_config.get('keystroke_pacing', {})
+    app.config['park_sleep_threshold'] = server_config.get('park_sleep_threshold', 10)
+    app.config['screenshot_settle_window'] = server_config.get('screenshot_settle_window', 3)
+    app.config['screenshot_settle_timeout'] = server_config.get('screenshot_settle_timeout', 15)
+    app.config['screenshot_backend'] = server_config.get('screenshot_backend', 'webdriver')
+    app.config['console_session_ttl'] = server_config.get('console_session_ttl', 300)
+    app.config['max_console_sessions'] = server_config.get('max_console_sessions', 10)
+    app.config['max_console_work_batch'] = server_config.get('max_console_work_batch', 5)
+    app.config['standby_browsers'] = server_config.get('standby_browsers', 0)
+    app.config['browser_max_uses'] = server_config.get('browser_max_uses', 20)
+    app.config['browser_max_rss'] = server_config.get('browser_max_rss', 1024)
+    app.config['browser_pool_min_free_memory'] = server_config.get('browser_pool_min_free_memory', 512)
+    app.config['dedicated_displays'] = server_config.get('dedicated_displays', False)
+    app.config['first_display_number'] = server_config.get('first_display_number', 100)
+    app.config['display_resolution'] = server_config.get('display_resolution', '1960x1024x24')
+    app.config['display_vnc'] = server_config.get('display_vnc', False)
+    app.config['ipmi_backend'] = server_config.get('ipmi_backend', 'ipmitool')
+    app.config['ipmi_port'] = server_config.get('ipmi_port', 623)
+    app.config['ipmi_session_idle_timeout'] = server_config.get('ipmi_session_idle_timeout', 60)
+    app.config['bulk_ipmi_concurrency'] = server_config.get('bulk_ipmi_concurrency', 50)
+    app.config['http_connect_timeout'] = server_config.get('http_connect_timeout', 5)
+    app.config['http_read_timeout'] = server_config.get('http_read_timeout', 30)
+    app.config['http_pool_maxsize'] = server_config.get('http_pool_maxsize', 10)
+    app.config['ocr_cache_size'] = server_config.get('ocr_cache_size', 1024)
+    app.config['ocr_engine'] = server_config.get('ocr_engine', 'auto')
+    app.config['async_ocr'] = server_config.get('async_ocr', False)
+    app.config['ocr_workers'] = server_config.get('ocr_workers', os.cpu_count())
+    app.config['ocr_profiles'] = server_config.get('ocr_profiles', {})
+    app.config['incremental_ocr'] = server_config.get('incremental_ocr', False)
+    app.config['ocr_band_cache_size'] = server_config.get('ocr_band_cache_size', 8192)
+    app.config['duplicate_screenshot_max_distance'] = server_config.get('duplicate_screenshot_max_distance', -1)
 
 
 def configure_logging():
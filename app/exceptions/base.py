@@ -86,6 +86,18 @@ class ManualWorkMustHaveRuleOrActions(Error):
         self.message = message
 
 
+class BulkWorkMustHaveDeviceSelector(Error):
+    def __init__(self, message="Bulk Work must supply device uids, metadata or zombie to select devices"):
+        self.message = message
+
+
+class BulkWorkActionNotSupported(Error):
+    def __init__(self, name, action_type, message="Bulk Work only supports ipmitool and power actions"):
+        self.name = name
+        self.action_type = action_type
+        self.message = message
+
+
 class CredsNameNotFound(Error):
     def __init__(self, name, message="Creds not found by name"):
         self.name = name
@@ -150,3 +162,9 @@ class UnknownActionCredStoreValue(Error):
         self.name = name
         self.value = value
         self.message = message
+
+
+class KeystrokeIsInvalid(Error):
+    def __init__(self, key, message="The keystroke special key is unknown"):
+        self.key = key
+        self.message = message
@@ -60,3 +60,9 @@ class OpenConsoleError(ConsoleError):
     def __init__(self, error, message="Failed to find open console"):
         self.error = error
         self.message = message
+
+
+class FramebufferError(Error):
+    def __init__(self, error, message="Failed to read framebuffer"):
+        self.error = error
+        self.message = message
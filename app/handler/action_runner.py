@@ -1,17 +1,27 @@
-import re
 import time
-import base64
 import requests
 import subprocess
+from PIL import Image
 from flask import current_app as app
 from selenium.webdriver import ActionChains
-from selenium.webdriver.common.keys import Keys
 from subprocess import PIPE, CalledProcessError, TimeoutExpired
 
+import helpers.http as http_helper
+import helpers.image as image_helper
+import helpers.framebuffer as framebuffer_helper
+import helpers.keystroke as keystroke_helper
 import services.state as state_service
+import handler.ocr as ocr_handler
+import handler.ipmi as ipmi_handler
+import handler.browser_pool as browser_pool
+from exceptions.base import KeystrokeIsInvalid
 from exceptions.handler import ActionError, GetScreenshotError, SendScreenshotError, IpmitoolError, SleepError, KeystrokeError, HttpRequestError
 
 
+# How often frames are grabbed while waiting for the screen to settle, and how different they may be to count as the same
+SCREENSHOT_SETTLE_POLL_INTERVAL = 0.5
+SCREENSHOT_SETTLE_MAX_DIFFERENCE = 1.0
+
 model_to_interface_mapping = {
     'idrac9': 'lanplus',
     'ilo5': 'lanplus',
@@ -47,7 +57,7 @@ def run_action(*, action_type, action_data, device_data, browser):
 
 def run_request_action(*, action, device, browser):
     try:
-        res = requests.get(action)
+        res, timing = http_helper.get(action)
         res.raise_for_status()
     except requests.exceptions.HTTPError as err:
         app.logger.error(f"Recieved HTTP error: {err}")
@@ -64,7 +74,8 @@ def run_request_action(*, action, device, browser):
 
     return {
         'status_code': res.status_code,
-        'response': res.text
+        'response': res.text,
+        'timing': timing
     }
 
 
@@ -81,63 +92,51 @@ def run_sleep_action(*, action, device, browser):
 
 
 def run_keystroke_action(*, action, device, browser):
-    app.logger.debug(f"Running keystroke action of '{action}' on uid {device['uid']}")
-    key_combo_list = action.split(';')
-
-    for key_combo in key_combo_list:
-        action_chain = ActionChains(browser)
-
-        # Check if key combo includes special key followed by '+' (if so we will need to perform key_down logic)
-        special_keys_match = re.match(r'^keys.([a-z0-9_]+)(\+)?', key_combo, flags=re.IGNORECASE)
-
-        # No special keys
-        if special_keys_match is None:
-            for char in key_combo:
-                _add_char_to_action_chain(action_chain, char)
-
-        # special key without '+' - just press it
-        elif special_keys_match[2] is None:
-            try:
-                parsed_special_key = getattr(Keys, special_keys_match[1].upper())
-            except AttributeError as err:
-                raise KeystrokeError({
-                    "message": "Error while trying parse keystroke special key",
-                    "error": str(err)
-                })
-            action_chain.send_keys(parsed_special_key).pause(app.config.get('pause_between_keys'))
-
-        # special key with '+' - Hold down all keys, press last and release keys
-        else:
-            key_list = key_combo.split('+')
-            try:
-                parsed_key_list = [
-                    re.sub(r'keys.([a-z0-9_]+)(\+|$)', lambda m: getattr(Keys, m.group(1).upper()), key, flags=re.IGNORECASE)
-                    for key in key_list]
-            except AttributeError as err:
-                raise KeystrokeError({
-                    "message": "Error while trying parse keystroke special key",
-                    "error": str(err)
-                })
-
-            for idx in range(len(parsed_key_list) - 1):
-                action_chain.key_down(parsed_key_list[idx])
-
-            _add_char_to_action_chain(action_chain, parsed_key_list[-1])
-
-            for idx in range(len(parsed_key_list) - 1):
-                action_chain.key_up(parsed_key_list[idx])
-
-            action_chain.pause(app.config.get('pause_between_keys'))
-
-        action_chain.perform()
+    # Works pass the plan compiled from the stored action with the device's params, see work_service.get_assignment_for_claimed_work
+    if isinstance(action, tuple):
+        app.logger.debug(f"Running keystroke plan of {len(action)} steps on uid {device['uid']}")
+        plan = action
+    else:
+        app.logger.debug(f"Running keystroke action of '{action}' on uid {device['uid']}")
+        plan = _compile_keystroke_action(action)
+
+    # The whole action is sent to the browser in a single perform call
+    action_chain = keystroke_helper.add_plan_to_action_chain(ActionChains(browser), plan, keystroke_helper.get_pacing(device['model']))
+    action_chain.perform()
 
     return {}
 
 
+def _compile_keystroke_action(action):
+    # Not cached, the action data may already have rendered params in it
+    try:
+        return keystroke_helper.render_keystroke_plan(keystroke_helper.compile_keystroke_plan(action), lambda param: param)
+    except KeystrokeIsInvalid as err:
+        raise KeystrokeError({
+            "message": "Error while trying parse keystroke special key",
+            "error": f"{err.message}: '{err.key}'"
+        })
+
+
+def get_ipmitool_command(*, command_args, device):
+    interface = model_to_interface_mapping.get(device['model'].lower(), 'lan')
+    return ['ipmitool', '-H', device['ip'], '-p', str(app.config.get('ipmi_port')), '-U', device['username'], '-P', device['password'], '-I', interface] + command_args
+
+
+def uses_native_ipmi(*, command_args, device):
+    # The native client only speaks RMCP+ (lanplus), every other command or interface goes through the ipmitool binary
+    interface = model_to_interface_mapping.get(device['model'].lower(), 'lan')
+    return app.config.get('ipmi_backend') == 'native' and interface == 'lanplus' and ipmi_handler.is_supported_command(command_args)
+
+
 def run_ipmitool_action(*, action, device, browser):
     app.logger.debug(f"Running ipmitool action of '{action}' on uid {device['uid']}")
-    command = ['ipmitool', '-H', device['ip'], '-U', device['username'], '-P', device['password'], '-I', model_to_interface_mapping.get(device['model'].lower(), 'lan')]
-    command += action.split(' ')
+    command_args = action.split(' ')
+
+    if uses_native_ipmi(command_args=command_args, device=device):
+        return ipmi_handler.run_command(command_args=command_args, device=device)
+
+    command = get_ipmitool_command(command_args=command_args, device=device)
 
     try:
         result = subprocess.run(
@@ -186,22 +185,29 @@ def run_power_action(*, action, device, browser):
 
 def run_screenshot_action(*, action, device, browser):
     app.logger.debug(f"Running screenshot action for uid '{device['uid']}'")
-    time.sleep(15)
     try:
-        screenshot = browser.get_screenshot_as_png()
+        screenshot = wait_for_settled_screenshot(browser)
     except Exception as err:
         app.logger.error(f"Error while taking screenshot: {err}")
         raise GetScreenshotError({
             'message': 'Failed to get screenshot',
-            'error': err.strerror
+            'error': getattr(err, 'strerror', None) or str(err)
         })
 
     try:
-        state_service.create_or_update(
+        # A framebuffer capture is PNG encoded only for storing, OCR gets its pixels as they are
+        screenshot_image = None
+        if isinstance(screenshot, Image.Image):
+            screenshot_image, screenshot = screenshot, image_helper.encode_png(screenshot)
+
+        state, is_seen_again = state_service.create_or_update_from_screenshot(
             device_uid=device['uid'],
-            screenshot=base64.b64encode(screenshot).decode('ascii'),
+            screenshot=screenshot,
+            screenshot_image=screenshot_image,
             resolved=None
         )
+        if state.ocr_pending and not is_seen_again:
+            ocr_handler.submit_state_ocr(state)
     except Exception as err:
         app.logger.error(f"Error while sending screenshot to server: {err}")
         raise SendScreenshotError(err)
@@ -209,9 +215,44 @@ def run_screenshot_action(*, action, device, browser):
     return {}
 
 
-def _add_char_to_action_chain(action_chain, char):
-    regex_for_shift = re.compile(r'[~!@#$%^&*()_+|}{":?><A-Z]')
-    if regex_for_shift.search(char) is None:
-        action_chain.send_keys(char).pause(1)
-    else:
-        action_chain.key_down(Keys.SHIFT).send_keys(char).key_up(Keys.SHIFT).pause(1)
+def take_screenshot(browser):
+    """Returns the console viewport as PNG bytes from the browser, or as an image read from its display framebuffer"""
+    if app.config.get('screenshot_backend') == 'framebuffer':
+        display = browser_pool.get_display(browser)
+        if display is not None and display.framebuffer_path is not None:
+            return framebuffer_helper.read_xwd_image(display.framebuffer_path, box=_get_viewport_box(browser))
+
+    return browser.get_screenshot_as_png()
+
+
+def _get_viewport_box(browser):
+    # The position of the page viewport on the screen, in device pixels
+    left, upper, width, height, pixel_ratio = browser.execute_script(
+        "return [window.mozInnerScreenX, window.mozInnerScreenY, window.innerWidth, window.innerHeight, window.devicePixelRatio]"
+    )
+    return tuple(round(value * pixel_ratio) for value in (left, upper, left + width, upper + height))
+
+
+def wait_for_settled_screenshot(browser):
+    """Returns a screenshot once the screen did not change for screenshot_settle_window seconds.
+
+    If the screen keeps changing, the last screenshot is returned after screenshot_settle_timeout seconds.
+    """
+    settle_window = app.config.get('screenshot_settle_window')
+    timeout_timestamp = time.monotonic() + app.config.get('screenshot_settle_timeout')
+
+    screenshot = take_screenshot(browser)
+    fingerprint = image_helper.get_frame_fingerprint(screenshot)
+    settled_since = time.monotonic()
+    while time.monotonic() - settled_since < settle_window and time.monotonic() < timeout_timestamp:
+        time.sleep(SCREENSHOT_SETTLE_POLL_INTERVAL)
+        screenshot = take_screenshot(browser)
+        new_fingerprint = image_helper.get_frame_fingerprint(screenshot)
+        if image_helper.get_frame_difference(fingerprint, new_fingerprint) > SCREENSHOT_SETTLE_MAX_DIFFERENCE:
+            settled_since = time.monotonic()
+        fingerprint = new_fingerprint
+
+    if time.monotonic() - settled_since < settle_window:
+        app.logger.debug(f"Screen did not settle within {app.config.get('screenshot_settle_timeout')} seconds, using the last screenshot")
+
+    return screenshot
@@ -0,0 +1,227 @@
+import os
+import atexit
+import threading
+from collections import deque
+from flask import current_app as app
+from selenium import webdriver
+
+import handler.display_pool as display_pool
+
+
+# Seconds between refills when no browser was taken meanwhile
+REFILL_INTERVAL = 30
+
+# Blank browsers ready to be used for a console, oldest first
+_standby_browsers = deque()
+# Number of consoles each launched browser was used for, by browser
+_use_counts = {}
+# The dedicated display of each launched browser, when dedicated_displays is set
+_displays = {}
+_lock = threading.Lock()
+_refill_event = threading.Event()
+_refill_thread = None
+
+
+def launch_browser():
+    if not app.config.get('dedicated_displays'):
+        return webdriver.Firefox(service_log_path=os.devnull)
+
+    # Firefox takes its display when it starts, so each browser keeps its display until it quits
+    display = display_pool.acquire()
+    options = webdriver.FirefoxOptions()
+    options.set_capability('moz:firefoxOptions', {'env': {'DISPLAY': display.name}})
+    try:
+        browser = webdriver.Firefox(options=options, service_log_path=os.devnull)
+    except Exception:
+        display_pool.release(display)
+        raise
+
+    with _lock:
+        _displays[browser] = display
+
+    return browser
+
+
+def get_display(browser):
+    """Returns the dedicated display of the browser, or None when it uses the shared display"""
+    with _lock:
+        return _displays.get(browser)
+
+
+def start(a_app):
+    """Starts refilling the pool to standby_browsers blank browsers in the background"""
+    global _refill_thread
+    if _refill_thread is not None or a_app.config.get('standby_browsers') <= 0:
+        return
+
+    _refill_thread = threading.Thread(target=_refill_forever, args=[a_app], name='browser-pool', daemon=True)
+    _refill_thread.start()
+    atexit.register(close_all)
+
+
+def take():
+    """Returns a blank browser, launching one when no standby browser is ready"""
+    with _lock:
+        browser = _standby_browsers.popleft() if _standby_browsers else None
+
+    _refill_event.set()
+    if browser is not None:
+        app.logger.debug("Using a standby browser")
+        return browser
+
+    browser = launch_browser()
+    with _lock:
+        _use_counts[browser] = 0
+
+    return browser
+
+
+def give_back(browser):
+    """Resets the browser and keeps it as a standby browser, or quits it once it should be recycled"""
+    with _lock:
+        _use_counts[browser] = _use_counts.get(browser, 0) + 1
+        use_count = _use_counts[browser]
+
+    if use_count >= app.config.get('browser_max_uses'):
+        app.logger.debug(f"Recycling browser after {use_count} uses")
+        _quit(browser)
+        return
+
+    rss = _get_browser_rss(browser)
+    if rss > app.config.get('browser_max_rss'):
+        app.logger.debug(f"Recycling browser using {rss:.0f}MB")
+        _quit(browser)
+        return
+
+    try:
+        _reset_browser(browser)
+    except Exception as err:
+        app.logger.warning(f"Failed to reset browser: {err}")
+        _quit(browser)
+        return
+
+    with _lock:
+        if len(_standby_browsers) < app.config.get('standby_browsers'):
+            _standby_browsers.append(browser)
+            return
+
+    _quit(browser)
+
+
+def discard(browser):
+    """Quits a browser that may be left in a bad state (e.g. by a failed console login), instead of keeping it"""
+    _quit(browser)
+
+
+def refill(a_app):
+    with a_app.app_context():
+        while True:
+            with _lock:
+                if len(_standby_browsers) >= app.config.get('standby_browsers'):
+                    return
+
+            free_memory = _get_free_memory()
+            if free_memory is not None and free_memory < app.config.get('browser_pool_min_free_memory'):
+                app.logger.debug(f"Not launching a standby browser, only {free_memory:.0f}MB of memory is free")
+                return
+
+            try:
+                browser = launch_browser()
+            except Exception as err:
+                app.logger.warning(f"Failed to launch a standby browser: {err}")
+                return
+
+            with _lock:
+                _use_counts[browser] = 0
+                _standby_browsers.append(browser)
+
+
+def close_all():
+    with _lock:
+        closing_list = list(_standby_browsers)
+        _standby_browsers.clear()
+
+    for browser in closing_list:
+        _quit(browser)
+
+
+def _refill_forever(a_app):
+    while True:
+        refill(a_app)
+        _refill_event.wait(timeout=REFILL_INTERVAL)
+        _refill_event.clear()
+
+
+def _reset_browser(browser):
+    # Leave a single blank window without the previous console's cookies and storage
+    for window_handle in browser.window_handles[1:]:
+        browser.switch_to.window(window_handle)
+        browser.close()
+    browser.switch_to.window(browser.window_handles[0])
+    browser.switch_to.default_content()
+    browser.execute_script("try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (err) {}")
+    browser.delete_all_cookies()
+    browser.get('about:blank')
+
+
+def _quit(browser):
+    with _lock:
+        _use_counts.pop(browser, None)
+        display = _displays.pop(browser, None)
+
+    try:
+        browser.quit()
+    except Exception as err:
+        app.logger.warning(f"Failed to quit browser: {err}")
+
+    if display is not None:
+        display_pool.release(display)
+
+
+def _get_free_memory():
+    """Returns the available memory in MB, or None when it is unknown"""
+    try:
+        with open('/proc/meminfo') as meminfo_file:
+            for line in meminfo_file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+
+def _get_browser_rss(browser):
+    """Returns the RSS in MB of geckodriver and the Firefox processes under it, or 0 when it is unknown"""
+    try:
+        driver_pid = browser.service.process.pid
+    except AttributeError:
+        return 0
+
+    try:
+        proc_name_list = os.listdir('/proc')
+    except OSError:
+        return 0
+
+    children_by_pid = {}
+    for pid in filter(str.isdigit, proc_name_list):
+        try:
+            with open(f"/proc/{pid}/stat") as stat_file:
+                # the process name may include spaces, the fields after it are separated by spaces
+                parent_pid = int(stat_file.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children_by_pid.setdefault(parent_pid, []).append(int(pid))
+
+    rss_pages = 0
+    pid_list = [driver_pid]
+    while pid_list:
+        pid = pid_list.pop()
+        pid_list += children_by_pid.get(pid, [])
+        try:
+            with open(f"/proc/{pid}/statm") as statm_file:
+                rss_pages += int(statm_file.read().split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+
+    return rss_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
@@ -0,0 +1,158 @@
+import time
+import asyncio
+import threading
+from flask import current_app as app
+from concurrent.futures import ThreadPoolExecutor
+
+import services.work as work_service
+import services.execution as execution_service
+
+import handler.ipmi as ipmi_handler
+import handler.action_runner as action_runner
+from exceptions.handler import ActionError
+
+
+# Action types the bulk executor can run, by how their data maps to ipmitool arguments
+action_type_to_command_args_mapping = {
+    'ipmitool': lambda action_data: action_data.split(' '),
+    'power': lambda action_data: ['power', action_data]
+}
+
+
+def start_bulk_work(work_id_list):
+    threading.Thread(
+        target=run_bulk_work,
+        args=(app._get_current_object(), work_id_list),
+        name='bulk-work',
+        daemon=True
+    ).start()
+
+
+def run_bulk_work(a_app, work_id_list):
+    """Runs claimed single action IPMI works concurrently, bounded by bulk_ipmi_concurrency"""
+    with a_app.app_context():
+        assignment_list = []
+        for work_id in work_id_list:
+            try:
+                assignment = work_service.get_assignment_for_claimed_work(work_service.get_by_id(work_id))
+            except Exception as err:
+                app.logger.error(f"Failed to get assignment of bulk work '{work_id}': {err}")
+                _fail_work(work_id)
+                continue
+
+            if assignment:
+                assignment_list.append(assignment)
+
+        app.logger.info(f"Running {len(assignment_list)} bulk works")
+        start_time = time.time()
+        asyncio.run(_run_assignments(assignment_list))
+        app.logger.info(f"Completed {len(assignment_list)} bulk works in {time.time() - start_time:.2f} seconds")
+
+
+async def _run_assignments(assignment_list):
+    concurrency = app.config.get('bulk_ipmi_concurrency')
+    semaphore = asyncio.Semaphore(concurrency)
+    # Native IPMI commands block, so they run on these threads, bounded by the same semaphore as the ipmitool processes
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='bulk-ipmi') as executor:
+        await asyncio.gather(*[_run_assignment(semaphore, executor, assignment) for assignment in assignment_list])
+
+
+async def _run_assignment(semaphore, executor, assignment):
+    # A failing work must not cancel the works of the other devices, which gather would do
+    try:
+        await _run_ipmi_assignment(semaphore, executor, assignment)
+    except Exception as err:
+        app.logger.error(f"Failed to run bulk work '{assignment['work_id']}': {err}")
+        _fail_work(assignment['work_id'])
+
+
+async def _run_ipmi_assignment(semaphore, executor, assignment):
+    action = assignment['action_list'][0]
+    command_args = action_type_to_command_args_mapping[action['type']](action['data'])
+    device = assignment['device_data']
+    async with semaphore:
+        start_time = time.time()
+        if action_runner.uses_native_ipmi(command_args=command_args, device=device):
+            action_run_status, action_run_data = await asyncio.get_running_loop().run_in_executor(
+                executor, _run_native_ipmi, app._get_current_object(), command_args, device
+            )
+        else:
+            action_run_status, action_run_data = await _run_ipmitool(command_args=command_args, device=device)
+        elapsed_time = time.time() - start_time
+
+    # DB writes run on the event loop thread, between the IPMI commands
+    execution_service.create(
+        work_id=assignment['work_id'],
+        state_id=assignment['state_id'],
+        trigger=assignment['trigger'],
+        action_name=action['name'],
+        status=action_run_status,
+        run_data=action_run_data,
+        elapsed_time=elapsed_time
+    )
+    work_service.complete_by_id(
+        work_id=assignment['work_id'],
+        status=action_run_status
+    )
+
+
+def _fail_work(work_id):
+    try:
+        # the session may be left in a failed transaction by the error
+        app.session.rollback()
+        work_service.complete_by_id(
+            work_id=work_id,
+            status='failure'
+        )
+    except Exception as err:
+        app.logger.error(f"Failed to mark bulk work '{work_id}' as failed: {err}")
+
+
+def _run_native_ipmi(a_app, command_args, device):
+    with a_app.app_context():
+        try:
+            return 'success', ipmi_handler.run_command(command_args=command_args, device=device)
+        except ActionError as err:
+            return 'failure', err.error
+
+
+async def _run_ipmitool(*, command_args, device):
+    command = action_runner.get_ipmitool_command(command_args=command_args, device=device)
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+    except OSError as err:
+        app.logger.error(f"Recieved OS error on bulk ipmitool command: {err}")
+        return 'failure', {
+            "message": "OS error",
+            "error": err.strerror
+        }
+
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=30)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        app.logger.error(f"Recieved timeout on bulk ipmitool command for uid '{device['uid']}'")
+        return 'failure', {
+            "message": "Timeout error",
+            "error": "ipmitool did not complete within 30 seconds"
+        }
+
+    stdout = stdout.decode('utf-8')
+    stderr = stderr.decode('utf-8')
+    if process.returncode != 0:
+        app.logger.error(f"Recieved non-zero return code on bulk ipmitool command for uid '{device['uid']}'")
+        return 'failure', {
+            "message": "Exit status error",
+            "stdout": stdout,
+            "stderr": stderr
+        }
+
+    return 'success', {
+        "stdout": stdout,
+        "stderr": stderr
+    }
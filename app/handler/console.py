@@ -1,7 +1,6 @@
-import os
 import time
+from collections import namedtuple
 from flask import current_app as app
-from selenium import webdriver
 from selenium.webdriver import ActionChains
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
@@ -9,38 +8,37 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 
+import helpers.metrics as metrics_helper
+import handler.browser_pool as browser_pool
+import handler.action_runner as action_runner
+
 from exceptions.handler import ModelNotSupportedError, OpenConsoleError
 
 
-def open_console(*, uid, ip, username, password, model):
-    model_to_func_mapping = {
-        'idrac9': open_console_for_idrac9,
-        'ilo5': open_console_for_ilo5,
-        'ilo4': open_console_for_ilo4,
-        'x10': open_console_for_x10,
-        'xcc': open_console_for_xcc,
-        'imm2': open_console_for_imm2
-    }
+# A step of a console login recipe - runs 'act' (if any) and then waits up to 'timeout' seconds for the 'wait_for' condition (if any).
+# The login fails with 'timeout_error' when the condition is not met in time, or goes on to the next step when 'timeout_error' is None
+LoginStep = namedtuple('LoginStep', ['name', 'act', 'wait_for', 'timeout', 'timeout_error'])
 
-    if model.lower() not in model_to_func_mapping:
+
+def open_console(*, uid, ip, username, password, model):
+    if model.lower() not in model_to_login_recipe_mapping:
         raise ModelNotSupportedError(f"Model '{model}' is not supported")
 
     app.logger.debug(f"Openning conosle to device with IP '{ip}'")
-    browser = webdriver.Firefox(service_log_path=os.devnull)
+    browser = browser_pool.take()
 
     try:
-        model_to_func_mapping[model.lower()](
-            ip=ip,
-            username=username,
-            password=password,
+        _run_login_recipe(
+            model=model.lower(),
+            creds={'ip': ip, 'username': username, 'password': password},
             browser=browser
         )
     except WebDriverException as err:
-        browser.quit()
+        browser_pool.discard(browser)
         app.logger.error(f"WebDriverException caught while trying to open console: {err}")
         raise OpenConsoleError(err.msg)
     except Exception as err:
-        browser.quit()
+        browser_pool.discard(browser)
         app.logger.error(f"Exception caught while trying to open console: {err}")
         raise OpenConsoleError(str(err))
 
@@ -65,370 +63,283 @@ def close_console(*, browser, model):
             app.logger.error(f"Exception caught while trying to logout: {err}")
 
     app.logger.debug(f"Closing conosle to device")
-    browser.quit()
+    browser_pool.give_back(browser)
 
 
-def open_console_for_idrac9(*, ip, username, password, browser):
-    url = f'https://{ip}/restgui/start.html?console'
-    browser.get(url)
+def get_login_step_timing():
+    """Returns the latency histogram of every console login step, by model and step"""
+    return {
+        model: {step_name: histogram.to_dict() for step_name, histogram in step_timing.items()}
+        for model, step_timing in _login_step_timing.items()
+    }
 
-    try:
-        WebDriverWait(browser, 30).until(EC.visibility_of_element_located((By.NAME, "username")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to see username input element after 30s")
 
-    browser.find_element_by_name('username').send_keys(username)
-    browser.find_element_by_name('password').send_keys(password)
+def _run_login_recipe(*, model, creds, browser):
+    for step in model_to_login_recipe_mapping[model]:
+        start_time = time.monotonic()
+        if step.act is not None:
+            step.act(browser, creds)
 
-    try:
-        WebDriverWait(browser, 30).until(EC.presence_of_element_located((By.CSS_SELECTOR, "button.cux-button")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get login button clickable after 30s")
+        if step.wait_for is not None:
+            try:
+                WebDriverWait(browser, step.timeout).until(step.wait_for)
+            except TimeoutException:
+                if step.timeout_error is not None:
+                    raise OpenConsoleError(step.timeout_error)
+                app.logger.debug(f"Console login step '{step.name}' did not see its condition after {step.timeout}s, going on")
 
-    time.sleep(5)
-    browser.find_element_by_css_selector('button.cux-button').click()
+        elapsed_time = time.monotonic() - start_time
+        _login_step_timing[model][step.name].observe(elapsed_time)
+        app.logger.debug(f"Console login step '{step.name}' took {elapsed_time:.2f}s")
 
-    try:
-        WebDriverWait(browser, 60).until(lambda browser: len(browser.window_handles) == 2)
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get new console window after 60s")
 
-    browser.switch_to.window(browser.window_handles[1])
-    browser.maximize_window()
+def _console_canvas_has_frame(browser):
+    # KVM viewers resize their canvas to the remote screen resolution once the first frame arrives (a blank canvas is 300x150)
+    return browser.execute_script(
+        "return Array.from(document.getElementsByTagName('canvas')).some(canvas => canvas.width * canvas.height > 300 * 150)"
+    )
 
-    try:
-        WebDriverWait(browser, 60).until(EC.title_contains("FPS:"))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get console viewer opened after 60s")
 
-    time.sleep(5)
-    body = browser.find_element_by_tag_name('body')
-    body.send_keys(Keys.SHIFT)
-    time.sleep(5)
+def _acquire_button_is_visible(browser):
+    return any(button.is_displayed() for button in browser.find_elements_by_xpath("//button[contains(text(), 'Acquire')]"))
 
 
-def open_console_for_ilo5(*, ip, username, password, browser):
-    url = f'https://{ip}/'
-    browser.get(url)
+def _check_console_is_free(browser, creds):
+    if _acquire_button_is_visible(browser):
+        raise OpenConsoleError("Console session already opened by someone else")
 
-    try:
-        WebDriverWait(browser, 30).until(EC.visibility_of_element_located((By.NAME, "appFrame")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to see login iframe element after 30s")
 
-    browser.switch_to.frame(browser.find_element_by_name('appFrame'))
+def _switch_to_console_window(browser, creds):
+    browser.switch_to.window(browser.window_handles[1])
 
-    try:
-        WebDriverWait(browser, 30).until(EC.visibility_of_element_located((By.ID, "username")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to see username input element after 30s")
 
-    try:
-        WebDriverWait(browser, 30).until(EC.element_to_be_clickable((By.ID, "login-form__submit")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get login button clickable after 30s")
+def _maximize_window(browser, creds):
+    browser.maximize_window()
 
-    browser.find_element_by_id('username').send_keys(username)
-    browser.find_element_by_id('password').send_keys(password)
-    browser.find_element_by_id('login-form__submit').click()
 
-    try:
-        WebDriverWait(browser, 30).until(EC.element_to_be_clickable((By.ID, "tabset_rc")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to see console navigation element after 30s")
+def _wake_console(element_locator=None):
+    """Returns a step action that presses shift on the console (or on the given element) and waits for the screen to settle"""
+    def wake_console(browser, creds):
+        if element_locator is None:
+            ActionChains(browser).key_down(Keys.SHIFT).key_up(Keys.SHIFT).pause(1).perform()
+        else:
+            browser.find_element(*element_locator).send_keys(Keys.SHIFT)
+        action_runner.wait_for_settled_screenshot(browser)
 
-    browser.find_element_by_id('tabset_rc').click()
-    browser.switch_to.frame(browser.find_element_by_name('iframeContent'))
+    return wake_console
 
-    try:
-        WebDriverWait(browser, 30).until(EC.element_to_be_clickable((By.ID, "HRCEXTButton")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to see open console in new windown element after 30s")
 
-    browser.find_element_by_id('HRCEXTButton').click()
+def _fill_idrac9_login(browser, creds):
+    browser.find_element_by_name('username').send_keys(creds['username'])
+    browser.find_element_by_name('password').send_keys(creds['password'])
 
-    try:
-        WebDriverWait(browser, 60).until(lambda browser: len(browser.window_handles) == 2)
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get new console window after 60s")
 
+def _switch_to_idrac9_console_window(browser, creds):
     browser.switch_to.window(browser.window_handles[1])
-
-    try:
-        WebDriverWait(browser, 10).until(EC.visibility_of_element_located((By.XPATH, "//button[contains(text(), 'Acquire')]")))
-    except TimeoutException:
-        pass
-    else:
-        raise OpenConsoleError("Console session already opened by someone else")
-
     browser.maximize_window()
-    time.sleep(5)
-    body = browser.find_element_by_tag_name('body')
-    body.send_keys(Keys.SHIFT)
-    time.sleep(5)
 
 
-def open_console_for_ilo4(*, ip, username, password, browser):
-    url = f'https://{ip}/'
-    browser.get(url)
+idrac9_login_recipe = [
+    LoginStep('open_login_page', lambda browser, creds: browser.get(f"https://{creds['ip']}/restgui/start.html?console"),
+              EC.visibility_of_element_located((By.NAME, "username")), 30, "Failed to see username input element after 30s"),
+    LoginStep('fill_login', _fill_idrac9_login,
+              EC.element_to_be_clickable((By.CSS_SELECTOR, "button.cux-button")), 30, "Failed to get login button clickable after 30s"),
+    LoginStep('login', lambda browser, creds: browser.find_element_by_css_selector('button.cux-button').click(),
+              lambda browser: len(browser.window_handles) == 2, 60, "Failed to get new console window after 60s"),
+    LoginStep('open_console_window', _switch_to_idrac9_console_window,
+              EC.title_contains("FPS:"), 60, "Failed to get console viewer opened after 60s"),
+    LoginStep('wait_for_frame', None,
+              _console_canvas_has_frame, 30, "Failed to get console frame after 30s"),
+    LoginStep('wake_console', _wake_console((By.TAG_NAME, 'body')), None, None, None)
+]
 
-    try:
-        WebDriverWait(browser, 30).until(EC.visibility_of_element_located((By.NAME, "appFrame")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to see main app iframe element after 30s")
 
+def _switch_to_ilo_app_frame(browser, creds):
     browser.switch_to.frame(browser.find_element_by_name('appFrame'))
 
-    try:
-        WebDriverWait(browser, 30).until(EC.visibility_of_element_located((By.ID, "usernameInput")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to see username input element after 30s")
-
-    try:
-        WebDriverWait(browser, 30).until(EC.element_to_be_clickable((By.ID, "ID_LOGON")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get login button clickable after 30s")
 
-    browser.find_element_by_id('usernameInput').send_keys(username)
-    browser.find_element_by_id('passwordInput').send_keys(password)
-    browser.find_element_by_id('ID_LOGON').click()
+def _login_to_ilo5(browser, creds):
+    browser.find_element_by_id('username').send_keys(creds['username'])
+    browser.find_element_by_id('password').send_keys(creds['password'])
+    browser.find_element_by_id('login-form__submit').click()
 
-    try:
-        WebDriverWait(browser, 30).until(EC.visibility_of_element_located((By.ID, "frameContent")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to see content frame element after 30s")
 
-    browser.switch_to.frame(browser.find_element_by_id('frameContent'))
+def _open_ilo5_remote_console_tab(browser, creds):
+    browser.find_element_by_id('tabset_rc').click()
+    browser.switch_to.frame(browser.find_element_by_name('iframeContent'))
 
-    try:
-        WebDriverWait(browser, 30).until(EC.visibility_of_element_located((By.ID, "iframeContent")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to see content iframe element after 30s")
 
-    browser.switch_to.frame(browser.find_element_by_id('iframeContent'))
+ilo5_login_recipe = [
+    LoginStep('open_login_page', lambda browser, creds: browser.get(f"https://{creds['ip']}/"),
+              EC.visibility_of_element_located((By.NAME, "appFrame")), 30, "Failed to see login iframe element after 30s"),
+    LoginStep('open_login_frame', _switch_to_ilo_app_frame,
+              EC.visibility_of_element_located((By.ID, "username")), 30, "Failed to see username input element after 30s"),
+    LoginStep('wait_for_login_button', None,
+              EC.element_to_be_clickable((By.ID, "login-form__submit")), 30, "Failed to get login button clickable after 30s"),
+    LoginStep('login', _login_to_ilo5,
+              EC.element_to_be_clickable((By.ID, "tabset_rc")), 30, "Failed to see console navigation element after 30s"),
+    LoginStep('open_remote_console_tab', _open_ilo5_remote_console_tab,
+              EC.element_to_be_clickable((By.ID, "HRCEXTButton")), 30, "Failed to see open console in new windown element after 30s"),
+    LoginStep('launch_console', lambda browser, creds: browser.find_element_by_id('HRCEXTButton').click(),
+              lambda browser: len(browser.window_handles) == 2, 60, "Failed to get new console window after 60s"),
+    LoginStep('open_console_window', _switch_to_console_window,
+              lambda browser: _acquire_button_is_visible(browser) or _console_canvas_has_frame(browser), 10, None),
+    LoginStep('check_console_is_free', _check_console_is_free, None, None, None),
+    LoginStep('wait_for_console_frame', None, _console_canvas_has_frame, 30, None),
+    LoginStep('maximize_window', _maximize_window, None, None, None),
+    LoginStep('wake_console', _wake_console((By.TAG_NAME, 'body')), None, None, None)
+]
+
+
+def _login_to_ilo4(browser, creds):
+    browser.find_element_by_id('usernameInput').send_keys(creds['username'])
+    browser.find_element_by_id('passwordInput').send_keys(creds['password'])
+    browser.find_element_by_id('ID_LOGON').click()
 
-    try:
-        WebDriverWait(browser, 30).until(EC.element_to_be_clickable((By.ID, "html5_irc_label")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get html5 irc element clickable after 30s")
 
+def _launch_ilo4_console(browser, creds):
     browser.find_element_by_xpath("//span[@id='html5_irc_label']/a").click()
-
     browser.switch_to.default_content()
     browser.switch_to.frame(browser.find_element_by_name('appFrame'))
 
-    try:
-        WebDriverWait(browser, 10).until(EC.visibility_of_element_located((By.XPATH, "//button[contains(text(), 'Acquire')]")))
-    except TimeoutException:
-        pass
-    else:
-        raise OpenConsoleError("Console session already opened by someone else")
-
-    try:
-        WebDriverWait(browser, 30).until(EC.element_to_be_clickable((By.XPATH, "//div[@langkey='IRC.label.maximize']")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to see get the maximize button clicakble after 30s")
 
+def _maximize_ilo4_console(browser, creds):
     browser.find_element_by_xpath("//div[@langkey='IRC.label.maximize']").click()
-
     browser.maximize_window()
 
-    time.sleep(5)
-    body = browser.find_element_by_id('rc_video')
-    body.send_keys(Keys.SHIFT)
-    time.sleep(5)
-
-
-def open_console_for_x10(*, ip, username, password, browser):
-    url = f'https://{ip}/'
-    browser.get(url)
-
-    try:
-        WebDriverWait(browser, 30).until(EC.visibility_of_element_located((By.NAME, "name")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to see username input element after 30s")
-
-    try:
-        WebDriverWait(browser, 30).until(EC.visibility_of_element_located((By.NAME, "pwd")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to see password input element after 30s")
 
-    try:
-        WebDriverWait(browser, 30).until(EC.element_to_be_clickable((By.ID, "login_word")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get login button clickable after 30s")
-
-    browser.find_element_by_name('pwd').send_keys(password)
-    browser.find_element_by_name('name').send_keys(username)
+ilo4_login_recipe = [
+    LoginStep('open_login_page', lambda browser, creds: browser.get(f"https://{creds['ip']}/"),
+              EC.visibility_of_element_located((By.NAME, "appFrame")), 30, "Failed to see main app iframe element after 30s"),
+    LoginStep('open_login_frame', _switch_to_ilo_app_frame,
+              EC.visibility_of_element_located((By.ID, "usernameInput")), 30, "Failed to see username input element after 30s"),
+    LoginStep('wait_for_login_button', None,
+              EC.element_to_be_clickable((By.ID, "ID_LOGON")), 30, "Failed to get login button clickable after 30s"),
+    LoginStep('login', _login_to_ilo4,
+              EC.visibility_of_element_located((By.ID, "frameContent")), 30, "Failed to see content frame element after 30s"),
+    LoginStep('open_content_frame', lambda browser, creds: browser.switch_to.frame(browser.find_element_by_id('frameContent')),
+              EC.visibility_of_element_located((By.ID, "iframeContent")), 30, "Failed to see content iframe element after 30s"),
+    LoginStep('open_content_iframe', lambda browser, creds: browser.switch_to.frame(browser.find_element_by_id('iframeContent')),
+              EC.element_to_be_clickable((By.ID, "html5_irc_label")), 30, "Failed to get html5 irc element clickable after 30s"),
+    LoginStep('launch_console', _launch_ilo4_console,
+              lambda browser: _acquire_button_is_visible(browser) or EC.element_to_be_clickable((By.XPATH, "//div[@langkey='IRC.label.maximize']"))(browser),
+              10, None),
+    LoginStep('check_console_is_free', _check_console_is_free, None, None, None),
+    LoginStep('wait_for_maximize_button', None,
+              EC.element_to_be_clickable((By.XPATH, "//div[@langkey='IRC.label.maximize']")), 30, "Failed to see get the maximize button clicakble after 30s"),
+    LoginStep('maximize_console', _maximize_ilo4_console, None, None, None),
+    LoginStep('wait_for_console_frame', None, _console_canvas_has_frame, 30, None),
+    LoginStep('wake_console', _wake_console((By.ID, 'rc_video')), None, None, None)
+]
+
+
+def _login_to_x10(browser, creds):
+    browser.find_element_by_name('pwd').send_keys(creds['password'])
+    browser.find_element_by_name('name').send_keys(creds['username'])
     browser.find_element_by_id('login_word').click()
 
-    try:
-        WebDriverWait(browser, 30).until(EC.visibility_of_element_located((By.ID, "TOPMENU")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to see main frame")
-
-    browser.switch_to.frame(browser.find_element_by_id("TOPMENU"))
-
-    try:
-        WebDriverWait(browser, 30).until(EC.element_to_be_clickable((By.ID, "remote")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get Remote Control tab clickable after 30s")
-
-    browser.find_element_by_id("remote").click()
-
-    try:
-        WebDriverWait(browser, 30).until(EC.element_to_be_clickable((By.XPATH, "//a[contains(text(), 'iKVM/HTML5')]")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get Remote Control tab clickable after 30s")
-
-    browser.find_element_by_xpath("//a[contains(text(), 'iKVM/HTML5')]").click()
-
-    try:
-        WebDriverWait(browser, 30).until(EC.visibility_of_element_located((By.ID, "frame_main")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to see iKVM frame after 30s")
-
-    browser.switch_to.frame(browser.find_element_by_id("frame_main"))
-
-    try:
-        WebDriverWait(browser, 30).until(EC.element_to_be_clickable((By.XPATH, "//input[@value='iKVM/HTML5']")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get iKVM button clickable after 30s")
-
-    browser.find_element_by_xpath("//input[@value='iKVM/HTML5']").click()
-
-    try:
-        WebDriverWait(browser, 60).until(lambda browser: len(browser.window_handles) == 2)
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get new console window after 60s")
-
-    browser.switch_to.window(browser.window_handles[1])
-
-    try:
-        WebDriverWait(browser, 30).until(EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Close')]")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get recording warning close button clickable after 30s")
 
+def _close_x10_recording_warning(browser, creds):
     browser.find_element_by_xpath("//button[contains(text(), 'Close')]").click()
-
     browser.maximize_window()
 
-    time.sleep(5)
-    body = browser.find_element_by_tag_name('body')
-    body.send_keys(Keys.SHIFT)
-    time.sleep(5)
-
-
-def open_console_for_xcc(*, ip, username, password, browser):
-    url = f'https://{ip}/'
-    browser.get(url)
-
-    try:
-        WebDriverWait(browser, 30).until(EC.visibility_of_element_located((By.ID, "login_username")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to see username input element after 30s")
-
-    browser.find_element_by_id('login_username').send_keys(username)
-    browser.find_element_by_id('login_password').send_keys(password)
-
-    try:
-        WebDriverWait(browser, 30).until(EC.element_to_be_clickable((By.ID, "login_right_submit_btn")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get login button clickable after 30s")
-
-    browser.find_element_by_id('login_right_submit_btn').click()
-
-    try:
-        WebDriverWait(browser, 30).until(EC.element_to_be_clickable((By.ID, "clickAndRunIcon")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get console launch button clickable after 30s")
-
-    browser.find_element_by_id('clickAndRunIcon').click()
-
-    try:
-        WebDriverWait(browser, 30).until(EC.element_to_be_clickable((By.XPATH, "//span[contains(text(), 'Launch Remote Console')]")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get console launch details button clickable after 30s")
-
-    browser.find_element_by_xpath("//span[contains(text(), 'Launch Remote Console')]").click()
-
-    try:
-        WebDriverWait(browser, 60).until(lambda browser: len(browser.window_handles) == 2)
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get new console window after 60s")
-
-    browser.switch_to.window(browser.window_handles[1])
-
-    try:
-        WebDriverWait(browser, 30).until(EC.visibility_of_element_located((By.ID, "canvasdiv")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to see console canvas after 30s")
-
-    browser.maximize_window()
-
-    time.sleep(5)
-    action_chain = ActionChains(browser)
-    action_chain.key_down(Keys.SHIFT).key_up(Keys.SHIFT).pause(1).perform()
-    time.sleep(5)
-
-
-def open_console_for_imm2(*, ip, username, password, browser):
-    url = f'https://{ip}/'
-    browser.get(url)
-
-    try:
-        WebDriverWait(browser, 30).until(EC.invisibility_of_element((By.XPATH, "//span[contains(text(), 'web server is initializing')]")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get web server initialization after 30s")
-
-    browser.find_element_by_id('user').send_keys(username)
-    browser.find_element_by_id('password').send_keys(password)
-
-    try:
-        WebDriverWait(browser, 30).until(EC.element_to_be_clickable((By.ID, "btnLogin")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get login button clickable after 30s")
-
-    browser.find_element_by_id('btnLogin').click()
-
-    try:
-        WebDriverWait(browser, 60).until(EC.element_to_be_clickable((By.ID, "btnRemoteConsoleHealthSumm_label")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get remote contorl button clickable after 60s")
-
-    browser.find_element_by_id('btnRemoteConsoleHealthSumm_label').click()
-
-    try:
-        WebDriverWait(browser, 30).until(EC.element_to_be_clickable((By.ID, "btnMulti_label")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get start remote session button clickable after 30s")
 
+x10_login_recipe = [
+    LoginStep('open_login_page', lambda browser, creds: browser.get(f"https://{creds['ip']}/"),
+              EC.visibility_of_element_located((By.NAME, "name")), 30, "Failed to see username input element after 30s"),
+    LoginStep('wait_for_password_input', None,
+              EC.visibility_of_element_located((By.NAME, "pwd")), 30, "Failed to see password input element after 30s"),
+    LoginStep('wait_for_login_button', None,
+              EC.element_to_be_clickable((By.ID, "login_word")), 30, "Failed to get login button clickable after 30s"),
+    LoginStep('login', _login_to_x10,
+              EC.visibility_of_element_located((By.ID, "TOPMENU")), 30, "Failed to see main frame"),
+    LoginStep('open_main_frame', lambda browser, creds: browser.switch_to.frame(browser.find_element_by_id("TOPMENU")),
+              EC.element_to_be_clickable((By.ID, "remote")), 30, "Failed to get Remote Control tab clickable after 30s"),
+    LoginStep('open_remote_control_tab', lambda browser, creds: browser.find_element_by_id("remote").click(),
+              EC.element_to_be_clickable((By.XPATH, "//a[contains(text(), 'iKVM/HTML5')]")), 30, "Failed to get Remote Control tab clickable after 30s"),
+    LoginStep('open_ikvm_page', lambda browser, creds: browser.find_element_by_xpath("//a[contains(text(), 'iKVM/HTML5')]").click(),
+              EC.visibility_of_element_located((By.ID, "frame_main")), 30, "Failed to see iKVM frame after 30s"),
+    LoginStep('open_ikvm_frame', lambda browser, creds: browser.switch_to.frame(browser.find_element_by_id("frame_main")),
+              EC.element_to_be_clickable((By.XPATH, "//input[@value='iKVM/HTML5']")), 30, "Failed to get iKVM button clickable after 30s"),
+    LoginStep('launch_console', lambda browser, creds: browser.find_element_by_xpath("//input[@value='iKVM/HTML5']").click(),
+              lambda browser: len(browser.window_handles) == 2, 60, "Failed to get new console window after 60s"),
+    LoginStep('open_console_window', _switch_to_console_window,
+              EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Close')]")), 30, "Failed to get recording warning close button clickable after 30s"),
+    LoginStep('close_recording_warning', _close_x10_recording_warning,
+              _console_canvas_has_frame, 30, "Failed to get console frame after 30s"),
+    LoginStep('wake_console', _wake_console((By.TAG_NAME, 'body')), None, None, None)
+]
+
+
+def _fill_xcc_login(browser, creds):
+    browser.find_element_by_id('login_username').send_keys(creds['username'])
+    browser.find_element_by_id('login_password').send_keys(creds['password'])
+
+
+xcc_login_recipe = [
+    LoginStep('open_login_page', lambda browser, creds: browser.get(f"https://{creds['ip']}/"),
+              EC.visibility_of_element_located((By.ID, "login_username")), 30, "Failed to see username input element after 30s"),
+    LoginStep('fill_login', _fill_xcc_login,
+              EC.element_to_be_clickable((By.ID, "login_right_submit_btn")), 30, "Failed to get login button clickable after 30s"),
+    LoginStep('login', lambda browser, creds: browser.find_element_by_id('login_right_submit_btn').click(),
+              EC.element_to_be_clickable((By.ID, "clickAndRunIcon")), 30, "Failed to get console launch button clickable after 30s"),
+    LoginStep('open_launch_details', lambda browser, creds: browser.find_element_by_id('clickAndRunIcon').click(),
+              EC.element_to_be_clickable((By.XPATH, "//span[contains(text(), 'Launch Remote Console')]")), 30, "Failed to get console launch details button clickable after 30s"),
+    LoginStep('launch_console', lambda browser, creds: browser.find_element_by_xpath("//span[contains(text(), 'Launch Remote Console')]").click(),
+              lambda browser: len(browser.window_handles) == 2, 60, "Failed to get new console window after 60s"),
+    LoginStep('open_console_window', _switch_to_console_window,
+              EC.visibility_of_element_located((By.ID, "canvasdiv")), 30, "Failed to see console canvas after 30s"),
+    LoginStep('maximize_window', _maximize_window,
+              _console_canvas_has_frame, 30, "Failed to get console frame after 30s"),
+    LoginStep('wake_console', _wake_console(), None, None, None)
+]
+
+
+def _fill_imm2_login(browser, creds):
+    browser.find_element_by_id('user').send_keys(creds['username'])
+    browser.find_element_by_id('password').send_keys(creds['password'])
+
+
+def _launch_imm2_console(browser, creds):
     browser.find_element_by_id('rcClientType2').click()
     browser.find_element_by_id('btnMulti_label').click()
 
-    try:
-        WebDriverWait(browser, 60).until(lambda browser: len(browser.window_handles) == 3)
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get console accept ssl window after 60s")
-
-    try:
-        WebDriverWait(browser, 60).until(lambda browser: len(browser.window_handles) == 2)
-    except TimeoutException:
-        raise OpenConsoleError("Failed to get new console window after 60s")
-
-    browser.switch_to.window(browser.window_handles[1])
-
-    try:
-        WebDriverWait(browser, 30).until(EC.visibility_of_element_located((By.ID, "kvmCanvas")))
-    except TimeoutException:
-        raise OpenConsoleError("Failed to see console canvas after 30s")
-
-    browser.maximize_window()
 
-    time.sleep(5)
-    action_chain = ActionChains(browser)
-    action_chain.key_down(Keys.SHIFT).key_up(Keys.SHIFT).pause(1).perform()
-    time.sleep(5)
+imm2_login_recipe = [
+    LoginStep('open_login_page', lambda browser, creds: browser.get(f"https://{creds['ip']}/"),
+              EC.invisibility_of_element((By.XPATH, "//span[contains(text(), 'web server is initializing')]")), 30, "Failed to get web server initialization after 30s"),
+    LoginStep('fill_login', _fill_imm2_login,
+              EC.element_to_be_clickable((By.ID, "btnLogin")), 30, "Failed to get login button clickable after 30s"),
+    LoginStep('login', lambda browser, creds: browser.find_element_by_id('btnLogin').click(),
+              EC.element_to_be_clickable((By.ID, "btnRemoteConsoleHealthSumm_label")), 60, "Failed to get remote contorl button clickable after 60s"),
+    LoginStep('open_remote_control', lambda browser, creds: browser.find_element_by_id('btnRemoteConsoleHealthSumm_label').click(),
+              EC.element_to_be_clickable((By.ID, "btnMulti_label")), 30, "Failed to get start remote session button clickable after 30s"),
+    LoginStep('launch_console', _launch_imm2_console,
+              lambda browser: len(browser.window_handles) == 3, 60, "Failed to get console accept ssl window after 60s"),
+    LoginStep('accept_ssl', None,
+              lambda browser: len(browser.window_handles) == 2, 60, "Failed to get new console window after 60s"),
+    LoginStep('open_console_window', _switch_to_console_window,
+              EC.visibility_of_element_located((By.ID, "kvmCanvas")), 30, "Failed to see console canvas after 30s"),
+    LoginStep('maximize_window', _maximize_window,
+              _console_canvas_has_frame, 30, "Failed to get console frame after 30s"),
+    LoginStep('wake_console', _wake_console(), None, None, None)
+]
+
+
+model_to_login_recipe_mapping = {
+    'idrac9': idrac9_login_recipe,
+    'ilo5': ilo5_login_recipe,
+    'ilo4': ilo4_login_recipe,
+    'x10': x10_login_recipe,
+    'xcc': xcc_login_recipe,
+    'imm2': imm2_login_recipe
+}
+
+# Latency of every step of the login recipes since the server started, by model and step
+_login_step_timing = {
+    model: {step.name: metrics_helper.LatencyHistogram() for step in recipe}
+    for model, recipe in model_to_login_recipe_mapping.items()
+}
 
 
 def logout_for_ilo5(*, browser):
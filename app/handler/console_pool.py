@@ -0,0 +1,113 @@
+import time
+import threading
+from collections import OrderedDict, namedtuple
+from flask import current_app as app
+
+import handler.console as console_helper
+
+
+# A logged-in console that is not used by any work, kept for the next console work on the same device
+IdleConsole = namedtuple('IdleConsole', ['device_key', 'browser', 'model', 'released_at'])
+
+# Idle consoles by device uid, least recently released first
+_idle_consoles = OrderedDict()
+_in_use_count = 0
+_lock = threading.Lock()
+
+
+def _get_device_key(device_data):
+    # A console logged in with other credentials (or to another IP) can not be reused for the device
+    return device_data['ip'], device_data['username'], device_data['password'], device_data['model'].lower()
+
+
+def acquire(**device_data):
+    """Returns a logged-in console for the device, reusing an idle one when it is still healthy"""
+    global _in_use_count
+    with _lock:
+        idle_console = _idle_consoles.pop(device_data['uid'], None)
+        closing_list = _pop_expired()
+        _in_use_count += 1
+
+    if idle_console is not None and (idle_console.device_key != _get_device_key(device_data) or not _is_healthy(idle_console.browser)):
+        closing_list.append(idle_console)
+        idle_console = None
+
+    _close_all(closing_list)
+
+    if idle_console is not None:
+        app.logger.debug(f"Reusing console to device '{device_data['uid']}'")
+        return idle_console.browser
+
+    try:
+        return console_helper.open_console(**device_data)
+    except Exception:
+        with _lock:
+            _in_use_count -= 1
+        raise
+
+
+def release(*, browser, **device_data):
+    """Keeps the console open for the next work on the device, for up to console_session_ttl seconds"""
+    global _in_use_count
+    closing_list = []
+    with _lock:
+        _in_use_count -= 1
+        if app.config.get('console_session_ttl') > 0 and app.config.get('max_console_sessions') > 0:
+            previous_console = _idle_consoles.pop(device_data['uid'], None)
+            if previous_console is not None:
+                closing_list.append(previous_console)
+            _idle_consoles[device_data['uid']] = IdleConsole(_get_device_key(device_data), browser, device_data['model'], time.monotonic())
+            closing_list += _pop_expired() + _pop_least_recently_used()
+        else:
+            closing_list.append(IdleConsole(None, browser, device_data['model'], None))
+
+    _close_all(closing_list)
+
+
+def discard(*, browser, **device_data):
+    """Closes a console in use instead of keeping it, for when its work failed in the middle"""
+    global _in_use_count
+    with _lock:
+        _in_use_count -= 1
+
+    _close_all([IdleConsole(None, browser, device_data['model'], None)])
+
+
+def close_expired_consoles(a_app):
+    with a_app.app_context():
+        with _lock:
+            closing_list = _pop_expired()
+
+        _close_all(closing_list)
+
+
+def _pop_expired():
+    expire_timestamp = time.monotonic() - app.config.get('console_session_ttl')
+    expired_uid_list = [uid for uid, idle_console in _idle_consoles.items() if idle_console.released_at < expire_timestamp]
+    return [_idle_consoles.pop(uid) for uid in expired_uid_list]
+
+
+def _pop_least_recently_used():
+    # Only idle consoles can be closed, consoles in use are bounded by the console executor pool
+    evicted_list = []
+    while _idle_consoles and len(_idle_consoles) + _in_use_count > app.config.get('max_console_sessions'):
+        evicted_list.append(_idle_consoles.popitem(last=False)[1])
+
+    return evicted_list
+
+
+def _is_healthy(browser):
+    try:
+        browser.current_url
+        return len(browser.window_handles) > 0
+    except Exception as err:
+        app.logger.debug(f"Idle console is not healthy: {err}")
+        return False
+
+
+def _close_all(idle_console_list):
+    for idle_console in idle_console_list:
+        try:
+            console_helper.close_console(browser=idle_console.browser, model=idle_console.model)
+        except Exception as err:
+            app.logger.warning(f"Failed to close console: {err}")
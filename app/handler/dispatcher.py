@@ -0,0 +1,83 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import services.work as work_service
+import handler.work as work_handler
+
+
+class ExecutorPool:
+    """A fixed number of executor threads for one resource class of work"""
+
+    def __init__(self, name, max_workers):
+        self.name = name
+        self.free_slots = threading.Semaphore(max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-executor")
+
+
+class WorkDispatcher:
+    """Feeds pending work to executor pools separated by resource class.
+
+    Work that requires a console is bound by the number of browsers the host can run, so it gets its own small pool
+    and never takes the slots of lightweight (ipmitool, request, sleep) work.
+    The dispatcher is woken by notify() whenever new work is committed or an executor slot frees up,
+    and polls every poll_interval seconds as a fallback for work it was not notified about.
+    """
+
+    def __init__(self, a_app, *, max_console_workers, max_lightweight_workers, poll_interval):
+        self._app = a_app
+        self._poll_interval = poll_interval
+        self._wake_event = threading.Event()
+        # keyed by the requires_console value of the work each pool runs
+        self._pools = {
+            True: ExecutorPool('console-work', max_console_workers),
+            False: ExecutorPool('lightweight-work', max_lightweight_workers)
+        }
+        self._thread = threading.Thread(target=self._run, name='work-dispatcher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def notify(self, delay=None):
+        if delay is None:
+            self._wake_event.set()
+        else:
+            timer = threading.Timer(delay, self._wake_event.set)
+            timer.daemon = True
+            timer.start()
+
+    def _run(self):
+        while True:
+            self._wake_event.wait(self._poll_interval)
+            self._wake_event.clear()
+            for requires_console, pool in self._pools.items():
+                try:
+                    self._dispatch(requires_console, pool)
+                except Exception as err:
+                    self._app.logger.error(f"Failed to dispatch work to the {pool.name} pool: {err}")
+
+    def _dispatch(self, requires_console, pool):
+        while pool.free_slots.acquire(blocking=False):
+            try:
+                with self._app.app_context():
+                    assignment = work_service.get_assignment(requires_console=requires_console)
+            except Exception:
+                pool.free_slots.release()
+                raise
+
+            if not assignment:
+                pool.free_slots.release()
+                return
+
+            self._app.logger.debug(f"Got work assignment for the {pool.name} pool: '{assignment}'")
+            pool.executor.submit(self._run_assignment, pool, assignment)
+
+    def _run_assignment(self, pool, assignment):
+        try:
+            with self._app.app_context():
+                work_handler.run_work_assignment(**assignment)
+        except Exception as err:
+            self._app.logger.error(f"Failed to run work '{assignment['work_id']}': {err}")
+        finally:
+            pool.free_slots.release()
+            # work that arrived while all slots were busy can run now
+            self.notify()
@@ -0,0 +1,140 @@
+import os
+import time
+import shutil
+import atexit
+import tempfile
+import threading
+import subprocess
+from flask import current_app as app
+
+from exceptions.handler import OpenConsoleError
+
+
+# Seconds to wait for a new Xvfb to accept connections
+DISPLAY_START_TIMEOUT = 10
+# The VNC port of the first dedicated display, 5900 is kept for the shared display
+FIRST_VNC_PORT = 5901
+
+
+class Display:
+    """An Xvfb display (and optionally an x11vnc server for it) dedicated to a single browser"""
+
+    def __init__(self, number, xvfb_process, vnc_process=None, framebuffer_dir=None):
+        self.number = number
+        self.xvfb_process = xvfb_process
+        self.vnc_process = vnc_process
+        self.framebuffer_dir = framebuffer_dir
+
+    @property
+    def name(self):
+        return f":{self.number}"
+
+    @property
+    def framebuffer_path(self):
+        # Xvfb -fbdir keeps the screen in an XWD file named after the screen number
+        return os.path.join(self.framebuffer_dir, 'Xvfb_screen0') if self.framebuffer_dir else None
+
+    def is_running(self):
+        return self.xvfb_process.poll() is None
+
+    def stop(self):
+        for process in [self.vnc_process, self.xvfb_process]:
+            if process is not None and process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+        if self.framebuffer_dir:
+            shutil.rmtree(self.framebuffer_dir, ignore_errors=True)
+
+
+# Started displays that are not used by a browser, kept for the next browser
+_free_displays = []
+_used_display_numbers = set()
+_lock = threading.Lock()
+_exit_handler_registered = False
+
+
+def acquire():
+    """Returns a running display that is not used by any other browser, starting one if needed"""
+    global _exit_handler_registered
+    with _lock:
+        while _free_displays:
+            display = _free_displays.pop()
+            if display.is_running():
+                _used_display_numbers.add(display.number)
+                return display
+            display.stop()
+
+        number = _get_free_display_number()
+        _used_display_numbers.add(number)
+        if not _exit_handler_registered:
+            atexit.register(stop_all)
+            _exit_handler_registered = True
+
+    try:
+        display = _start_display(number)
+    except Exception:
+        with _lock:
+            _used_display_numbers.discard(number)
+        raise
+
+    app.logger.debug(f"Started display '{display.name}'")
+    return display
+
+
+def release(display):
+    with _lock:
+        _used_display_numbers.discard(display.number)
+        if display.is_running():
+            _free_displays.append(display)
+            return
+
+    display.stop()
+
+
+def stop_all():
+    with _lock:
+        stopping_list = list(_free_displays)
+        _free_displays.clear()
+
+    for display in stopping_list:
+        display.stop()
+
+
+def _get_free_display_number():
+    number = app.config.get('first_display_number')
+    # Skip displays used by our browsers and displays started by anyone else
+    while number in _used_display_numbers or any(display.number == number for display in _free_displays) or os.path.exists(f"/tmp/.X{number}-lock"):
+        number += 1
+
+    return number
+
+
+def _start_display(number):
+    xvfb_args = ['Xvfb', f":{number}", '-ac', '-screen', '0', app.config.get('display_resolution')]
+    framebuffer_dir = None
+    if app.config.get('screenshot_backend') == 'framebuffer':
+        framebuffer_dir = tempfile.mkdtemp(prefix=f"vaxiin-display-{number}-")
+        xvfb_args += ['-fbdir', framebuffer_dir]
+
+    xvfb_process = subprocess.Popen(xvfb_args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + DISPLAY_START_TIMEOUT
+    while not os.path.exists(f"/tmp/.X11-unix/X{number}"):
+        if xvfb_process.poll() is not None or time.monotonic() > deadline:
+            Display(number, xvfb_process, framebuffer_dir=framebuffer_dir).stop()
+            raise OpenConsoleError(f"Failed to start display ':{number}'")
+        time.sleep(0.1)
+
+    vnc_process = None
+    if app.config.get('display_vnc'):
+        vnc_process = subprocess.Popen(
+            ['x11vnc', '-display', f":{number}", '-forever', '-rfbport', str(FIRST_VNC_PORT + number - app.config.get('first_display_number'))],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+    return Display(number, xvfb_process, vnc_process, framebuffer_dir)
@@ -0,0 +1,145 @@
+import time
+import threading
+from flask import current_app as app
+from pyghmi.exceptions import IpmiException
+import pyghmi.ipmi.command as ipmi_command
+
+from exceptions.handler import IpmitoolError
+
+
+# Chassis control directives (IPMI spec table 28-4) and the output ipmitool prints for them
+CHASSIS_CONTROL_DIRECTIVES = {
+    'off': (0, 'Down/Off'),
+    'on': (1, 'Up/On'),
+    'cycle': (2, 'Cycle'),
+    'reset': (3, 'Reset'),
+    'diag': (4, 'Diag'),
+    'soft': (5, 'Soft')
+}
+
+CHASSIS_NETFN = 0x0
+GET_CHASSIS_STATUS_COMMAND = 0x1
+CHASSIS_CONTROL_COMMAND = 0x2
+
+
+class IpmiSession:
+    """An authenticated IPMI-over-LAN (RMCP+) session to a single BMC, reused by all the work on the device"""
+
+    def __init__(self, *, ip, port, username, password):
+        self.ip = ip
+        self.port = port
+        self.username = username
+        self.password = password
+        self.command = None
+        self.last_used = time.monotonic()
+        # pyghmi handles a single outstanding request per session, so commands to the same BMC run one at a time
+        self.lock = threading.Lock()
+
+    def run_raw_command(self, *, netfn, command, data=()):
+        with self.lock:
+            self.last_used = time.monotonic()
+            if self.command is None or not self.command.ipmi_session.logged:
+                app.logger.debug(f"Opening IPMI session to '{self.ip}:{self.port}'")
+                self.command = ipmi_command.Command(
+                    bmc=self.ip,
+                    userid=self.username,
+                    password=self.password,
+                    port=self.port
+                )
+
+            response = self.command.raw_command(netfn=netfn, command=command, data=data)
+            self.last_used = time.monotonic()
+
+        if 'error' in response:
+            raise IpmiException(response['error'], response.get('code'))
+
+        return response
+
+    def close(self):
+        with self.lock:
+            if self.command is not None and self.command.ipmi_session.logged:
+                app.logger.debug(f"Closing idle IPMI session to '{self.ip}:{self.port}'")
+                self.command.ipmi_session.logout()
+            self.command = None
+
+
+_session_cache = {}
+_session_cache_lock = threading.Lock()
+
+
+def get_session(*, ip, username, password):
+    port = app.config.get('ipmi_port')
+    key = (ip, port, username, password)
+    with _session_cache_lock:
+        idle_session_list = _pop_idle_sessions()
+        session = _session_cache.get(key)
+        if session is None:
+            session = _session_cache[key] = IpmiSession(ip=ip, port=port, username=username, password=password)
+
+    for idle_session in idle_session_list:
+        _close_session(idle_session)
+
+    return session
+
+
+def _pop_idle_sessions():
+    expire_timestamp = time.monotonic() - app.config.get('ipmi_session_idle_timeout')
+    idle_key_list = [
+        key for key, session in _session_cache.items()
+        if session.last_used < expire_timestamp and not session.lock.locked()
+    ]
+    return [_session_cache.pop(key) for key in idle_key_list]
+
+
+def _close_session(session):
+    try:
+        session.close()
+    except Exception as err:
+        app.logger.warning(f"Failed to close IPMI session to '{session.ip}:{session.port}': {err}")
+
+
+def close_all_sessions():
+    with _session_cache_lock:
+        session_list = list(_session_cache.values())
+        _session_cache.clear()
+
+    for session in session_list:
+        _close_session(session)
+
+
+def is_supported_command(command_args):
+    if command_args[:1] == ['chassis']:
+        command_args = command_args[1:]
+
+    if len(command_args) != 2 or command_args[0] != 'power':
+        return False
+
+    return command_args[1] == 'status' or command_args[1] in CHASSIS_CONTROL_DIRECTIVES
+
+
+def run_command(*, command_args, device):
+    """Runs an ipmitool style power command over a cached session, returns the output ipmitool would print"""
+    power_action = command_args[-1]
+    session = get_session(ip=device['ip'], username=device['username'], password=device['password'])
+
+    try:
+        if power_action == 'status':
+            response = session.run_raw_command(netfn=CHASSIS_NETFN, command=GET_CHASSIS_STATUS_COMMAND)
+            stdout = f"Chassis Power is {'on' if response['data'][0] & 0x1 else 'off'}\n"
+        else:
+            directive, directive_output = CHASSIS_CONTROL_DIRECTIVES[power_action]
+            session.run_raw_command(netfn=CHASSIS_NETFN, command=CHASSIS_CONTROL_COMMAND, data=[directive])
+            stdout = f"Chassis Power Control: {directive_output}\n"
+    except IpmiException as err:
+        app.logger.error(f"Recieved IPMI error on native command: {err}")
+        # the session may be the cause (e.g. the BMC dropped it), so the next command starts a new one
+        _close_session(session)
+        raise IpmitoolError({
+            "message": "IPMI error",
+            "error": str(err)
+        })
+
+    return {
+        "stdout": stdout,
+        "stderr": ""
+    }
@@ -0,0 +1,98 @@
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app as app
+
+import helpers.image as image_helper
+import helpers.matcher as matcher_helper
+import services.state as state_service
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(replace_broken=False):
+    global _executor
+    with _executor_lock:
+        if replace_broken and _executor is not None:
+            app.logger.warning("OCR process pool is broken, starting a new one")
+            _executor.shutdown(wait=False)
+            _executor = None
+
+        if _executor is None:
+            app.logger.info(f"Starting OCR process pool with {app.config.get('ocr_workers')} workers")
+            # spawn instead of fork since the server process already runs scheduler threads
+            _executor = ProcessPoolExecutor(
+                max_workers=app.config.get('ocr_workers'),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+
+    return _executor
+
+
+def submit_state_ocr(state):
+    a_app = app._get_current_object()
+    state_id = state.state_id
+    image_hash = image_helper.get_image_hash(state.screenshot)
+    profile = state_service.get_ocr_profile(state.device_uid)
+    cache_key = image_helper.get_ocr_cache_key(image_hash, profile)
+
+    app.logger.debug(f"Submitting OCR for state '{state_id}'")
+    engine = image_helper.get_ocr_engine()
+    if app.config.get('incremental_ocr'):
+        # The same extraction as when OCR is not async - only the bands that are not in the band cache are OCRed in the pool
+        band_list = image_helper.get_text_bands(image_helper.prepare_for_band_ocr(state.screenshot, profile=profile))
+        band_text_by_hash = image_helper.get_cached_band_texts(band_list)
+        missing_band_list = image_helper.get_missing_bands(band_list, band_text_by_hash)
+        ocr_args = (_run_band_ocr, [band.image for band in missing_band_list], engine)
+
+        def get_ocr_text(ocr_band_text_list):
+            band_text_by_hash.update(image_helper.cache_band_texts(missing_band_list, ocr_band_text_list))
+            return image_helper.join_band_texts(band_list, band_text_by_hash)
+    else:
+        ocr_args = (_run_ocr, state.screenshot, engine, profile)
+
+        def get_ocr_text(ocr_text):
+            return ocr_text
+
+    try:
+        future = _get_executor().submit(*ocr_args)
+    except BrokenProcessPool:
+        future = _get_executor(replace_broken=True).submit(*ocr_args)
+    future.add_done_callback(lambda f: _complete_state_ocr(a_app, state_id, image_hash, cache_key, get_ocr_text, f))
+
+
+def _run_ocr(image, engine, profile):
+    # pytesseract errors can not be unpickled, which would break the pool, so only the message is passed back
+    try:
+        return image_helper.run_ocr(image, engine=engine, profile=profile)
+    except Exception as err:
+        raise RuntimeError(f"{type(err).__name__}: {err}")
+
+
+def _run_band_ocr(band_image_list, engine):
+    try:
+        return image_helper.run_band_ocr(band_image_list, engine)
+    except Exception as err:
+        raise RuntimeError(f"{type(err).__name__}: {err}")
+
+
+def _complete_state_ocr(a_app, state_id, image_hash, cache_key, get_ocr_text, future):
+    # Runs on the executor's management thread, which keeps running for the life of the process
+    with a_app.app_context():
+        try:
+            try:
+                ocr_text = get_ocr_text(future.result())
+            except Exception as err:
+                app.logger.error(f"Failed to OCR screenshot of state '{state_id}': {err}")
+                ocr_text = ''
+            else:
+                image_helper.cache_ocr_text(cache_key, ocr_text)
+
+            state = state_service.complete_ocr(state_id=state_id, image_hash=image_hash, ocr_text=ocr_text)
+            if state is not None:
+                matcher_helper.match_state(state)
+        finally:
+            app.session.remove()
@@ -1,52 +1,126 @@
 import time
+import datetime
 from flask import current_app as app
 
+import helpers.convertor as convertor_helper
 import services.work as work_service
 import services.execution as execution_service
 
-import handler.console as console_helper
+import handler.console_pool as console_pool
 import handler.action_runner as action_runner
 
 from exceptions.handler import ConsoleError
 
 
-def get_work_assignment(a_app):
-    with a_app.app_context():
-        assignment = work_service.get_assignment()
-
-        if assignment:
-            app.logger.debug(f"Got work assignment: '{assignment}'")
-            run_work_assignment(**assignment)
-        else:
-            app.logger.debug(f"no assignment found")
+def run_work_assignment(*, work_id, state_id, trigger, requires_console, device_data, action_list, actions_completed=0):
+    browser = None
+    # The id of the claimed work that is running, so it can be failed if its run raises
+    running_work_id = work_id
+    try:
+        if requires_console:
+            try:
+                browser = console_pool.acquire(**device_data)
+            except ConsoleError as err:
+                execution_service.create(
+                    work_id=work_id,
+                    state_id=state_id,
+                    trigger=trigger,
+                    action_name='Open Console',
+                    status='failure',
+                    run_data={'message': err.message, 'error': err.error},
+                    elapsed_time=0.0
+                )
+
+                work_service.complete_by_id(
+                    work_id=work_id,
+                    status='failure'
+                )
+
+                return
+
+        work_status = _run_work_actions(
+            work_id=work_id,
+            state_id=state_id,
+            trigger=trigger,
+            requires_console=requires_console,
+            device_data=device_data,
+            action_list=action_list,
+            actions_completed=actions_completed,
+            browser=browser
+        )
+        running_work_id = None
+
+        # The device's other console works run back to back in the open console, instead of each logging in again
+        batched_work_count = 1
+        while requires_console and work_status == 'success' and batched_work_count < app.config.get('max_console_work_batch'):
+            assignment = work_service.get_console_assignment_for_device(device_data)
+            if not assignment:
+                break
+
+            app.logger.debug(f"Running work '{assignment['work_id']}' in the open console of device '{device_data['uid']}'")
+            running_work_id = assignment['work_id']
+            work_status = _run_work_actions(**assignment, browser=browser)
+            running_work_id = None
+            batched_work_count += 1
+    except Exception as err:
+        app.logger.error(f"Failed to run work of device '{device_data['uid']}': {err}")
+        if running_work_id is not None:
+            _fail_work(running_work_id)
+
+        # The console may be left in the middle of the failed work, so it is not kept for the next work
+        if browser is not None:
+            console_pool.discard(browser=browser, **device_data)
+
+        return
+
+    # A parked work already released the console
+    if requires_console and work_status is not None:
+        console_pool.release(browser=browser, **device_data)
+
+
+def _fail_work(work_id):
+    try:
+        # the session may be left in a failed transaction by the error
+        app.session.rollback()
+        work_service.complete_by_id(
+            work_id=work_id,
+            status='failure'
+        )
+    except Exception as err:
+        app.logger.error(f"Failed to mark work '{work_id}' as failed: {err}")
 
 
-def run_work_assignment(*, work_id, state_id, trigger, requires_console, device_data, action_list):
+def _run_work_actions(*, work_id, state_id, trigger, requires_console, device_data, action_list, actions_completed, browser):
+    """Runs the work's actions and completes it, returns the work status or None if the work was parked"""
     work_status = 'success'
-    browser = None
-
-    if requires_console:
-        try:
-            browser = console_helper.open_console(**device_data)
-        except ConsoleError as err:
+    for action_idx in range(actions_completed, len(action_list)):
+        action = action_list[action_idx]
+        sleep_seconds = _get_parked_sleep_seconds(action)
+        if sleep_seconds is not None:
+            resume_at = datetime.datetime.now() + datetime.timedelta(seconds=sleep_seconds)
+            app.logger.debug(f"Parking work '{work_id}' until {resume_at}")
             execution_service.create(
                 work_id=work_id,
                 state_id=state_id,
                 trigger=trigger,
-                action_name='Open Console',
-                status='failure',
-                run_data={'message': err.message, 'error': err.error},
+                action_name=action['name'],
+                status='success',
+                run_data={'message': f"Parked work for {sleep_seconds} seconds", 'resume_at': resume_at.isoformat()},
                 elapsed_time=0.0
             )
-
-            work_service.complete_by_id(
+            work_service.park(
                 work_id=work_id,
-                status='failure'
+                actions_completed=action_idx + 1,
+                resume_at=resume_at,
+                requires_console=bool(convertor_helper.CONSOLE_ACTION_TYPES & {remaining_action['type'] for remaining_action in action_list[action_idx + 1:]})
             )
 
-            return
+            # the console stays open in the pool, so a work that needs it again after the sleep can pick it up
+            if requires_console:
+                console_pool.release(browser=browser, **device_data)
+
+            return None
 
-    for action in action_list:
         app.logger.debug(f"Running action {action['name']}")
         start_time = time.time()
         action_run_status, action_run_data = action_runner.run_action(
@@ -71,13 +145,22 @@ def run_work_assignment(*, work_id, state_id, trigger, requires_console, device_
             work_status = action_run_status
             break
 
-    if requires_console:
-        console_helper.close_console(
-            browser=browser,
-            model=device_data['model']
-        )
-
     work_service.complete_by_id(
         work_id=work_id,
         status=work_status
     )
+
+    return work_status
+
+
+def _get_parked_sleep_seconds(action):
+    # Short sleeps are cheaper to run in place than to park and claim the work again
+    if action['type'] != 'sleep':
+        return None
+
+    try:
+        sleep_seconds = int(action['data'])
+    except ValueError:
+        return None
+
+    return sleep_seconds if sleep_seconds >= app.config.get('park_sleep_threshold') else None
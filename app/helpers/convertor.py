@@ -8,10 +8,15 @@ import services.device as device_service
 import services.action as action_service
 import services.execution as execution_service
 
-from exceptions.base import WorkNotFoundForDevice, WorkAlreadyExistForDevice, ManualWorkMustHaveRuleOrActions
+import handler.bulk as bulk_handler
 
+from exceptions.base import WorkNotFoundForDevice, WorkAlreadyExistForDevice, ManualWorkMustHaveRuleOrActions, BulkWorkMustHaveDeviceSelector, BulkWorkActionNotSupported
 
-def create_manual_work_for_device(*, device_uid, rule, actions):
+
+CONSOLE_ACTION_TYPES = {'keystroke', 'screenshot'}
+
+
+def create_manual_work_for_device(*, device_uid, rule, actions, priority=None):
     try:
         work_service.get_by_device(device_uid)
     except WorkNotFoundForDevice:
@@ -27,14 +32,16 @@ def create_manual_work_for_device(*, device_uid, rule, actions):
             state=None,
             device_uid=device_uid,
             rule=rule,
-            trigger=f"Manual - Rule: {rule.name}"
+            trigger=f"Manual - Rule: {rule.name}",
+            priority=priority if priority is not None else work_service.MANUAL_WORK_PRIORITY
         )
     elif actions is not None:
         work_data = parse_work(
             state=None,
             device_uid=device_uid,
             actions=actions,
-            trigger=f"Manual - Actions: {', '.join(actions)}"
+            trigger=f"Manual - Actions: {', '.join(actions)}",
+            priority=priority if priority is not None else work_service.MANUAL_WORK_PRIORITY
         )
     else:
         raise ManualWorkMustHaveRuleOrActions()
@@ -42,7 +49,35 @@ def create_manual_work_for_device(*, device_uid, rule, actions):
     return work_data
 
 
-def parse_work(*, state, device_uid, rule=None, actions=None, trigger):
+def create_bulk_work_for_devices(*, action, device_uids, metadata, zombie):
+    if device_uids is None and metadata is None and zombie is None:
+        raise BulkWorkMustHaveDeviceSelector()
+
+    action = action_service.get_by_name(action)
+    if action.action_type not in bulk_handler.action_type_to_command_args_mapping:
+        raise BulkWorkActionNotSupported(action.name, action.action_type)
+
+    work_data_list = []
+    skipped_device_uid_list = []
+    for device in device_service.get_by_selector(uid_list=device_uids, metadata=metadata, zombie=zombie):
+        try:
+            work_service.get_by_device(device.uid)
+        except WorkNotFoundForDevice:
+            work_data_list.append(parse_work(
+                state=None,
+                device_uid=device.uid,
+                actions=[action.name],
+                trigger=f"Bulk - Actions: {action.name}",
+                priority=work_service.MANUAL_WORK_PRIORITY
+            ))
+        else:
+            app.logger.debug(f"Skipping bulk work for device uid - {device.uid} since it already has pending work")
+            skipped_device_uid_list.append(device.uid)
+
+    return work_data_list, skipped_device_uid_list
+
+
+def parse_work(*, state, device_uid, rule=None, actions=None, trigger, priority):
     action_list = []
     action_type_set = set()
 
@@ -65,7 +100,8 @@ def parse_work(*, state, device_uid, rule=None, actions=None, trigger):
         'device_uid': device_uid,
         'actions': action_list,
         'trigger': trigger,
-        'requires_console': 'keystroke' in action_type_set or 'screenshot' in action_type_set
+        'requires_console': bool(CONSOLE_ACTION_TYPES & action_type_set),
+        'priority': priority
     }
 
     return work_data
@@ -106,7 +142,8 @@ def periodic_work_assignment(a_app):
                         state=state,
                         device_uid=state.device_uid,
                         rule=matching_rule,
-                        trigger=f'Rule - {matching_rule.name}'
+                        trigger=f'Rule - {matching_rule.name}',
+                        priority=work_service.RULE_WORK_PRIORITY
                     )
                 )
 
@@ -137,7 +174,8 @@ def get_zombie_screenshots(a_app):
                         'data': 'screenshot'
                     }],
                     'trigger': 'zombie screenshot',
-                    'requires_console': True
+                    'requires_console': True,
+                    'priority': work_service.ZOMBIE_SCREENSHOT_WORK_PRIORITY
                 })
 
         if work_data_list:
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, event
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -22,3 +22,29 @@ def get_db(db_path, for_testing=False):
         dbapi_conn.execute(f'ATTACH DATABASE "{path}" AS "{SCHEMA}"')
 
     return engine, SessionLocal
+
+
+def add_missing_columns(engine):
+    # create_all does not alter existing tables, so columns added to a model after the DB was created are added here
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name, schema=table.schema)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+
+            column_definition = f"{column.name} {column.type.compile(dialect=engine.dialect)}"
+            if column.server_default is not None:
+                column_definition += f" DEFAULT {column.server_default.arg}"
+
+            engine.execute(f"ALTER TABLE {table.schema}.{table.name} ADD COLUMN {column_definition}")
+
+
+def add_missing_indexes(engine):
+    # Same as add_missing_columns, for indexes added to a model after the DB was created
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name, schema=table.schema)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=engine)
@@ -0,0 +1,56 @@
+import mmap
+import struct
+from PIL import Image
+
+from exceptions.handler import FramebufferError
+
+
+# XWD file header - 25 big-endian CARD32 fields, followed by the window name, the colormap and the pixels
+XWD_HEADER = struct.Struct('>25I')
+XWD_COLOR_SIZE = 12
+XWD_Z_PIXMAP = 2
+XWD_LSB_FIRST = 0
+
+
+def read_xwd_image(path, box=None):
+    """Returns the framebuffer image in an XWD file (as written by Xvfb -fbdir), cropped to box (left, upper, right, lower).
+
+    The file is memory mapped, so only the pixels inside the box are read and decoded.
+    """
+    with open(path, 'rb') as xwd_file, mmap.mmap(xwd_file.fileno(), 0, access=mmap.ACCESS_READ) as xwd_map:
+        header = XWD_HEADER.unpack_from(xwd_map)
+        header_size, pixmap_format = header[0], header[2]
+        width, height, byte_order = header[4], header[5], header[7]
+        bits_per_pixel, bytes_per_line = header[11], header[12]
+        red_mask, blue_mask, color_count = header[14], header[16], header[19]
+
+        if pixmap_format != XWD_Z_PIXMAP or bits_per_pixel != 32 or (red_mask, blue_mask) != (0xff0000, 0xff):
+            raise FramebufferError(f"Unsupported framebuffer format: {bits_per_pixel} bits per pixel, red mask {red_mask:#x}")
+
+        left, upper, right, lower = _clip_box(box, width, height)
+        if right <= left or lower <= upper:
+            raise FramebufferError(f"Crop box {box} is outside the {width}x{height} framebuffer")
+
+        pixels_offset = header_size + color_count * XWD_COLOR_SIZE + upper * bytes_per_line + left * 4
+        pixels_end = pixels_offset + (lower - upper - 1) * bytes_per_line + (right - left) * 4
+        if pixels_end > len(xwd_map):
+            raise FramebufferError(f"Framebuffer file is truncated, expected at least {pixels_end} bytes")
+
+        with memoryview(xwd_map)[pixels_offset:pixels_end] as pixels:
+            return Image.frombuffer(
+                'RGB',
+                (right - left, lower - upper),
+                pixels,
+                'raw',
+                'BGRX' if byte_order == XWD_LSB_FIRST else 'XRGB',
+                bytes_per_line,
+                1
+            )
+
+
+def _clip_box(box, width, height):
+    if box is None:
+        return 0, 0, width, height
+
+    left, upper, right, lower = box
+    return max(left, 0), max(upper, 0), min(right, width), min(lower, height)
@@ -0,0 +1,51 @@
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app as app
+
+
+# A single session shared by all the executors, its adapter keeps a pool of keep-alive connections per host
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool_maxsize = app.config.get('http_pool_maxsize')
+            adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+            _session = requests.Session()
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+
+    return _session
+
+
+def close_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get(url):
+    """Returns the response along with how long it took to get the headers (ttfb) and the body (download)"""
+    start_time = time.perf_counter()
+    res = get_session().get(
+        url,
+        timeout=(app.config.get('http_connect_timeout'), app.config.get('http_read_timeout')),
+        stream=True
+    )
+    ttfb_time = time.perf_counter()
+    # reading the content releases the connection back to the pool
+    res.content
+    end_time = time.perf_counter()
+
+    return res, {
+        'total': end_time - start_time,
+        'ttfb': ttfb_time - start_time,
+        'download': end_time - ttfb_time
+    }
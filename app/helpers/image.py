@@ -1,6 +1,46 @@
+import io
+import json
 import base64
+import hashlib
+import threading
+import logging
+import statistics
 import pytesseract
-from PIL import Image
+from PIL import Image, ImageChops, ImageOps, ImageStat
+from collections import OrderedDict, namedtuple
+from flask import current_app as app
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+
+# OCR results keyed by the sha256 of the decoded image, shared by all requests in the process
+_ocr_cache = OrderedDict()
+_ocr_cache_lock = threading.Lock()
+
+# OCR results of text bands for incremental OCR, keyed by the sha256 of the band pixels
+_ocr_band_cache = OrderedDict()
+
+# Rows of blank pixels that separate two text bands, and blank rows kept around a band so the text does not touch its edges
+MIN_BAND_GAP = 2
+BAND_PADDING = 2
+
+# A text band of a screenshot, first_row and last_row are its rows with text (without the padding of the band image)
+TextBand = namedtuple('TextBand', ['band_hash', 'image', 'first_row', 'last_row'])
+
+# Size frames are scaled down to before comparing them, small enough to ignore noise like a blinking cursor
+FRAME_FINGERPRINT_SIZE = (64, 48)
+
+# The difference hash of a screenshot compares SCREENSHOT_HASH_SIZE x SCREENSHOT_HASH_SIZE neighbouring cells of it
+SCREENSHOT_HASH_SIZE = 16
+
+# How far (0-255) a pixel may be from the border color to still count as border when trimming it
+TRIM_BORDER_TOLERANCE = 16
+
+# tesserocr API handles are not thread safe, so each thread (and pool worker) keeps its own loaded engine
+_tesserocr_local = threading.local()
 
 
 def encode_image(image):
@@ -11,5 +51,296 @@ def decode_image(image):
     return base64.b64decode(image.encode('ascii'))
 
 
-def get_ocr_text(image):
-    return pytesseract.image_to_string(Image.open(image))
+def encode_png(image):
+    output = io.BytesIO()
+    image.save(output, format='PNG')
+    return output.getvalue()
+
+
+def get_image_hash(image):
+    return hashlib.sha256(image).hexdigest()
+
+
+def get_screenshot_hash(image):
+    """Returns the difference hash (dHash) of the screenshot as a hex string, near identical screenshots get near identical hashes"""
+    small_image = image.convert('L').resize((SCREENSHOT_HASH_SIZE + 1, SCREENSHOT_HASH_SIZE), Image.BOX)
+    left_cells = small_image.crop((0, 0, SCREENSHOT_HASH_SIZE, SCREENSHOT_HASH_SIZE))
+    right_cells = small_image.crop((1, 0, SCREENSHOT_HASH_SIZE + 1, SCREENSHOT_HASH_SIZE))
+    # a bit is set where a cell is brighter than the cell to its right
+    hash_bits = ImageChops.subtract(left_cells, right_cells).point(lambda value: 255 if value else 0).convert('1', dither=Image.NONE)
+
+    return hash_bits.tobytes().hex()
+
+
+def get_hash_distance(screenshot_hash, other_screenshot_hash):
+    # the number of differing bits
+    return bin(int(screenshot_hash, 16) ^ int(other_screenshot_hash, 16)).count('1')
+
+
+def get_frame_fingerprint(image):
+    if not isinstance(image, Image.Image):
+        image = Image.open(io.BytesIO(image))
+
+    return image.convert('L').resize(FRAME_FINGERPRINT_SIZE)
+
+
+def get_frame_difference(fingerprint, other_fingerprint):
+    # mean absolute difference of the pixels, from 0 (identical) to 255
+    return ImageStat.Stat(ImageChops.difference(fingerprint, other_fingerprint)).mean[0]
+
+
+def get_ocr_text(image, decoded_image=None, profile=None):
+    image_hash = get_image_hash(image)
+    cache_key = get_ocr_cache_key(image_hash, profile)
+
+    ocr_text = get_cached_ocr_text(cache_key)
+    if ocr_text is None:
+        if app.config.get('incremental_ocr'):
+            ocr_text = get_incremental_ocr_text(image, decoded_image=decoded_image, profile=profile)
+        else:
+            ocr_text = run_ocr(image, engine=get_ocr_engine(), decoded_image=decoded_image, profile=profile)
+        cache_ocr_text(cache_key, ocr_text)
+    else:
+        app.logger.debug(f"Using cached OCR text for image '{image_hash}'")
+
+    return ocr_text
+
+
+def get_incremental_ocr_text(image, decoded_image=None, profile=None):
+    """OCRs a screenshot band by band (text lines separated by blank rows), only the bands that were not seen before.
+
+    Consecutive screenshots of a console usually differ in a few lines, so most bands are found in the band cache.
+    """
+    band_list = get_text_bands(prepare_for_band_ocr(image, decoded_image=decoded_image, profile=profile))
+    band_text_by_hash = get_cached_band_texts(band_list)
+    missing_band_list = get_missing_bands(band_list, band_text_by_hash)
+
+    ocr_band_text_list = run_band_ocr([band.image for band in missing_band_list], get_ocr_engine())
+    band_text_by_hash.update(cache_band_texts(missing_band_list, ocr_band_text_list))
+
+    app.logger.debug(f"OCRed {len(missing_band_list)} changed text bands of the screenshot")
+    return join_band_texts(band_list, band_text_by_hash)
+
+
+def prepare_for_band_ocr(image, decoded_image=None, profile=None):
+    if decoded_image is None:
+        decoded_image = Image.open(io.BytesIO(image))
+
+    decoded_image = decoded_image.convert('RGB')
+    if profile:
+        decoded_image = preprocess_for_ocr(decoded_image, profile)
+
+    return decoded_image
+
+
+def get_text_bands(image):
+    """Returns the horizontal bands of the image that have text, split on blank rows"""
+    gray_image = image.convert('L')
+    histogram = gray_image.histogram()
+    background = histogram.index(max(histogram))
+    ink_mask = ImageChops.difference(gray_image, Image.new('L', gray_image.size, background)).point(
+        lambda value: 255 if value > TRIM_BORDER_TOLERANCE else 0
+    )
+    ink_rows = ink_mask.getprojection()[1]
+
+    row_range_list = []
+    for row, has_ink in enumerate(ink_rows):
+        if not has_ink:
+            continue
+        if row_range_list and row - row_range_list[-1][1] <= MIN_BAND_GAP:
+            row_range_list[-1][1] = row
+        else:
+            row_range_list.append([row, row])
+
+    band_list = []
+    for first_row, last_row in row_range_list:
+        band_image = image.crop((0, max(first_row - BAND_PADDING, 0), image.width, min(last_row + 1 + BAND_PADDING, image.height)))
+        band_hash = hashlib.sha256(f"{band_image.mode}:{band_image.size}:".encode('ascii') + band_image.tobytes()).hexdigest()
+        band_list.append(TextBand(band_hash, band_image, first_row, last_row))
+
+    return band_list
+
+
+def get_cached_band_texts(band_list):
+    band_text_by_hash = {}
+    for band in band_list:
+        band_text = _get_cached(_ocr_band_cache, band.band_hash)
+        if band_text is not None:
+            band_text_by_hash[band.band_hash] = band_text
+
+    return band_text_by_hash
+
+
+def get_missing_bands(band_list, band_text_by_hash):
+    # A band that shows up more than once in the screenshot (like a repeated line) is OCRed once
+    missing_band_by_hash = {band.band_hash: band for band in band_list if band.band_hash not in band_text_by_hash}
+    return list(missing_band_by_hash.values())
+
+
+def run_band_ocr(band_image_list, engine):
+    # Runs without an app context so it can be used by the OCR process pool
+    return [_run_engine(band_image, engine).strip() for band_image in band_image_list]
+
+
+def cache_band_texts(band_list, band_text_list):
+    band_text_by_hash = {}
+    for band, band_text in zip(band_list, band_text_list):
+        _cache(_ocr_band_cache, band.band_hash, band_text, app.config.get('ocr_band_cache_size'))
+        band_text_by_hash[band.band_hash] = band_text
+
+    return band_text_by_hash
+
+
+def join_band_texts(band_list, band_text_by_hash):
+    """Joins the text of the bands the way tesseract lays out a whole page, so rule regexes match either text:
+    a line per band, and an empty line between bands that have at least a text line of blank rows between them.
+    """
+    text_band_list = [band for band in band_list if band_text_by_hash[band.band_hash]]
+    if not text_band_list:
+        return ''
+
+    line_height = statistics.median(band.last_row - band.first_row + 1 for band in text_band_list)
+    line_list = [band_text_by_hash[text_band_list[0].band_hash]]
+    for previous_band, band in zip(text_band_list, text_band_list[1:]):
+        if band.first_row - previous_band.last_row - 1 >= line_height:
+            line_list.append('')
+        line_list.append(band_text_by_hash[band.band_hash])
+
+    return '\n'.join(line_list)
+
+
+def get_ocr_cache_key(image_hash, profile):
+    # The same screenshot gives another text when it is OCRed with another profile
+    if not profile:
+        return image_hash
+
+    return f"{image_hash}:{json.dumps(profile, sort_keys=True)}"
+
+
+def get_ocr_profile(model):
+    """Returns the OCR profile of a BMC model from ocr_profiles, or None when screenshots of the model are OCRed as they are"""
+    if model is None:
+        return None
+
+    model_to_profile_mapping = {config_model.lower(): profile for config_model, profile in app.config.get('ocr_profiles').items()}
+    return model_to_profile_mapping.get(model.lower())
+
+
+def preprocess_for_ocr(image, profile):
+    """Returns the part of the screenshot that shows the console, cleaned up for OCR as set in the profile:
+      crop - pixels to cut from the left, top, right and bottom edges (BMC toolbars and status bars)
+      trim_border - cut the solid color border around the console canvas
+      grayscale - drop the colors
+      threshold - binarize, pixels brighter than the threshold become white and the rest black
+      invert - swap dark and light, tesseract reads dark text on a light background best
+      scale - resize by this factor, small console fonts are read better when scaled up
+    """
+    if profile.get('crop'):
+        left, upper, right, lower = profile['crop']
+        image = image.crop((left, upper, image.width - right, image.height - lower))
+
+    if profile.get('trim_border'):
+        image = _trim_border(image)
+
+    if profile.get('grayscale') or profile.get('threshold') is not None or profile.get('invert'):
+        image = image.convert('L')
+
+    if profile.get('threshold') is not None:
+        threshold = profile['threshold']
+        image = image.point(lambda value: 255 if value > threshold else 0)
+
+    if profile.get('invert'):
+        image = ImageOps.invert(image)
+
+    scale = profile.get('scale', 1)
+    if scale != 1:
+        image = image.resize((round(image.width * scale), round(image.height * scale)), Image.BICUBIC)
+
+    return image
+
+
+def _trim_border(image):
+    border_color = image.getpixel((0, 0))
+    difference = ImageChops.difference(image, Image.new(image.mode, image.size, border_color)).convert('L')
+    bounding_box = difference.point(lambda value: 255 if value > TRIM_BORDER_TOLERANCE else 0).getbbox()
+
+    return image.crop(bounding_box) if bounding_box else image
+
+
+def get_ocr_engine():
+    engine = app.config.get('ocr_engine')
+    if engine == 'auto':
+        engine = 'tesserocr' if tesserocr is not None else 'pytesseract'
+
+    return engine
+
+
+def run_ocr(image, engine='pytesseract', decoded_image=None, profile=None):
+    # Runs without an app context so it can be used by the OCR process pool
+    if decoded_image is None:
+        decoded_image = Image.open(io.BytesIO(image))
+
+    if profile:
+        decoded_image = preprocess_for_ocr(decoded_image.convert('RGB'), profile)
+
+    return _run_engine(decoded_image, engine)
+
+
+def _run_engine(image, engine):
+    ocr_engine_to_func_mapping = {
+        'tesserocr': _run_tesserocr,
+        'pytesseract': _run_pytesseract
+    }
+    return ocr_engine_to_func_mapping[engine](image)
+
+
+def _run_pytesseract(image):
+    return pytesseract.image_to_string(image)
+
+
+def _run_tesserocr(image):
+    api = getattr(_tesserocr_local, 'api', None)
+    if api is None:
+        try:
+            api = tesserocr.PyTessBaseAPI()
+        except (AttributeError, RuntimeError) as err:
+            logging.getLogger(__name__).warning(f"Failed to load tesserocr engine, falling back to pytesseract: {err}")
+            return _run_pytesseract(image)
+        _tesserocr_local.api = api
+
+    api.SetImage(image)
+    return api.GetUTF8Text()
+
+
+def get_cached_ocr_text(image_hash):
+    return _get_cached(_ocr_cache, image_hash)
+
+
+def cache_ocr_text(image_hash, ocr_text):
+    _cache(_ocr_cache, image_hash, ocr_text, app.config.get('ocr_cache_size'))
+
+
+def clear_ocr_cache():
+    with _ocr_cache_lock:
+        _ocr_cache.clear()
+        _ocr_band_cache.clear()
+
+
+def _get_cached(cache, key):
+    with _ocr_cache_lock:
+        ocr_text = cache.get(key)
+        if ocr_text is not None:
+            cache.move_to_end(key)
+
+    return ocr_text
+
+
+def _cache(cache, key, ocr_text, cache_size):
+    if not cache_size:
+        return
+
+    with _ocr_cache_lock:
+        cache[key] = ocr_text
+        cache.move_to_end(key)
+        while len(cache) > cache_size:
+            cache.popitem(last=False)
@@ -0,0 +1,122 @@
+import re
+from functools import lru_cache
+from collections import namedtuple
+from flask import current_app as app
+from selenium.webdriver.common.keys import Keys
+
+from exceptions.base import KeystrokeIsInvalid
+
+
+SPECIAL_KEY_COMBO_REGEX = re.compile(r'^keys.([a-z0-9_]+)(\+)?', flags=re.IGNORECASE)
+SPECIAL_KEY_REGEX = re.compile(r'keys.([a-z0-9_]+)(\+|$)', flags=re.IGNORECASE)
+SHIFT_CHARS_REGEX = re.compile(r'[~!@#$%^&*()_+|}{":?><A-Z]')
+
+# Action params like {cred::password}, which are only known when the work runs
+PARAM_REGEX = re.compile(r'(\{[^{}]*\})')
+
+# A step of a keystroke plan:
+#   'char' - type keys (a single char, or a special key ending a combo), holding shift if needed
+#   'special_key' - press a single special key
+#   'key_down' / 'key_up' - hold or release a modifier of a combo
+#   'combo_end' - the end of a key combo, paced like a special key
+#   'param' - an action param, replaced with 'char' steps of its value by render_keystroke_plan
+KeystrokeStep = namedtuple('KeystrokeStep', ['kind', 'keys', 'shift'])
+
+
+@lru_cache(maxsize=1024)
+def get_compiled_template(action_data):
+    """Returns the plan of a keystroke action as it is stored, cached by the stored action data.
+
+    The params are kept as 'param' steps, so rendered values (like credentials) are never part of the cache.
+    """
+    return compile_keystroke_plan(action_data)
+
+
+def compile_keystroke_plan(action_data):
+    """Compiles keystroke action data (';' separated key combos) into a tuple of steps"""
+    step_list = []
+    for key_combo in action_data.split(';'):
+        # Check if key combo includes special key followed by '+' (if so we will need to perform key_down logic)
+        special_keys_match = SPECIAL_KEY_COMBO_REGEX.match(key_combo)
+
+        # No special keys
+        if special_keys_match is None:
+            for text in PARAM_REGEX.split(key_combo):
+                if PARAM_REGEX.fullmatch(text):
+                    step_list.append(KeystrokeStep('param', text, False))
+                else:
+                    step_list += [_get_char_step(char) for char in text]
+
+        # special key without '+' - just press it
+        elif special_keys_match[2] is None:
+            step_list.append(KeystrokeStep('special_key', _get_special_key(special_keys_match[1]), False))
+
+        # special key with '+' - Hold down all keys, press last and release keys
+        else:
+            parsed_key_list = [
+                SPECIAL_KEY_REGEX.sub(lambda m: _get_special_key(m.group(1)), key)
+                for key in key_combo.split('+')
+            ]
+            step_list += [KeystrokeStep('key_down', key, False) for key in parsed_key_list[:-1]]
+            if PARAM_REGEX.fullmatch(parsed_key_list[-1]):
+                step_list.append(KeystrokeStep('param', parsed_key_list[-1], False))
+            else:
+                step_list.append(_get_char_step(parsed_key_list[-1]))
+            step_list += [KeystrokeStep('key_up', key, False) for key in parsed_key_list[:-1]]
+            step_list.append(KeystrokeStep('combo_end', '', False))
+
+    return tuple(step_list)
+
+
+def render_keystroke_plan(plan, render_param):
+    """Returns the plan with each 'param' step replaced by the chars of its value, as returned by render_param"""
+    rendered_step_list = []
+    for step in plan:
+        if step.kind == 'param':
+            rendered_step_list += [_get_char_step(char) for char in render_param(step.keys)]
+        else:
+            rendered_step_list.append(step)
+
+    return tuple(rendered_step_list)
+
+
+def _get_char_step(char):
+    return KeystrokeStep('char', char, SHIFT_CHARS_REGEX.search(char) is not None)
+
+
+def _get_special_key(name):
+    try:
+        return getattr(Keys, name.upper())
+    except AttributeError:
+        raise KeystrokeIsInvalid(name)
+
+
+def get_pacing(model):
+    """Returns the pauses (in seconds) to use when typing on a BMC model, with the model's overrides from keystroke_pacing"""
+    pacing = {
+        'pause_between_chars': app.config.get('pause_between_chars'),
+        'pause_between_keys': app.config.get('pause_between_keys')
+    }
+    pacing.update(app.config.get('keystroke_pacing').get(model.lower(), {}))
+
+    return pacing
+
+
+def add_plan_to_action_chain(action_chain, plan, pacing):
+    for step in plan:
+        if step.kind == 'char':
+            if step.shift:
+                action_chain.key_down(Keys.SHIFT).send_keys(step.keys).key_up(Keys.SHIFT)
+            else:
+                action_chain.send_keys(step.keys)
+            action_chain.pause(pacing['pause_between_chars'])
+        elif step.kind == 'special_key':
+            action_chain.send_keys(step.keys).pause(pacing['pause_between_keys'])
+        elif step.kind == 'key_down':
+            action_chain.key_down(step.keys)
+        elif step.kind == 'key_up':
+            action_chain.key_up(step.keys)
+        elif step.kind == 'combo_end':
+            action_chain.pause(pacing['pause_between_keys'])
+
+    return action_chain
@@ -1,30 +1,135 @@
 import re
+import sre_parse
+import sre_constants
+import ahocorasick
+from collections import namedtuple
 from flask import current_app as app
 
 import services.rule as rule_service
 import services.state as state_service
 
 
-def find_matching_rule(text):
-    rule_list = rule_service.get_all_enabled_ordered()
-    for rule in rule_list:
-        if rule.ignore_case:
-            compiled_regex = re.compile(rule.regex, re.IGNORECASE)
-        else:
-            compiled_regex = re.compile(rule.regex)
+# Literal fragments shorter than this are too common in OCR text to be worth prefiltering on
+MIN_PREFILTER_LITERAL_LENGTH = 3
 
-        match = compiled_regex.search(text)
+CompiledRule = namedtuple('CompiledRule', ['name', 'position', 'regex', 'literal'])
+CompiledRuleSet = namedtuple('CompiledRuleSet', ['version', 'rules', 'prefilter'])
+
+
+def get_compiled_rule_set():
+    # The version is read before loading the rules, so a change committed while loading triggers another rebuild
+    rule_set_version = rule_service.get_rule_set_version()
+    compiled_rule_set = app.compiled_rule_set
+
+    if compiled_rule_set is None or compiled_rule_set.version != rule_set_version:
+        app.logger.debug(f"Compiling rule set version '{rule_set_version}'")
+        compiled_rules = []
+        for rule in rule_service.get_all_enabled_ordered():
+            if rule.ignore_case:
+                compiled_regex = re.compile(rule.regex, re.IGNORECASE)
+            else:
+                compiled_regex = re.compile(rule.regex)
+
+            compiled_rules.append(CompiledRule(rule.name, rule.position, compiled_regex, get_required_literal(compiled_regex)))
+
+        compiled_rule_set = CompiledRuleSet(rule_set_version, compiled_rules, _build_prefilter(compiled_rules))
+        app.compiled_rule_set = compiled_rule_set
+
+    return compiled_rule_set
+
+
+def get_required_literal(compiled_regex):
+    # Returns the longest lowercase ASCII fragment that any match of the regex must contain, or None
+    literals = _get_required_literals(sre_parse.parse(compiled_regex.pattern, compiled_regex.flags))
+    literals = [literal.lower() for literal in literals if literal.isascii() and len(literal) >= MIN_PREFILTER_LITERAL_LENGTH]
+    return max(literals, key=len) if literals else None
+
+
+def _get_required_literals(parsed_pattern):
+    literals = []
+    current_literal = ''
+
+    for op, av in parsed_pattern:
+        if op is sre_constants.LITERAL:
+            current_literal += chr(av)
+            continue
+
+        literals.append(current_literal)
+        current_literal = ''
+
+        if op is sre_constants.SUBPATTERN:
+            literals += _get_required_literals(av[-1])
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            literals += _get_required_literals(av[2])
+
+    literals.append(current_literal)
+    return [literal for literal in literals if literal]
+
+
+def _build_prefilter(compiled_rules):
+    literals = {rule.literal for rule in compiled_rules if rule.literal is not None}
+    if not literals:
+        return None
+
+    automaton = ahocorasick.Automaton()
+    for literal in literals:
+        automaton.add_word(literal, literal)
+    automaton.make_automaton()
+
+    return automaton
+
+
+def _get_candidate_literals(text, prefilter):
+    # The prefilter is case insensitive, which is only safe when case folding can not change the characters involved
+    if prefilter is None or not text.isascii():
+        return None
+
+    return {literal for _end_index, literal in prefilter.iter(text.lower())}
+
+
+def find_matching_rule(text, compiled_rule_set=None):
+    if compiled_rule_set is None:
+        compiled_rule_set = get_compiled_rule_set()
+
+    candidate_literals = _get_candidate_literals(text, compiled_rule_set.prefilter)
+
+    for rule in compiled_rule_set.rules:
+        if candidate_literals is not None and rule.literal is not None and rule.literal not in candidate_literals:
+            continue
+
+        match = rule.regex.search(text)
         if match:
             return rule
 
 
 def match_all_open_states():
+    compiled_rule_set = get_compiled_rule_set()
     open_state_list = state_service.get_open()
 
     for state in open_state_list:
-        matching_rule = find_matching_rule(state.ocr_text)
+        matching_rule = find_matching_rule(state.ocr_text, compiled_rule_set)
+        state.matched_rule = matching_rule.name if matching_rule else None
+
+    app.session.commit()
+
+
+def match_open_states_for_rule(rule_name):
+    # Re-matches only the open states whose match can change after the rule was created, updated or deleted
+    compiled_rule_set = get_compiled_rule_set()
+    compiled_rule = next((rule for rule in compiled_rule_set.rules if rule.name == rule_name), None)
+
+    # The rule may no longer match these states, or a higher priority rule may now come first
+    for state in state_service.get_open_by_matched_rule(rule_name):
+        matching_rule = find_matching_rule(state.ocr_text, compiled_rule_set)
         state.matched_rule = matching_rule.name if matching_rule else None
 
+    # A deleted or disabled rule can not take over other states
+    if compiled_rule is not None:
+        higher_priority_rule_names = [rule.name for rule in compiled_rule_set.rules if rule.position < compiled_rule.position]
+        for state in state_service.get_open_not_matched_by([rule_name] + higher_priority_rule_names):
+            if compiled_rule.regex.search(state.ocr_text):
+                state.matched_rule = rule_name
+
     app.session.commit()
 
 
@@ -0,0 +1,32 @@
+import threading
+
+
+class LatencyHistogram:
+    """Counts durations (in seconds) into cumulative buckets, like a Prometheus histogram"""
+
+    BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+    def __init__(self):
+        self._bucket_counts = [0] * len(self.BUCKETS)
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._count += 1
+            self._sum += seconds
+            for idx, bucket in enumerate(self.BUCKETS):
+                if seconds <= bucket:
+                    self._bucket_counts[idx] += 1
+
+    def to_dict(self):
+        with self._lock:
+            buckets = {str(bucket): count for bucket, count in zip(self.BUCKETS, self._bucket_counts)}
+            buckets['+Inf'] = self._count
+
+            return {
+                'count': self._count,
+                'sum': round(self._sum, 3),
+                'buckets': buckets
+            }
@@ -56,6 +56,7 @@ def get_rule_request_parser():
     parser.add_argument('name', required=True, location='json', type=non_empty_string)
     parser.add_argument('state_id', required=False, location='json', type=int)
     parser.add_argument('screenshot', required=False, location='json', type=non_empty_string)
+    parser.add_argument('model', required=False, location='json', type=non_empty_string)
     parser.add_argument('regex', required=True, location='json', type=non_empty_string)
     parser.add_argument('actions', required=True, location='json', type=list)
     parser.add_argument('ignore_case', required=False, location='json', type=bool, default=True)
@@ -144,6 +145,17 @@ def get_work_request_parser():
     parser.add_argument('device_uid', required=True, location='json', type=non_empty_string)
     parser.add_argument('actions', required=False, location='json', type=list)
     parser.add_argument('rule', required=False, location='json', type=non_empty_string)
+    parser.add_argument('priority', required=False, location='json', type=int)
+
+    return parser.copy()
+
+
+def get_bulk_work_request_parser():
+    parser = get_base_parser()
+    parser.add_argument('action', required=True, location='json', type=non_empty_string)
+    parser.add_argument('device_uids', required=False, location='json', type=list)
+    parser.add_argument('metadata', required=False, location='json', type=dict)
+    parser.add_argument('zombie', required=False, location='json', type=bool)
 
     return parser.copy()
 
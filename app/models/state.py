@@ -17,6 +17,9 @@ class State(Base):
     device_uid = Column(String, nullable=False)
     resolved = Column(Boolean, nullable=False, default=False)
     matched_rule = Column(Integer, ForeignKey(f"{SCHEMA}.rule.name"), nullable=True)
+    ocr_pending = Column(Boolean, nullable=False, default=False, server_default='0')
+    screenshot_hash = Column(String, nullable=True)
+    last_seen = Column(DateTime, default=datetime.datetime.now)
     last_updated = Column(DateTime, onupdate=datetime.datetime.now, default=datetime.datetime.now)
     created_at = Column(DateTime, default=datetime.datetime.now)
 
@@ -30,6 +33,9 @@ class State(Base):
                f"device_uid='{self.device_uid}', " \
                f"resolved='{self.resolved}', " \
                f"matched_rule='{self.matched_rule}', " \
+               f"ocr_pending='{self.ocr_pending}', " \
+               f"screenshot_hash='{self.screenshot_hash}', " \
+               f"last_seen='{self.last_seen}', " \
                f"last_updated='{self.last_updated}', " \
                f"created_at='{self.created_at}')>"
 
@@ -41,6 +47,8 @@ class State(Base):
             "device_uid": self.device_uid,
             "resolved": self.resolved,
             "matched_rule": self.matched_rule,
+            "ocr_pending": self.ocr_pending,
+            "last_seen": self.last_seen.isoformat() if self.last_seen else None,
             "last_updated": self.last_updated.isoformat(),
             "created_at": self.created_at.isoformat()
         }
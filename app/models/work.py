@@ -1,14 +1,18 @@
 import datetime
 from sqlalchemy.types import DateTime
 from sqlalchemy.orm import relationship
-from sqlalchemy import Column, Integer, String, Boolean, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, JSON, ForeignKey, Index
 
 from helpers.db import Base, SCHEMA
 
 
 class Work(Base):
     __tablename__ = "work"
-    __table_args__ = {'schema': SCHEMA}
+    __table_args__ = (
+        # claim order of pending work - highest priority, oldest first
+        Index('ix_work_claim_order', 'status', 'assigned', 'priority', 'created_at'),
+        {'schema': SCHEMA}
+    )
 
     work_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     state_id = Column(Integer, ForeignKey(f"{SCHEMA}.state.state_id"))
@@ -16,6 +20,10 @@ class Work(Base):
     actions = Column(JSON, nullable=False)
     trigger = Column(String, nullable=False)
     requires_console = Column(Boolean, nullable=False)
+    priority = Column(Integer, nullable=False, default=0, server_default='0')
+    # a work parked by a sleep action resumes from actions_completed once resume_at has passed
+    actions_completed = Column(Integer, nullable=False, default=0, server_default='0')
+    resume_at = Column(DateTime)
     assigned = Column(DateTime)
     status = Column(String, nullable=False, default="PENDING")
     last_updated = Column(DateTime, onupdate=datetime.datetime.now, default=datetime.datetime.now)
@@ -31,6 +39,9 @@ class Work(Base):
                f"actions='{self.actions}', " \
                f"trigger='{self.trigger}', " \
                f"requires_console='{self.requires_console}', " \
+               f"priority='{self.priority}', " \
+               f"actions_completed='{self.actions_completed}', " \
+               f"resume_at='{self.resume_at}', " \
                f"assigned='{self.assigned}', " \
                f"status='{self.status}', " \
                f"last_updated='{self.last_updated}', " \
@@ -44,8 +55,26 @@ class Work(Base):
             "actions": self.actions,
             "trigger": self.trigger,
             "requires_console": self.requires_console,
+            "priority": self.priority,
+            "actions_completed": self.actions_completed,
+            "resume_at": self.resume_at.isoformat() if self.resume_at else None,
             "assigned": self.assigned.isoformat() if self.assigned else None,
             "status": self.status,
             "last_updated": self.last_updated.isoformat(),
             "created_at": self.created_at.isoformat()
         }
+
+
+class WorkLastAssigned(Base):
+    """When work of a device or of a trigger was last claimed, used to keep the claim order fair"""
+    __tablename__ = "work_last_assigned"
+    __table_args__ = {'schema': SCHEMA}
+
+    kind = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    assigned = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<WorkLastAssigned(kind='{self.kind}', " \
+               f"key='{self.key}', " \
+               f"assigned='{self.assigned}')>"
@@ -0,0 +1,15 @@
+from http import HTTPStatus
+from flask_restplus import Resource, Namespace
+
+import handler.console as console_handler
+
+ns = Namespace('Console', description='Console login statistics')
+
+
+@ns.route('/login-timing')
+class ConsoleLoginTiming(Resource):
+
+    @ns.doc('get latency histograms of console login steps, by model and step')
+    @ns.response(HTTPStatus.OK, 'Success')
+    def get(self):
+        return {"login_timing": console_handler.get_login_step_timing()}, HTTPStatus.OK
@@ -34,6 +34,7 @@ class Rule(Resource):
             'name': args.get('name'),
             'state_id': args.get('state_id'),
             'screenshot': args.get('screenshot'),
+            'model': args.get('model'),
             'regex': args.get('regex'),
             'actions': args.get('actions'),
             'ignore_case': args.get('ignore_case'),
@@ -56,7 +57,7 @@ class Rule(Resource):
             if req_data['screenshot'] is None:
                 validation_helper.validate_rule_state_id(state_id=req_data['state_id'])
             rule = rule_service.create(**req_data)
-            matcher_helper.match_all_open_states()
+            matcher_helper.match_open_states_for_rule(rule.name)
         except RuleAlreadyExist as err:
             abort(HTTPStatus.CONFLICT, f"Rule with name '{err.name}' already exist")
         except ActionNotFound as err:
@@ -99,7 +100,7 @@ class Rule(Resource):
                 validation_helper.validate_regex(regex_string=req_data['regex'])
 
             rule = rule_service.update(**{k: v for k, v in req_data.items() if v is not None})
-            matcher_helper.match_all_open_states()
+            matcher_helper.match_open_states_for_rule(rule.name)
         except RuleNameNotFound as err:
             abort(HTTPStatus.NOT_FOUND, f"Rule with name '{err.name}' was not found")
         except ActionNotFound as err:
@@ -125,7 +126,7 @@ class Rule(Resource):
 
         try:
             rule = rule_service.delete_by_name(req_data['name'])
-            matcher_helper.match_all_open_states()
+            matcher_helper.match_open_states_for_rule(req_data['name'])
         except RuleNameNotFound as err:
             abort(HTTPStatus.NOT_FOUND, f"Rule with name '{err.name}' was not found")
 
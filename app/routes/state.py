@@ -9,6 +9,8 @@ import helpers.req_parser as req_parser_helper
 
 import services.state as state_service
 
+import handler.ocr as ocr_handler
+
 from exceptions.base import StateNotFound, StateNotFoundForDevice
 
 
@@ -40,8 +42,13 @@ class State(Resource):
 
         app.logger.debug(f"Got state update request - {logging_helper.dict_to_log_string(req_data)}")
 
-        state = state_service.create_or_update(**req_data)
-        matcher_helper.match_state(state)
+        state, is_seen_again = state_service.create_or_update(**req_data)
+        # A screenshot seen again keeps the OCR text and matched rule of the state
+        if not is_seen_again:
+            if state.ocr_pending:
+                ocr_handler.submit_state_ocr(state)
+            else:
+                matcher_helper.match_state(state)
 
         return {"state": state.to_dict()}, HTTPStatus.OK
 
@@ -61,8 +68,13 @@ class State(Resource):
 
         app.logger.debug(f"Got state update request - {logging_helper.dict_to_log_string(req_data)}")
 
-        state = state_service.create_or_update_from_file(**req_data)
-        matcher_helper.match_state(state)
+        state, is_seen_again = state_service.create_or_update_from_file(**req_data)
+        # A screenshot seen again keeps the OCR text and matched rule of the state
+        if not is_seen_again:
+            if state.ocr_pending:
+                ocr_handler.submit_state_ocr(state)
+            else:
+                matcher_helper.match_state(state)
 
         return {"state": state.to_dict()}, HTTPStatus.OK
 
@@ -9,11 +9,14 @@ import helpers.convertor as convertor_helper
 
 import services.work as work_service
 
-from exceptions.base import WorkNotFound, WorkNotFoundForDevice, WorkIsNotPending, ActionNotFound, RuleNameNotFound, DeviceNotFound, WorkAlreadyExistForDevice, ManualWorkMustHaveRuleOrActions
+import handler.bulk as bulk_handler
+
+from exceptions.base import WorkNotFound, WorkNotFoundForDevice, WorkIsNotPending, ActionNotFound, RuleNameNotFound, DeviceNotFound, WorkAlreadyExistForDevice, ManualWorkMustHaveRuleOrActions, BulkWorkMustHaveDeviceSelector, BulkWorkActionNotSupported
 
 
 ns = Namespace('Work', description='Handle work')
 work_parser = req_parser_helper.get_work_request_parser()
+bulk_work_parser = req_parser_helper.get_bulk_work_request_parser()
 id_parser = req_parser_helper.get_id_parser()
 uid_parser = req_parser_helper.get_uid_parser()
 work_complete_parser = req_parser_helper.get_work_complete_parser()
@@ -34,7 +37,8 @@ class Work(Resource):
         req_data = {
             'device_uid': args.get('device_uid'),
             'actions': args.get('actions'),
-            'rule': args.get('rule')
+            'rule': args.get('rule'),
+            'priority': args.get('priority')
         }
 
         try:
@@ -55,6 +59,50 @@ class Work(Resource):
         return {"work": work.to_dict()}, HTTPStatus.OK
 
 
+@ns.route('/bulk')
+class BulkWork(Resource):
+
+    @ns.doc('Run an ipmitool or power action on all the selected devices')
+    @ns.expect(bulk_work_parser)
+    @ns.response(HTTPStatus.OK, 'Success')
+    @ns.response(HTTPStatus.BAD_REQUEST, 'Input Validation Error')
+    @ns.response(HTTPStatus.UNPROCESSABLE_ENTITY, 'Unprocessable entity')
+    def post(self):
+        args = bulk_work_parser.parse_args()
+
+        req_data = {
+            'action': args.get('action'),
+            'device_uids': args.get('device_uids'),
+            'metadata': args.get('metadata'),
+            'zombie': args.get('zombie')
+        }
+
+        app.logger.debug(f"Got bulk work request - {logging_helper.dict_to_log_string(req_data)}")
+
+        try:
+            work_data_list, skipped_device_uid_list = convertor_helper.create_bulk_work_for_devices(**req_data)
+        except ActionNotFound as err:
+            abort(HTTPStatus.UNPROCESSABLE_ENTITY, f"Action with name '{err.name}' was not found")
+        except BulkWorkActionNotSupported as err:
+            abort(HTTPStatus.UNPROCESSABLE_ENTITY, f"Action '{err.name}' of type '{err.action_type}' is not supported for bulk work")
+        except BulkWorkMustHaveDeviceSelector:
+            abort(HTTPStatus.UNPROCESSABLE_ENTITY, "One of 'device_uids', 'metadata' or 'zombie' must be set for bulk work")
+
+        if not work_data_list:
+            work_list = []
+        elif app.config.get('run_work'):
+            work_list = work_service.create_many_claimed(work_data_list)
+            bulk_handler.start_bulk_work([work.work_id for work in work_list])
+        else:
+            # This server does not run work, so the works are claimed one by one by the executors like any other work
+            work_list = work_service.create_many_unclaimed(work_data_list)
+
+        return {
+            "works": [work.to_dict() for work in work_list],
+            "skipped_devices": skipped_device_uid_list
+        }, HTTPStatus.OK
+
+
 @ns.route('/assign')
 class AssignWork(Resource):
 
@@ -62,7 +110,8 @@ class AssignWork(Resource):
     @ns.response(HTTPStatus.OK, 'Success')
     def post(self):
 
-        assignment = work_service.get_assignment()
+        # Assignments sent over the API keep the keystroke action data as text
+        assignment = work_service.get_assignment(compile_keystrokes=False)
 
         return {"assignment": assignment}, HTTPStatus.OK
 
@@ -1,5 +1,7 @@
 from flask import current_app as app
 
+import helpers.keystroke as keystroke_helper
+
 from models.action import Action
 from exceptions.base import ActionNotFound, ActionAlreadyExist
 
@@ -22,6 +24,7 @@ def create(**kwargs):
     else:
         raise ActionAlreadyExist(name)
 
+    _compile_keystroke_action(kwargs['action_type'], kwargs['action_data'])
     action = Action(**kwargs)
     app.logger.debug(f"Updating Action in DB - {action}")
     app.session.add(action)
@@ -33,6 +36,7 @@ def create(**kwargs):
 def update(**kwargs):
     name = kwargs['name']
     action = get_by_name(name)
+    _compile_keystroke_action(kwargs.get('action_type', action.action_type), kwargs.get('action_data', action.action_data))
     for key, val in kwargs.items():
         setattr(action, key, val)
 
@@ -42,6 +46,12 @@ def update(**kwargs):
     return action
 
 
+def _compile_keystroke_action(action_type, action_data):
+    # Raises KeystrokeIsInvalid before the action is saved, the compiled plan is cached for the works running the action
+    if action_type == 'keystroke':
+        keystroke_helper.get_compiled_template(action_data)
+
+
 def get_all():
     action_list = app.session.query(Action).all()
     return action_list
@@ -15,6 +15,23 @@ def get_zombies():
     return device_list
 
 
+def get_by_selector(*, uid_list=None, metadata=None, zombie=None):
+    query = app.session.query(Device)
+    if uid_list is not None:
+        query = query.filter(Device.uid.in_(uid_list))
+    if zombie is not None:
+        query = query.filter(Device.zombie.is_(zombie))
+
+    device_list = query.all()
+    if metadata is not None:
+        device_list = [
+            device for device in device_list
+            if all((device.device_metadata or {}).get(key) == value for key, value in metadata.items())
+        ]
+
+    return device_list
+
+
 def get_by_uid(uid):
     device = app.session.query(Device).get(uid)
     if device is None:
@@ -1,5 +1,4 @@
-import io
-
+import threading
 from flask import current_app as app
 
 from models.rule import Rule, RuleOrder
@@ -8,6 +7,9 @@ import helpers.image as image_helper
 from exceptions.base import RuleNameNotFound, RuleAlreadyExist
 
 
+_rule_set_version_lock = threading.Lock()
+
+
 def get_by_name(name):
     rule = app.session.query(Rule).filter(Rule.name == name).first()
     if rule is None:
@@ -39,9 +41,11 @@ def create(**kwargs):
         new_position = get_by_name(after_rule).position
         update_position = True
 
+    # The screenshot is OCRed with the profile of its model, like the states of devices of the model
+    model = kwargs.pop('model', None)
     if kwargs['screenshot'] is not None:
         screenshot = image_helper.decode_image(kwargs['screenshot'])
-        ocr_text = image_helper.get_ocr_text(io.BytesIO(screenshot))
+        ocr_text = image_helper.get_ocr_text(screenshot, profile=image_helper.get_ocr_profile(model))
     else:
         state = state_service.get_by_id(kwargs['state_id'])
         screenshot = state.screenshot
@@ -57,6 +61,7 @@ def create(**kwargs):
 
     app.logger.debug(f"Updating Rule in DB - {rule}")
     app.session.commit()
+    _bump_rule_set_version()
 
     return rule
 
@@ -89,6 +94,7 @@ def update(**kwargs):
 
     app.logger.debug(f"Updating Rule in DB - {rule}")
     app.session.commit()
+    _bump_rule_set_version()
 
     return rule
 
@@ -115,9 +121,20 @@ def delete_by_name(name):
     app.session.delete(rule)
     rule_order.rules.reorder()
     app.session.commit()
+    _bump_rule_set_version()
     return rule
 
 
+def get_rule_set_version():
+    return app.rule_set_version
+
+
+def _bump_rule_set_version():
+    # Must be called after the rule change is committed, see matcher_helper.get_compiled_rule_set
+    with _rule_set_version_lock:
+        app.rule_set_version += 1
+
+
 def get_rules_with_action(action_name):
     rules = app.session.query(Rule).filter(Rule.actions.contains(f'"{action_name}"')).all()
     return rules
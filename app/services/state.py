@@ -1,10 +1,14 @@
-import re
 import io
+import re
+import datetime
+from PIL import Image
+from sqlalchemy import or_
 from flask import current_app as app
 
 from models.state import State
 import helpers.image as image_helper
-from exceptions.base import StateNotFound, StateNotFoundForDevice
+import services.device as device_service
+from exceptions.base import StateNotFound, StateNotFoundForDevice, DeviceNotFound
 
 
 def get_by_id(state_id):
@@ -72,6 +76,19 @@ def get_open(device_uid=None, regex=None):
     return _filter_by_regex(state_list, regex)
 
 
+def get_open_by_matched_rule(rule_name):
+    state_list = app.session.query(State).filter(State.resolved.is_(False), State.matched_rule == rule_name).all()
+    return state_list
+
+
+def get_open_not_matched_by(rule_name_list):
+    state_list = app.session.query(State).filter(
+        State.resolved.is_(False),
+        or_(State.matched_rule.is_(None), State.matched_rule.notin_(rule_name_list))
+    ).all()
+    return state_list
+
+
 def get_resolved(device_uid=None, regex=None):
     if device_uid is None:
         state_list = app.session.query(State).filter(State.resolved.is_(True)).all()
@@ -107,25 +124,88 @@ def _filter_by_regex(state_list, regex):
 
 def create_or_update(*, device_uid, screenshot, resolved):
     decoded_screenshot = image_helper.decode_image(screenshot)
-    ocr_text = image_helper.get_ocr_text(io.BytesIO(decoded_screenshot))
-    return _create_or_update(device_uid=device_uid, screenshot=decoded_screenshot, resolved=resolved, ocr_text=ocr_text)
+    return _create_or_update(device_uid=device_uid, screenshot=decoded_screenshot, resolved=resolved)
 
 
 def create_or_update_from_file(*, device_uid, screenshot, resolved):
     screenshot_to_save = screenshot.read()
-    ocr_text = image_helper.get_ocr_text(screenshot)
-    return _create_or_update(device_uid=device_uid, screenshot=screenshot_to_save, resolved=resolved, ocr_text=ocr_text)
+    return _create_or_update(device_uid=device_uid, screenshot=screenshot_to_save, resolved=resolved)
+
+
+def create_or_update_from_screenshot(*, device_uid, screenshot, screenshot_image=None, resolved):
+    # screenshot_image is the decoded screenshot when the caller already has it, so OCR does not decode the PNG again
+    return _create_or_update(device_uid=device_uid, screenshot=screenshot, screenshot_image=screenshot_image, resolved=resolved)
+
+
+def complete_ocr(*, state_id, image_hash, ocr_text):
+    state = app.session.query(State).get(state_id)
+    if state is None or not state.ocr_pending or image_helper.get_image_hash(state.screenshot) != image_hash:
+        app.logger.debug(f"Discarding OCR result for state '{state_id}' since its screenshot has changed")
+        return None
+
+    state.ocr_text = ocr_text
+    state.ocr_pending = False
+    app.session.commit()
+    return state
+
+
+def get_ocr_profile(device_uid):
+    try:
+        device = device_service.get_by_uid(device_uid)
+    except DeviceNotFound:
+        return None
+
+    return image_helper.get_ocr_profile(device.model)
+
+
+def _get_ocr_text(screenshot, screenshot_image, profile):
+    # When OCR is async only cached results are used here, None means the OCR is left to the OCR pool
+    if app.config.get('async_ocr'):
+        return image_helper.get_cached_ocr_text(image_helper.get_ocr_cache_key(image_helper.get_image_hash(screenshot), profile))
+    else:
+        return image_helper.get_ocr_text(screenshot, decoded_image=screenshot_image, profile=profile)
 
 
-def _create_or_update(*, device_uid, screenshot, ocr_text, resolved):
+def _create_or_update(*, device_uid, screenshot, resolved, screenshot_image=None):
+    """Returns the device's open state and whether the screenshot was only seen again on it.
+
+    A screenshot within duplicate_screenshot_max_distance of the open state's screenshot only bumps its last_seen,
+    without OCR, rewriting the screenshot or matching rules again. A distance of 0 means the very same screenshot,
+    and a negative distance turns the check off.
+    """
     # TODO - handle and throw DeviceNotFound Error
     try:
         state = get_open_by_device(device_uid)
-
     except StateNotFoundForDevice:
+        state = None
+
+    max_distance = app.config.get('duplicate_screenshot_max_distance')
+    screenshot_hash = None
+    if max_distance is not None and max_distance >= 0:
+        if max_distance > 0:
+            if screenshot_image is None:
+                screenshot_image = Image.open(io.BytesIO(screenshot))
+            screenshot_hash = image_helper.get_screenshot_hash(screenshot_image)
+
+        if state is not None and resolved in (None, state.resolved) and _is_seen_again(state, screenshot, screenshot_hash, max_distance):
+            app.logger.debug(f"Screenshot of device '{device_uid}' is a duplicate of state '{state.state_id}', only updating last seen")
+            # last_updated is set as is, so it keeps the time the screenshot last changed
+            app.session.query(State).filter(State.state_id == state.state_id).update(
+                {State.last_seen: datetime.datetime.now(), State.last_updated: State.last_updated},
+                synchronize_session=False
+            )
+            app.session.commit()
+            return state, True
+
+    ocr_text = _get_ocr_text(screenshot, screenshot_image, get_ocr_profile(device_uid))
+    ocr_pending = ocr_text is None
+
+    if state is None:
         state = State(
             screenshot=screenshot,
-            ocr_text=ocr_text,
+            screenshot_hash=screenshot_hash,
+            ocr_text=ocr_text or '',
+            ocr_pending=ocr_pending,
             device_uid=device_uid,
             resolved=resolved
         )
@@ -133,10 +213,24 @@ def _create_or_update(*, device_uid, screenshot, ocr_text, resolved):
 
     else:
         state.screenshot = screenshot
-        state.ocr_text = ocr_text
+        state.screenshot_hash = screenshot_hash
+        state.last_seen = datetime.datetime.now()
+        state.ocr_text = ocr_text or ''
+        state.ocr_pending = ocr_pending
         if resolved is not None:
             state.resolved = resolved
 
     app.logger.debug(f"Updating state in DB '{state}'...")
     app.session.commit()
-    return state
+    return state, False
+
+
+def _is_seen_again(state, screenshot, screenshot_hash, max_distance):
+    # The difference hash does not see small changes like a new line of text, so a distance of 0 compares the content
+    if max_distance == 0:
+        return image_helper.get_image_hash(state.screenshot) == image_helper.get_image_hash(screenshot)
+
+    if state.screenshot_hash is None or len(state.screenshot_hash) != len(screenshot_hash):
+        return False
+
+    return image_helper.get_hash_distance(state.screenshot_hash, screenshot_hash) <= max_distance
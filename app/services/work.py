@@ -1,13 +1,24 @@
 import re
 import datetime
-from sqlalchemy import or_
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import aliased
 from flask import current_app as app
 
-from models.work import Work
+from models.work import Work, WorkLastAssigned
+import helpers.keystroke as keystroke_helper
 import services.creds as creds_service
 import services.device as device_service
 import services.execution as execution_service
-from exceptions.base import WorkNotFound, WorkNotFoundForDevice, WorkIsNotPending, CredsNameNotFound
+from exceptions.base import WorkNotFound, WorkNotFoundForDevice, WorkIsNotPending, CredsNameNotFound, KeystrokeIsInvalid
+
+
+# How many unassigned works to try when the first ones are claimed concurrently
+CLAIM_CANDIDATE_COUNT = 10
+
+# Default priority of work by its trigger, higher priority work is claimed first
+MANUAL_WORK_PRIORITY = 30
+RULE_WORK_PRIORITY = 20
+ZOMBIE_SCREENSHOT_WORK_PRIORITY = 10
 
 
 def get_by_id(work_id):
@@ -64,101 +75,206 @@ def get_assingned_and_pending():
     return work_list
 
 
-def get_assignment():
+def claim(work_id):
+    # A conditional update, so only one of several concurrent callers can claim the work
+    claimed_timestamp = datetime.datetime.now()
+    claimed_count = app.session.query(Work).filter(
+        Work.work_id == work_id,
+        Work.status == 'PENDING',
+        Work.assigned.is_(None)
+    ).update({Work.assigned: claimed_timestamp}, synchronize_session=False)
+    if claimed_count == 1:
+        _set_last_assigned(app.session.query(Work.device_uid, Work.trigger).filter(Work.work_id == work_id).all(), claimed_timestamp)
+    app.session.commit()
+
+    return claimed_count == 1
+
+
+def release_claim(work_id):
+    work = get_by_id(work_id)
+    work.assigned = None
+    app.session.commit()
+
+
+def _set_last_assigned(device_uid_and_trigger_list, claimed_timestamp):
+    # Kept in its own small table, so ordering the pending work does not look through the whole work history
+    last_assigned_list = []
+    for device_uid, trigger in device_uid_and_trigger_list:
+        last_assigned_list.append({'kind': 'device', 'key': device_uid, 'assigned': claimed_timestamp})
+        last_assigned_list.append({'kind': 'trigger', 'key': trigger, 'assigned': claimed_timestamp})
+
+    if last_assigned_list:
+        app.session.execute(WorkLastAssigned.__table__.insert().prefix_with('OR REPLACE'), last_assigned_list)
+
+
+def _claim_next_work(requires_console=None, device_uid=None):
+    query = app.session.query(Work.work_id).filter(
+        Work.status == 'PENDING',
+        Work.assigned.is_(None),
+        or_(Work.resume_at.is_(None), Work.resume_at <= datetime.datetime.now())
+    )
+    if requires_console is not None:
+        query = query.filter(Work.requires_console == requires_console)
+    if device_uid is not None:
+        query = query.filter(Work.device_uid == device_uid)
+
+    # Within the same priority, devices and triggers that were served least recently go first (never served sorts first),
+    # so a single noisy device or rule can not starve the rest
+    device_last_assigned = aliased(WorkLastAssigned)
+    trigger_last_assigned = aliased(WorkLastAssigned)
+    query = query.outerjoin(
+        device_last_assigned, and_(device_last_assigned.kind == 'device', device_last_assigned.key == Work.device_uid)
+    ).outerjoin(
+        trigger_last_assigned, and_(trigger_last_assigned.kind == 'trigger', trigger_last_assigned.key == Work.trigger)
+    ).order_by(
+        Work.priority.desc(),
+        device_last_assigned.assigned,
+        trigger_last_assigned.assigned,
+        Work.created_at
+    )
+    candidate_work_id_list = [work_id for work_id, in query.limit(CLAIM_CANDIDATE_COUNT)]
+
+    for work_id in candidate_work_id_list:
+        if claim(work_id):
+            return get_by_id(work_id)
+
+        app.logger.debug(f"Work '{work_id}' was claimed by another executor")
+
+
+def get_assignment(requires_console=None, compile_keystrokes=True):
+    work = _claim_next_work(requires_console)
+    if work:
+        return get_assignment_for_claimed_work(work, compile_keystrokes=compile_keystrokes)
+
+
+def get_console_assignment_for_device(device_data):
+    """Claims the device's next console work, to run it in the console that is already open with device_data"""
+    work = _claim_next_work(requires_console=True, device_uid=device_data['uid'])
+    if not work:
+        return None
+
+    assignment = get_assignment_for_claimed_work(work)
+    if assignment and assignment['device_data'] != device_data:
+        # the device IP or credentials changed since the console was opened
+        release_claim(work.work_id)
+        return None
+
+    return assignment
+
+
+def get_assignment_for_claimed_work(work, compile_keystrokes=True):
+    """Returns the work with its actions rendered for the device.
+
+    With compile_keystrokes the data of keystroke actions is their compiled plan, otherwise it is rendered text like other actions.
+    """
     # we create a new SafeDict class to ignore missing params
     class SafeDict(dict):
         def __missing__(self, key):
             return '{' + key + '}'
 
-    work = app.session.query(Work).filter(Work.status == 'PENDING', Work.assigned.is_(None)).first()
-    if work:
-        device = device_service.get_by_uid(work.device_uid)
-        if device.creds_name == creds_service.DEFAULT_CRED_NAME:
-            creds = creds_service.get_default()
-        else:
-            creds = creds_service.get_by_name(device.creds_name)
-
-        if creds is None:
-            app.logger.warning("Not assigning work since no credentials were found")
+    device = device_service.get_by_uid(work.device_uid)
+    if device.creds_name == creds_service.DEFAULT_CRED_NAME:
+        creds = creds_service.get_default()
+    else:
+        creds = creds_service.get_by_name(device.creds_name)
+
+    if creds is None:
+        app.logger.warning("Not assigning work since no credentials were found")
+        release_claim(work.work_id)
+        return
+
+    params = SafeDict({
+        'cred': {
+            'username': creds.username,
+            'password': creds.password
+        },
+        'device': {
+            'uid': device.uid,
+            'ipmi_ip': device.ipmi_ip,
+            'model': device.model
+        },
+        'metadata': device.device_metadata
+    })
+
+    parsed_actions = []
+    for action in work.actions:
+        try:
+            if action['type'] == 'keystroke' and compile_keystrokes:
+                action_data = _render_keystroke_plan(action['data'], params)
+            else:
+                action_data = _render_action_data(action['data'], params)
+        except CredsNameNotFound as err:
+            app.logger.warning(f"Marking work as failed due to missing cred from cred store: {err.name}")
+            execution_service.create(**{
+                'work_id': work.work_id,
+                'state_id': work.state_id,
+                'trigger': work.trigger,
+                'action_name': 'Missing cred from store',
+                'status': 'failure',
+                'elapsed_time': 0.0,
+                'run_data': f"Action '{action['name']}' requires the cred '{err.name}' but it was not found"
+            })
+            complete_by_id(
+                work_id=work.work_id,
+                status='failure'
+            )
             return
-
-        params = SafeDict({
-            'cred': {
-                'username': creds.username,
-                'password': creds.password
-            },
-            'device': {
-                'uid': device.uid,
-                'ipmi_ip': device.ipmi_ip,
-                'model': device.model
-            },
-            'metadata': device.device_metadata
-        })
-
-        parsed_actions = []
-        for action in work.actions:
-            try:
-                cred_store_match_list = re.findall(r'\{cred_store::([^}]*?)::([^}]*?)?\}', action['data'])
-                for match in cred_store_match_list:
-                    cred = creds_service.get_by_name(match[0])
-                    action['data'] = action['data'].replace(f"{{cred_store::{match[0]}::{match[1]}}}", getattr(cred, match[1]))
-            except CredsNameNotFound as err:
-                app.logger.warning(f"Marking work as failed due to missing cred from cred store: {err.name}")
-                execution_service.create(**{
-                    'work_id': work.work_id,
-                    'state_id': work.state_id,
-                    'trigger': work.trigger,
-                    'action_name': 'Missing cred from store',
-                    'status': 'failure',
-                    'elapsed_time': 0.0,
-                    'run_data': f"Action '{action['name']}' requires the cred '{err.name}' but it was not found"
-                })
-                complete_by_id(
-                    work_id=work.work_id,
-                    status='failure'
-                )
-                return
-
-            compiled_action_data = re.sub(r'\{([^:}]*?)::([^}]*?)\}', r'{\1[\2]}', action['data'])
-            try:
-                action['data'] = compiled_action_data.format_map(params)
-            except KeyError as err:
-                app.logger.warning(f"Marking work as failed due to unknown metadata key: {err.args[0]}")
-                execution_service.create(**{
-                    'work_id': work.work_id,
-                    'state_id': work.state_id,
-                    'trigger': work.trigger,
-                    'action_name': 'Missing metadata key',
-                    'status': 'failure',
-                    'elapsed_time': 0.0,
-                    'run_data': f"Action '{action['name']}' requires the metadata key '{err.args[0]}' but it is not defined on the device"
-                })
-                complete_by_id(
-                    work_id=work.work_id,
-                    status='failure'
-                )
-                return
-            parsed_actions.append(action)
-
-        assignment = {
-            'work_id': work.work_id,
-            'state_id': work.state_id,
-            'trigger': work.trigger,
-            'requires_console': work.requires_console,
-            'action_list': parsed_actions,
-            'device_data': {
-                'uid': device.uid,
-                'ip': device.ipmi_ip,
-                'username': creds.username,
-                'password': creds.password,
-                'model': device.model,
-            }
+        except KeyError as err:
+            app.logger.warning(f"Marking work as failed due to unknown metadata key: {err.args[0]}")
+            execution_service.create(**{
+                'work_id': work.work_id,
+                'state_id': work.state_id,
+                'trigger': work.trigger,
+                'action_name': 'Missing metadata key',
+                'status': 'failure',
+                'elapsed_time': 0.0,
+                'run_data': f"Action '{action['name']}' requires the metadata key '{err.args[0]}' but it is not defined on the device"
+            })
+            complete_by_id(
+                work_id=work.work_id,
+                status='failure'
+            )
+            return
+        parsed_actions.append({**action, 'data': action_data})
+
+    assignment = {
+        'work_id': work.work_id,
+        'state_id': work.state_id,
+        'trigger': work.trigger,
+        'requires_console': work.requires_console,
+        'actions_completed': work.actions_completed,
+        'action_list': parsed_actions,
+        'device_data': {
+            'uid': device.uid,
+            'ip': device.ipmi_ip,
+            'username': creds.username,
+            'password': creds.password,
+            'model': device.model,
         }
+    }
+
+    return assignment
+
+
+def _render_action_data(action_data, params):
+    cred_store_match_list = re.findall(r'\{cred_store::([^}]*?)::([^}]*?)?\}', action_data)
+    for match in cred_store_match_list:
+        cred = creds_service.get_by_name(match[0])
+        action_data = action_data.replace(f"{{cred_store::{match[0]}::{match[1]}}}", getattr(cred, match[1]))
 
-        work.assigned = datetime.datetime.now()
-        app.session.commit()
+    compiled_action_data = re.sub(r'\{([^:}]*?)::([^}]*?)\}', r'{\1[\2]}', action_data)
+    return compiled_action_data.format_map(params)
 
-        return assignment
+
+def _render_keystroke_plan(action_data, params):
+    # The plan is compiled from the stored action data, only the values of its params are rendered for the device
+    try:
+        plan = keystroke_helper.get_compiled_template(action_data)
+    except KeystrokeIsInvalid:
+        # saved before keystrokes were validated, the action fails when it runs
+        return _render_action_data(action_data, params)
+
+    return keystroke_helper.render_keystroke_plan(plan, lambda param: _render_action_data(param, params))
 
 
 def create(work_data):
@@ -166,12 +282,51 @@ def create(work_data):
     app.logger.debug(f"Creating work '{work}'...")
     app.session.add(work)
     app.session.commit()
+    _notify_work_dispatcher()
     return work
 
 
 def create_many(work_data_list):
     app.session.bulk_save_objects([Work(**work_data) for work_data in work_data_list])
     app.session.commit()
+    _notify_work_dispatcher()
+
+
+def create_many_claimed(work_data_list):
+    # The works are claimed on creation, so they are run by the caller and not by the work dispatcher
+    claimed_timestamp = datetime.datetime.now()
+    work_list = [Work(**work_data, assigned=claimed_timestamp) for work_data in work_data_list]
+    app.session.add_all(work_list)
+    _set_last_assigned({(work_data['device_uid'], work_data['trigger']) for work_data in work_data_list}, claimed_timestamp)
+    app.session.commit()
+    return work_list
+
+
+def create_many_unclaimed(work_data_list):
+    # Same as create_many, returning the works, which are left for the executors that ask for work assignments
+    work_list = [Work(**work_data) for work_data in work_data_list]
+    app.session.add_all(work_list)
+    app.session.commit()
+    _notify_work_dispatcher()
+    return work_list
+
+
+def _notify_work_dispatcher(delay=None):
+    if app.work_dispatcher is not None:
+        app.work_dispatcher.notify(delay)
+
+
+def park(*, work_id, actions_completed, resume_at, requires_console):
+    # Releases the claim so the work is claimed again (by any executor) only after resume_at
+    work = get_by_id(work_id)
+    work.actions_completed = actions_completed
+    work.resume_at = resume_at
+    work.requires_console = requires_console
+    work.assigned = None
+    app.session.commit()
+    _notify_work_dispatcher(delay=(resume_at - datetime.datetime.now()).total_seconds())
+
+    return work
 
 
 def complete_by_id(*, work_id, status):
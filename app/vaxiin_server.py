@@ -12,7 +12,9 @@ from config import configure_app, configure_logging
 import helpers.db as db_helper
 import helpers.convertor as convertor_helper
 
-import handler.work as work_handler
+import handler.dispatcher as dispatcher_handler
+import handler.console_pool as console_pool
+import handler.browser_pool as browser_pool
 
 from routes.creds import ns as creds_ns
 from routes.device import ns as device_ns
@@ -23,6 +25,7 @@ from routes.screenshot import ns as screenshot_ns
 from routes.work import ns as work_ns
 from routes.execution import ns as execution_ns
 from routes.heartbeat import ns as heartbeat_ns
+from routes.console import ns as console_ns
 from routes.version import ns as version_ns
 
 from models.creds import Base as creds_base
@@ -53,8 +56,13 @@ def create_app():
     api.add_namespace(work_ns, default_path + '/work')
     api.add_namespace(execution_ns, default_path + '/execution')
     api.add_namespace(heartbeat_ns, default_path + '/heartbeat')
+    api.add_namespace(console_ns, default_path + '/console')
     api.add_namespace(version_ns, '/version')
 
+    app.rule_set_version = 0
+    app.compiled_rule_set = None
+    app.work_dispatcher = None
+
     @app.teardown_appcontext
     def remove_session(*args, **kwargs):
         app.session.remove()
@@ -102,14 +110,23 @@ def create_scheduler(app):
             minutes=app.config.get('mark_zombie_interval'),
             next_run_time=(datetime.now() + timedelta(seconds=90))
         )
-        sched.add_job(
-            work_handler.get_work_assignment,
-            args=[app],
-            trigger="interval",
-            seconds=app.config.get('check_work_interval'),
-            max_instances=app.config.get('max_parallel_work')
-        )
+        if app.config.get('run_work'):
+            sched.add_job(
+                func=console_pool.close_expired_consoles,
+                args=[app],
+                trigger="interval",
+                minutes=1
+            )
         sched.start()
+        if app.config.get('run_work'):
+            app.work_dispatcher = dispatcher_handler.WorkDispatcher(
+                app,
+                max_console_workers=app.config.get('max_parallel_work'),
+                max_lightweight_workers=app.config.get('max_parallel_lightweight_work'),
+                poll_interval=app.config.get('check_work_interval')
+            )
+            app.work_dispatcher.start()
+            browser_pool.start(app)
         logging.getLogger('apscheduler.executors.default').setLevel(logging.WARNING)
 
 
@@ -122,6 +139,8 @@ def create_db(app, engine, session):
     execution_base.metadata.create_all(bind=engine)
     work_base.metadata.create_all(bind=engine)
     rule_base.metadata.create_all(bind=engine)
+    db_helper.add_missing_columns(engine)
+    db_helper.add_missing_indexes(engine)
 
     engine.execute(f"INSERT INTO {db_helper.SCHEMA}.rule_order (NAME) SELECT 'rule_order' WHERE NOT EXISTS (SELECT * FROM {db_helper.SCHEMA}.rule_order)")
     engine.execute(f"INSERT OR IGNORE INTO {db_helper.SCHEMA}.action (name, action_type, action_data, last_updated, created_at) VALUES ('screenshot', 'screenshot', 'screenshot', '2021-05-13 10:31:58.380707', '2021-05-13 10:31:58.380707')")
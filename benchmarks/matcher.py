@@ -0,0 +1,92 @@
+"""Compare matching with and without the literal prefilter for 10/100/1000 rules.
+
+usage: python benchmarks/matcher.py [DB_PATH]
+
+The OCR corpus is read from the states in DB_PATH/vaxiin.db when given, otherwise a set of
+console screen texts is used. Rules are generated from corpus lines, most of them not matching.
+"""
+import re
+import sys
+import time
+import random
+import pathlib
+import sqlite3
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent) + '/app')
+
+import helpers.matcher as matcher_helper  # noqa: E402
+
+
+SAMPLE_CORPUS = [
+    "Dell Inc. | System Setup\n\nSystem Setup\nSystem Setup Main Menu\nSystem BIOS\n\niDRAC Settings\nDevice Settings\n\nService Tag: CPNRB23\n\nPowerEdge R240\n\nFi for Help\n\n",
+    "PXE-E61: Media test failure, check cable\nPXE-M0F: Exiting Intel PXE ROM.\nNo boot device available - strike F1 to retry boot, F2 for setup utility\n",
+    "Reboot and Select proper Boot device\nor Insert Boot Media in selected Boot device and press a key\n",
+    "GRUB version 2.02\n\nMinimal BASH-like line editing is supported. For the first word, TAB lists possible command completions.\ngrub rescue>\n",
+    "Memory training in progress, this may take several minutes\nPlease wait...\n",
+    "Ubuntu 20.04.3 LTS web-01 tty1\n\nweb-01 login:\n",
+    "Kernel panic - not syncing: VFS: Unable to mount root fs on unknown-block(0,0)\nCPU: 3 PID: 1 Comm: swapper/0 Not tainted 5.4.0-89-generic\n",
+    "Press <F2> to enter setup, <F11> Boot Menu, <F12> Network Boot\nInitializing Firmware Interfaces...\n",
+    "CentOS Linux 7 (Core)\nKernel 3.10.0-1160.el7.x86_64 on an x86_64\n\ndb-03 login:\n",
+    "A disk read error occurred\nPress Ctrl+Alt+Del to restart\n",
+]
+
+
+def get_corpus(db_path):
+    if db_path is None:
+        return SAMPLE_CORPUS
+
+    connection = sqlite3.connect(f"{db_path}/vaxiin.db")
+    corpus = [row[0] for row in connection.execute("SELECT ocr_text FROM state") if row[0]]
+    connection.close()
+    return corpus or SAMPLE_CORPUS
+
+
+def generate_regexes(corpus, count):
+    lines = sorted({line.strip() for text in corpus for line in text.splitlines() if len(line.strip()) > 8})
+    regexes = []
+    for idx in range(count):
+        words = random.choice(lines).split()[:4]
+        if idx % 10 != 0:
+            # a rule for a screen that is not in the corpus
+            words = words + [f"code{idx}"]
+        regexes.append(r'\s+'.join(re.escape(word) for word in words))
+
+    return regexes
+
+
+def build_rule_set(regexes, with_prefilter):
+    rules = []
+    for position, regex in enumerate(regexes, start=1):
+        compiled_regex = re.compile(regex, re.IGNORECASE)
+        literal = matcher_helper.get_required_literal(compiled_regex) if with_prefilter else None
+        rules.append(matcher_helper.CompiledRule(f"rule {position}", position, compiled_regex, literal))
+
+    prefilter = matcher_helper._build_prefilter(rules) if with_prefilter else None
+    return matcher_helper.CompiledRuleSet(0, rules, prefilter)
+
+
+def time_matching(corpus, compiled_rule_set, rounds):
+    start_time = time.perf_counter()
+    for _ in range(rounds):
+        matches = [matcher_helper.find_matching_rule(text, compiled_rule_set) for text in corpus]
+    elapsed_time = (time.perf_counter() - start_time) / (rounds * len(corpus))
+    return elapsed_time, [rule.name if rule else None for rule in matches]
+
+
+def main():
+    random.seed(0)
+    corpus = get_corpus(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"corpus of {len(corpus)} texts")
+
+    for rule_count in (10, 100, 1000):
+        regexes = generate_regexes(corpus, rule_count)
+        rounds = max(1, 2000 // rule_count)
+        naive_time, naive_matches = time_matching(corpus, build_rule_set(regexes, False), rounds)
+        prefilter_time, prefilter_matches = time_matching(corpus, build_rule_set(regexes, True), rounds)
+        assert naive_matches == prefilter_matches, "prefilter changed the matching result"
+        print(f"{rule_count:5} rules  full scan: {naive_time * 1e6:9.1f}us/text  "
+              f"prefilter: {prefilter_time * 1e6:9.1f}us/text  speedup: {naive_time / prefilter_time:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Compare the OCR engines on the rule screenshots stored in a vaxiin DB.
+
+usage: python benchmarks/ocr_engine.py DB_PATH [ROUNDS]
+"""
+import sys
+import time
+import pathlib
+import sqlite3
+import statistics
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent) + '/app')
+
+import helpers.image as image_helper  # noqa: E402
+
+
+def get_rule_screenshots(db_path):
+    connection = sqlite3.connect(f"{db_path}/vaxiin.db")
+    rows = connection.execute("SELECT name, screenshot FROM rule").fetchall()
+    connection.close()
+    return rows
+
+
+def benchmark_engine(engine, screenshots, rounds):
+    timings = []
+    for _ in range(rounds):
+        for _name, screenshot in screenshots:
+            start_time = time.perf_counter()
+            image_helper.run_ocr(screenshot, engine=engine)
+            timings.append(time.perf_counter() - start_time)
+
+    return timings
+
+
+def main():
+    db_path = sys.argv[1]
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    screenshots = get_rule_screenshots(db_path)
+    if not screenshots:
+        print(f"No rule screenshots found in '{db_path}/vaxiin.db'")
+        return
+
+    engines = ['pytesseract']
+    if image_helper.tesserocr is not None:
+        engines.append('tesserocr')
+    else:
+        print("tesserocr is not installed, benchmarking pytesseract only")
+
+    print(f"{len(screenshots)} screenshots x {rounds} rounds")
+    for engine in engines:
+        # warm up so the one time engine load is not counted
+        image_helper.run_ocr(screenshots[0][1], engine=engine)
+        timings = benchmark_engine(engine, screenshots, rounds)
+        print(f"{engine:12} mean: {statistics.mean(timings) * 1000:8.1f}ms  "
+              f"median: {statistics.median(timings) * 1000:8.1f}ms  "
+              f"max: {max(timings) * 1000:8.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
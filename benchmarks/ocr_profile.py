@@ -0,0 +1,83 @@
+"""Compare OCR with and without the ocr_profiles of a server config on the rule screenshots stored in a vaxiin DB.
+
+usage: python benchmarks/ocr_profile.py DB_PATH CONFIG_PATH [ROUNDS]
+
+Each rule's stored OCR text is the reference. For every profile the latency, the similarity of the text
+to the reference and the share of rules whose regex still matches the text are reported.
+"""
+import io
+import re
+import sys
+import time
+import yaml
+import difflib
+import pathlib
+import sqlite3
+import statistics
+from PIL import Image
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent) + '/app')
+
+import helpers.image as image_helper  # noqa: E402
+
+
+def get_rules(db_path):
+    connection = sqlite3.connect(f"{db_path}/vaxiin.db")
+    rows = connection.execute("SELECT name, screenshot, ocr_text, regex, ignore_case FROM rule").fetchall()
+    connection.close()
+    return rows
+
+
+def get_profiles(config_path):
+    with open(config_path) as config_file:
+        server_config = yaml.full_load(config_file) or {}
+
+    return server_config.get('ocr_profiles') or {}
+
+
+def benchmark_profile(profile, rules, engine, rounds):
+    timings = []
+    similarities = []
+    regex_matches = 0
+    for round_idx in range(rounds):
+        for _name, screenshot, reference_text, regex, ignore_case in rules:
+            # decoding the PNG is done before the timing, like for framebuffer screenshots
+            image = Image.open(io.BytesIO(screenshot))
+            image.load()
+
+            start_time = time.perf_counter()
+            ocr_text = image_helper.run_ocr(screenshot, engine=engine, decoded_image=image, profile=profile)
+            timings.append(time.perf_counter() - start_time)
+
+            if round_idx == 0:
+                similarities.append(difflib.SequenceMatcher(None, reference_text, ocr_text).ratio())
+                if re.search(regex, ocr_text, re.IGNORECASE if ignore_case else 0):
+                    regex_matches += 1
+
+    return timings, similarities, regex_matches
+
+
+def main():
+    db_path = sys.argv[1]
+    profiles = {'(none)': None, **get_profiles(sys.argv[2])}
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    rules = get_rules(db_path)
+    if not rules:
+        print(f"No rule screenshots found in '{db_path}/vaxiin.db'")
+        return
+
+    engine = 'tesserocr' if image_helper.tesserocr is not None else 'pytesseract'
+    # warm up so the one time engine load is not counted
+    image_helper.run_ocr(rules[0][1], engine=engine)
+
+    print(f"{len(rules)} rule screenshots x {rounds} rounds with {engine}")
+    for model, profile in profiles.items():
+        timings, similarities, regex_matches = benchmark_profile(profile, rules, engine, rounds)
+        print(f"{model:12} mean: {statistics.mean(timings) * 1000:8.1f}ms  "
+              f"median: {statistics.median(timings) * 1000:8.1f}ms  "
+              f"text similarity: {statistics.mean(similarities):6.1%}  "
+              f"regex matches: {regex_matches}/{len(rules)}")
+
+
+if __name__ == '__main__':
+    main()
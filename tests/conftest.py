@@ -4,6 +4,7 @@ import yaml
 import pathlib
 import pytest
 import datetime
+import threading
 from unittest import mock
 
 from app.config import configure_app, configure_logging
@@ -12,6 +13,7 @@ from app.helpers.db import get_db
 sys.path.insert(0, str(pathlib.Path(__file__).parent.parent) + '/app')
 
 from app.vaxiin_server import create_app, create_db, create_scheduler  # noqa: E402
+import helpers.image as image_helper  # noqa: E402
 
 
 @pytest.fixture(autouse=True)
@@ -50,6 +52,8 @@ def app(request):
     configure_app(app)
     app.config.update({
         "TESTING": True,
+        # Tests call the work endpoints directly, so the server must not pick up the work itself
+        "run_work": False,
     })
     create_scheduler(app)
     engine, session = get_db("", for_testing=True)
@@ -62,6 +66,15 @@ def app(request):
     # clean up / reset resources here
 
 
+@pytest.fixture()
+def ocr_cache(monkeypatch):
+    # OCR results and loaded tesserocr engines are kept per process, so they must not leak between tests
+    monkeypatch.setattr(image_helper, '_tesserocr_local', threading.local())
+    image_helper.clear_ocr_cache()
+    yield
+    image_helper.clear_ocr_cache()
+
+
 @pytest.fixture()
 def client(app):
     return app.test_client()
@@ -70,6 +70,12 @@ def test_action_create_endpoint_expect_cred_store_param_wrong_value_error(client
     assert response.json['message'] == "The param synatx for 'cred_store' is invalid. valid syntax is: 'cred_store::CRED_NAME::username|password)'"
 
 
+def test_action_create_endpoint_expect_keystroke_special_key_error(client, headers, test_data):
+    response = client.post('/api/v1/action/', headers=headers, json={'name': 'bad keys', 'action_type': 'keystroke', 'action_data': 'keys.CONTROL+keys.NOT_A_KEY'})
+    assert response.status_code == 422
+    assert response.json['message'] == "The keystroke special key 'NOT_A_KEY' is unknown"
+
+
 def test_action_update_endpoint_expect_success(client, headers, test_data):
     client.post('/api/v1/action/', headers=headers, json=test_data['action'])
     new_action_data = "raw 13"
@@ -0,0 +1,173 @@
+import io
+import time
+import struct
+from PIL import Image
+from selenium.webdriver.common.keys import Keys
+
+import helpers.keystroke as keystroke_helper
+import helpers.framebuffer as framebuffer_helper
+import services.work as work_service
+import handler.action_runner as action_runner
+import handler.browser_pool as browser_pool
+import handler.display_pool as display_pool
+
+
+def _get_png(color):
+    output = io.BytesIO()
+    Image.new('RGB', (640, 480), color).save(output, format='PNG')
+    return output.getvalue()
+
+
+class FrameBrowser:
+    """Returns the given frames as screenshots, repeating the last one"""
+
+    def __init__(self, frame_list):
+        self.frame_list = frame_list
+        self.screenshot_count = 0
+
+    def get_screenshot_as_png(self):
+        frame = self.frame_list[min(self.screenshot_count, len(self.frame_list) - 1)]
+        self.screenshot_count += 1
+        return frame
+
+
+class ViewportBrowser:
+    """A browser whose page viewport starts at (2, 1) on the screen and is 3x2 pixels"""
+
+    def execute_script(self, script):
+        return [2, 1, 3, 2, 1]
+
+    def get_screenshot_as_png(self):
+        raise AssertionError("The screenshot should be read from the framebuffer")
+
+
+def _write_xwd(path, width, height):
+    # An XWD file like the one Xvfb -fbdir keeps, pixel (x, y) is RGB (200, y * 10, x * 10)
+    window_name = b'Xvfb main window\0'
+    header = struct.pack(
+        '>25I', 100 + len(window_name), 7, 2, 24, width, height, 0, 0, 32, 0, 32, 32, width * 4, 4,
+        0xff0000, 0xff00, 0xff, 8, 256, 2, width, height, 0, 0, 0
+    )
+    pixels = bytes(value for y in range(height) for x in range(width) for value in (x * 10, y * 10, 200, 0))
+    with open(path, 'wb') as xwd_file:
+        xwd_file.write(header + window_name + b'\0' * 2 * 12 + pixels)
+
+
+class RecordingDriver:
+    """Records the W3C actions sent by ActionChains.perform"""
+
+    w3c = True
+
+    def __init__(self):
+        self.executed_action_list = []
+
+    def execute(self, command, params):
+        self.executed_action_list.append(params['actions'])
+
+
+def test_keystroke_plan_is_compiled_once_when_action_is_saved(app, client, headers, test_data):
+    keystroke_helper.get_compiled_template.cache_clear()
+    action_data = '{cred::password}B;keys.ENTER;keys.CONTROL+keys.ALT+keys.DELETE'
+    client.post('/api/v1/creds/', headers=headers, json=test_data['creds'])
+    client.post('/api/v1/device/', headers=headers, json=test_data['device'])
+    client.post('/api/v1/action/', headers=headers, json={'name': 'type password', 'action_type': 'keystroke', 'action_data': action_data})
+    assert keystroke_helper.get_compiled_template.cache_info().misses == 1
+
+    client.post('/api/v1/work/', headers=headers, json={'device_uid': test_data['device']['uid'], 'actions': ['type password']})
+    with app.app_context():
+        assignment = work_service.get_assignment()
+
+    assert assignment['action_list'][0]['data'] == (
+        keystroke_helper.KeystrokeStep('char', 'p', False),
+        keystroke_helper.KeystrokeStep('char', 'a', False),
+        keystroke_helper.KeystrokeStep('char', 's', False),
+        keystroke_helper.KeystrokeStep('char', 's', False),
+        keystroke_helper.KeystrokeStep('char', 'B', True),
+        keystroke_helper.KeystrokeStep('special_key', Keys.ENTER, False),
+        keystroke_helper.KeystrokeStep('key_down', Keys.CONTROL, False),
+        keystroke_helper.KeystrokeStep('key_down', Keys.ALT, False),
+        keystroke_helper.KeystrokeStep('char', Keys.DELETE, False),
+        keystroke_helper.KeystrokeStep('key_up', Keys.CONTROL, False),
+        keystroke_helper.KeystrokeStep('key_up', Keys.ALT, False),
+        keystroke_helper.KeystrokeStep('combo_end', '', False)
+    )
+    # the stored action was compiled once, and the rendered password was not cached
+    assert keystroke_helper.get_compiled_template.cache_info().hits == 1
+    assert keystroke_helper.get_compiled_template.cache_info().currsize == 1
+    assert keystroke_helper.get_compiled_template(action_data)[0] == keystroke_helper.KeystrokeStep('param', '{cred::password}', False)
+
+
+def test_keystroke_action_is_sent_in_a_single_perform_with_model_pacing(app):
+    app.config['keystroke_pacing'] = {'idrac9': {'pause_between_chars': 0.05}}
+    driver = RecordingDriver()
+
+    with app.app_context():
+        status, run_data = action_runner.run_action(action_type='keystroke', action_data='password;keys.ENTER', device_data={'uid': 'test uid', 'model': 'iDRAC9'}, browser=driver)
+
+    assert status == 'success'
+    assert len(driver.executed_action_list) == 1
+    key_action_list = [device for device in driver.executed_action_list[0] if device['type'] == 'key'][0]['actions']
+    assert [action['value'] for action in key_action_list if action['type'] == 'keyDown'] == list('password') + [Keys.ENTER]
+    assert {action['duration'] for action in key_action_list if action['type'] == 'pause'} == {50, 5000}
+
+
+def test_keystroke_action_with_unknown_special_key(app):
+    with app.app_context():
+        status, run_data = action_runner.run_action(action_type='keystroke', action_data='keys.NOT_A_KEY', device_data={'uid': 'test uid', 'model': 'idrac9'}, browser=RecordingDriver())
+
+    assert status == 'failure'
+    assert run_data['error'] == "The keystroke special key is unknown: 'NOT_A_KEY'"
+
+
+def test_wait_for_settled_screenshot_after_screen_stops_changing(app):
+    app.config['screenshot_settle_window'] = 1
+    frame_list = [_get_png((0, 0, 0)), _get_png((128, 0, 0)), _get_png((0, 128, 0)), _get_png((255, 255, 255))]
+    browser = FrameBrowser(frame_list)
+
+    with app.app_context():
+        start_time = time.monotonic()
+        screenshot = action_runner.wait_for_settled_screenshot(browser)
+        elapsed_time = time.monotonic() - start_time
+
+    assert screenshot == frame_list[-1]
+    # three changing frames and then a settle window, instead of the full timeout
+    assert 2 <= elapsed_time < 5
+
+
+def test_wait_for_settled_screenshot_gives_up_at_timeout(app):
+    app.config['screenshot_settle_window'] = 3
+    app.config['screenshot_settle_timeout'] = 2
+    frame_list = [_get_png((idx * 20, 0, 0)) for idx in range(10)]
+    browser = FrameBrowser(frame_list)
+
+    with app.app_context():
+        start_time = time.monotonic()
+        screenshot = action_runner.wait_for_settled_screenshot(browser)
+        elapsed_time = time.monotonic() - start_time
+
+    assert screenshot == frame_list[browser.screenshot_count - 1]
+    assert 2 <= elapsed_time < 3
+
+
+def test_read_xwd_image_crops_framebuffer(tmp_path):
+    _write_xwd(tmp_path / 'Xvfb_screen0', 8, 6)
+
+    image = framebuffer_helper.read_xwd_image(tmp_path / 'Xvfb_screen0', box=(2, 1, 5, 4))
+    assert image.size == (3, 3)
+    assert image.getpixel((0, 0)) == (200, 10, 20)
+    assert image.getpixel((2, 2)) == (200, 30, 40)
+
+    assert framebuffer_helper.read_xwd_image(tmp_path / 'Xvfb_screen0').size == (8, 6)
+
+
+def test_take_screenshot_from_framebuffer(app, tmp_path, monkeypatch):
+    _write_xwd(tmp_path / 'Xvfb_screen0', 8, 6)
+    display = display_pool.Display(100, None, framebuffer_dir=str(tmp_path))
+    monkeypatch.setattr(browser_pool, 'get_display', lambda browser: display)
+    app.config['screenshot_backend'] = 'framebuffer'
+
+    with app.app_context():
+        screenshot = action_runner.take_screenshot(ViewportBrowser())
+
+    assert screenshot.size == (3, 2)
+    assert screenshot.getpixel((0, 0)) == (200, 10, 20)
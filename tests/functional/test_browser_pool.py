@@ -0,0 +1,108 @@
+import pytest
+
+import handler.browser_pool as browser_pool
+
+
+class SwitchTo:
+    def __init__(self, browser):
+        self.browser = browser
+
+    def window(self, window_handle):
+        self.browser.current_window = window_handle
+
+    def default_content(self):
+        pass
+
+
+class BlankBrowser:
+    def __init__(self):
+        self.window_handles = ['main']
+        self.current_window = 'main'
+        self.current_url = 'about:blank'
+        self.switch_to = SwitchTo(self)
+        self.cookies_deleted = False
+        self.quit_called = False
+
+    def close(self):
+        self.window_handles.remove(self.current_window)
+
+    def execute_script(self, script):
+        pass
+
+    def delete_all_cookies(self):
+        self.cookies_deleted = True
+
+    def get(self, url):
+        self.current_url = url
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture()
+def launched_browsers(app, monkeypatch):
+    launched_list = []
+
+    def launch_browser():
+        browser = BlankBrowser()
+        launched_list.append(browser)
+        return browser
+
+    monkeypatch.setattr(browser_pool, 'launch_browser', launch_browser)
+    app.config['standby_browsers'] = 2
+    yield launched_list
+
+    with app.app_context():
+        browser_pool.close_all()
+
+
+def test_browser_pool_uses_standby_browser(app, launched_browsers):
+    browser_pool.refill(app)
+    assert len(launched_browsers) == 2
+
+    with app.app_context():
+        browser = browser_pool.take()
+        assert browser is launched_browsers[0]
+
+        browser.window_handles.append('console')
+        browser.current_url = 'https://bmc/console'
+        browser_pool.give_back(browser)
+
+    assert len(launched_browsers) == 2
+    assert not browser.quit_called
+    assert browser.window_handles == ['main']
+    assert browser.cookies_deleted
+    assert browser.current_url == 'about:blank'
+
+
+def test_browser_pool_recycles_browser_after_max_uses(app, launched_browsers):
+    app.config['browser_max_uses'] = 2
+    with app.app_context():
+        browser = browser_pool.take()
+        browser_pool.give_back(browser)
+        assert browser_pool.take() is browser
+        browser_pool.give_back(browser)
+
+        assert browser.quit_called
+        assert browser_pool.take() is not browser
+
+    assert len(launched_browsers) == 2
+
+
+def test_browser_pool_is_bounded_by_free_memory(app, launched_browsers, monkeypatch):
+    monkeypatch.setattr(browser_pool, '_get_free_memory', lambda: 100)
+    browser_pool.refill(app)
+    assert launched_browsers == []
+
+    monkeypatch.setattr(browser_pool, '_get_free_memory', lambda: 2048)
+    browser_pool.refill(app)
+    assert len(launched_browsers) == 2
+
+
+def test_browser_pool_discards_browser(app, launched_browsers):
+    with app.app_context():
+        browser = browser_pool.take()
+        browser_pool.discard(browser)
+
+        assert browser.quit_called
+        assert browser_pool.take() is not browser
@@ -15,6 +15,40 @@ def test_config_default_values(app):
     assert app.config['pending_work_timeout'] == 30
     assert app.config['become_zombie_interval'] == 120
     assert app.config['mark_zombie_interval'] == 10
+    assert app.config['check_work_interval'] == 30
+    assert app.config['max_parallel_work'] == 3
+    assert app.config['max_parallel_lightweight_work'] == 10
+    assert app.config['pause_between_chars'] == 0.2
+    assert app.config['keystroke_pacing'] == {}
+    assert app.config['park_sleep_threshold'] == 10
+    assert app.config['screenshot_settle_window'] == 3
+    assert app.config['screenshot_settle_timeout'] == 15
+    assert app.config['screenshot_backend'] == 'webdriver'
+    assert app.config['console_session_ttl'] == 300
+    assert app.config['max_console_sessions'] == 10
+    assert app.config['max_console_work_batch'] == 5
+    assert app.config['standby_browsers'] == 0
+    assert app.config['browser_max_uses'] == 20
+    assert app.config['browser_max_rss'] == 1024
+    assert app.config['browser_pool_min_free_memory'] == 512
+    assert app.config['dedicated_displays'] is False
+    assert app.config['first_display_number'] == 100
+    assert app.config['display_resolution'] == '1960x1024x24'
+    assert app.config['display_vnc'] is False
+    assert app.config['ipmi_backend'] == 'ipmitool'
+    assert app.config['ipmi_port'] == 623
+    assert app.config['ipmi_session_idle_timeout'] == 60
+    assert app.config['bulk_ipmi_concurrency'] == 50
+    assert app.config['http_connect_timeout'] == 5
+    assert app.config['http_read_timeout'] == 30
+    assert app.config['http_pool_maxsize'] == 10
+    assert app.config['ocr_cache_size'] == 1024
+    assert app.config['ocr_engine'] == 'auto'
+    assert app.config['async_ocr'] is False
+    assert app.config['ocr_profiles'] == {}
+    assert app.config['incremental_ocr'] is False
+    assert app.config['ocr_band_cache_size'] == 8192
+    assert app.config['duplicate_screenshot_max_distance'] == -1
 
 
 @pytest.mark.parametrize("app", [True], indirect=True)
@@ -0,0 +1,97 @@
+import pytest
+from selenium.common.exceptions import WebDriverException
+
+import helpers.metrics as metrics_helper
+import handler.console as console_handler
+import handler.browser_pool as browser_pool
+from exceptions.handler import OpenConsoleError
+
+
+class LoginBrowser:
+    def __init__(self):
+        self.visited_url_list = []
+        self.logged_in = False
+
+    def get(self, url):
+        self.visited_url_list.append(url)
+
+
+@pytest.fixture()
+def test_recipe(monkeypatch):
+    browser = LoginBrowser()
+    given_back_list = []
+    discarded_list = []
+    recipe = [
+        console_handler.LoginStep('open_login_page', lambda browser, creds: browser.get(f"https://{creds['ip']}/"),
+                                  lambda browser: len(browser.visited_url_list) == 1, 1, "Failed to see login page after 1s"),
+        console_handler.LoginStep('login', lambda browser, creds: setattr(browser, 'logged_in', creds['password'] == 'pass'),
+                                  lambda browser: browser.logged_in, 0.2, "Failed to login after 0.2s")
+    ]
+
+    monkeypatch.setattr(browser_pool, 'take', lambda: browser)
+    monkeypatch.setattr(browser_pool, 'give_back', given_back_list.append)
+    monkeypatch.setattr(browser_pool, 'discard', discarded_list.append)
+    monkeypatch.setitem(console_handler.model_to_login_recipe_mapping, 'testbmc', recipe)
+    monkeypatch.setitem(console_handler._login_step_timing, 'testbmc', {step.name: metrics_helper.LatencyHistogram() for step in recipe})
+    yield browser, given_back_list, discarded_list
+
+
+def test_open_console_records_login_step_timing(app, client, test_recipe):
+    browser, given_back_list, discarded_list = test_recipe
+    with app.app_context():
+        assert console_handler.open_console(uid='uid 1', ip='10.0.0.1', username='user', password='pass', model='TestBMC') is browser
+
+    assert browser.visited_url_list == ['https://10.0.0.1/']
+    assert given_back_list == []
+    assert discarded_list == []
+
+    response = client.get('/api/v1/console/login-timing')
+    assert response.status_code == 200
+    login_timing = response.json['login_timing']
+    assert list(login_timing['testbmc']) == ['open_login_page', 'login']
+    assert login_timing['testbmc']['login']['count'] == 1
+    assert login_timing['testbmc']['login']['buckets']['0.5'] == 1
+    assert list(login_timing['idrac9'])[-1] == 'wake_console'
+
+
+def test_open_console_fails_on_step_timeout(app, test_recipe):
+    browser, given_back_list, discarded_list = test_recipe
+    with app.app_context():
+        with pytest.raises(OpenConsoleError) as err:
+            console_handler.open_console(uid='uid 1', ip='10.0.0.1', username='user', password='wrong', model='testbmc')
+
+    assert err.value.error == "Failed to login after 0.2s"
+    assert given_back_list == []
+    assert discarded_list == [browser]
+    assert console_handler.get_login_step_timing()['testbmc']['login']['count'] == 0
+
+
+def test_open_console_discards_browser_on_webdriver_error(app, test_recipe, monkeypatch):
+    browser, given_back_list, discarded_list = test_recipe
+
+    def get(url):
+        raise WebDriverException("Browsing context has been discarded")
+
+    monkeypatch.setattr(browser, 'get', get)
+    with app.app_context():
+        with pytest.raises(OpenConsoleError) as err:
+            console_handler.open_console(uid='uid 1', ip='10.0.0.1', username='user', password='pass', model='testbmc')
+
+    assert err.value.error == "Browsing context has been discarded"
+    assert given_back_list == []
+    assert discarded_list == [browser]
+
+
+def test_open_console_goes_on_after_optional_step_timeout(app, test_recipe, monkeypatch):
+    browser, given_back_list, discarded_list = test_recipe
+    recipe = console_handler.model_to_login_recipe_mapping['testbmc']
+    recipe = recipe[:1] + [console_handler.LoginStep('probe_login_banner', None, lambda browser: False, 0.2, None)] + recipe[1:]
+    monkeypatch.setitem(console_handler.model_to_login_recipe_mapping, 'testbmc', recipe)
+    monkeypatch.setitem(console_handler._login_step_timing, 'testbmc', {step.name: metrics_helper.LatencyHistogram() for step in recipe})
+
+    with app.app_context():
+        assert console_handler.open_console(uid='uid 1', ip='10.0.0.1', username='user', password='pass', model='testbmc') is browser
+
+    assert browser.logged_in
+    assert discarded_list == []
+    assert console_handler.get_login_step_timing()['testbmc']['probe_login_banner']['count'] == 1
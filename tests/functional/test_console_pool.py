@@ -0,0 +1,91 @@
+import pytest
+
+import handler.console as console_helper
+import handler.console_pool as console_pool
+
+
+class ConsoleBrowser:
+    current_url = 'https://bmc/console'
+
+    def __init__(self, uid):
+        self.uid = uid
+        self.window_handles = ['console']
+        self.closed = False
+
+
+@pytest.fixture()
+def consoles(app, monkeypatch):
+    opened_list = []
+
+    def open_console(*, uid, ip, username, password, model):
+        browser = ConsoleBrowser(uid)
+        opened_list.append(browser)
+        return browser
+
+    def close_console(*, browser, model):
+        browser.closed = True
+
+    monkeypatch.setattr(console_helper, 'open_console', open_console)
+    monkeypatch.setattr(console_helper, 'close_console', close_console)
+    yield opened_list
+
+    app.config['console_session_ttl'] = 0
+    console_pool.close_expired_consoles(app)
+
+
+def _get_device_data(uid):
+    return {'uid': uid, 'ip': '10.0.0.1', 'username': 'user', 'password': 'pass', 'model': 'idrac9'}
+
+
+def test_console_pool_reuses_console_for_device(app, consoles):
+    with app.app_context():
+        browser = console_pool.acquire(**_get_device_data('uid 1'))
+        console_pool.release(browser=browser, **_get_device_data('uid 1'))
+
+        assert console_pool.acquire(**_get_device_data('uid 1')) is browser
+        console_pool.release(browser=browser, **_get_device_data('uid 1'))
+
+        # other credentials can not reuse the logged-in console
+        other_creds_browser = console_pool.acquire(**{**_get_device_data('uid 1'), 'password': 'other'})
+        assert other_creds_browser is not browser
+        assert browser.closed
+        console_pool.release(browser=other_creds_browser, **_get_device_data('uid 1'))
+
+    assert len(consoles) == 2
+
+
+def test_console_pool_replaces_unhealthy_console(app, consoles):
+    with app.app_context():
+        browser = console_pool.acquire(**_get_device_data('uid 1'))
+        console_pool.release(browser=browser, **_get_device_data('uid 1'))
+        browser.window_handles = []
+
+        new_browser = console_pool.acquire(**_get_device_data('uid 1'))
+        assert new_browser is not browser
+        assert browser.closed
+        console_pool.release(browser=new_browser, **_get_device_data('uid 1'))
+
+
+def test_console_pool_evicts_least_recently_used(app, consoles):
+    app.config['max_console_sessions'] = 2
+    with app.app_context():
+        browser_list = [console_pool.acquire(**_get_device_data(f"uid {idx}")) for idx in range(3)]
+        for idx, browser in enumerate(browser_list):
+            console_pool.release(browser=browser, **_get_device_data(f"uid {idx}"))
+
+        assert [browser.closed for browser in browser_list] == [True, False, False]
+        assert console_pool.acquire(**_get_device_data('uid 2')) is browser_list[2]
+        console_pool.release(browser=browser_list[2], **_get_device_data('uid 2'))
+
+
+def test_console_pool_closes_expired_consoles(app, consoles):
+    with app.app_context():
+        browser = console_pool.acquire(**_get_device_data('uid 1'))
+        console_pool.release(browser=browser, **_get_device_data('uid 1'))
+
+    console_pool.close_expired_consoles(app)
+    assert not browser.closed
+
+    app.config['console_session_ttl'] = 0
+    console_pool.close_expired_consoles(app)
+    assert browser.closed
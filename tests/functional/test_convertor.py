@@ -2,6 +2,7 @@ from freezegun import freeze_time
 from datetime import datetime, timedelta
 
 import app.helpers.convertor as convertor_helper
+import services.work as work_service
 
 
 def test_fail_stuck_work(app, client, headers, test_data):
@@ -50,6 +51,7 @@ def test_periodic_work_assignment(app, client, headers, test_data):
     assert work_data['status'] == 'PENDING'
     assert work_data['device_uid'] == test_data['device']['uid']
     assert work_data['trigger'] == f"Rule - {test_data['rule']['name']}"
+    assert work_data['priority'] == work_service.RULE_WORK_PRIORITY
 
 
 def test_get_zombie_screenshot(app, client, headers, test_data):
@@ -68,6 +70,7 @@ def test_get_zombie_screenshot(app, client, headers, test_data):
     assert work_data['device_uid'] == test_data['heartbeat']['uid']
     assert work_data['trigger'] == 'zombie screenshot'
     assert work_data['requires_console'] is True
+    assert work_data['priority'] == work_service.ZOMBIE_SCREENSHOT_WORK_PRIORITY
     assert len(work_data['actions']) == 1
     assert work_data['actions'][0] == {
         'name': 'screenshot',
@@ -0,0 +1,61 @@
+import pytest
+
+import handler.display_pool as display_pool
+
+
+class XvfbProcess:
+    def __init__(self):
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        self.returncode = 0
+
+    def wait(self, timeout=None):
+        return self.returncode
+
+
+@pytest.fixture()
+def started_displays(app, monkeypatch):
+    started_list = []
+
+    def start_display(number):
+        display = display_pool.Display(number, XvfbProcess())
+        started_list.append(display)
+        return display
+
+    monkeypatch.setattr(display_pool, '_start_display', start_display)
+    yield started_list
+
+    display_pool.stop_all()
+
+
+def test_display_pool_gives_each_browser_its_own_display(app, started_displays):
+    with app.app_context():
+        first_display = display_pool.acquire()
+        second_display = display_pool.acquire()
+        assert first_display.name != second_display.name
+        assert first_display.number >= app.config['first_display_number']
+
+        display_pool.release(first_display)
+        assert display_pool.acquire() is first_display
+
+        display_pool.release(first_display)
+        display_pool.release(second_display)
+
+    assert len(started_displays) == 2
+
+
+def test_display_pool_replaces_stopped_display(app, started_displays):
+    with app.app_context():
+        display = display_pool.acquire()
+        display_pool.release(display)
+        display.xvfb_process.returncode = 1
+
+        new_display = display_pool.acquire()
+        assert new_display is not display
+        display_pool.release(new_display)
+
+    assert len(started_displays) == 2
@@ -0,0 +1,64 @@
+import pytest
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import helpers.http as http_helper
+import handler.action_runner as action_runner
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connection_count += 1
+
+    def do_GET(self):
+        status_code = 500 if self.path == '/error' else 200
+        body = b'ok'
+        self.send_response(status_code)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture()
+def http_server(app):
+    server = HTTPServer(('127.0.0.1', 0), CountingHandler)
+    server.connection_count = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    with app.app_context():
+        http_helper.close_session()
+    server.shutdown()
+    server.server_close()
+
+
+def test_request_action_reuses_connection(app, http_server):
+    url = f"http://127.0.0.1:{http_server.server_port}/"
+    with app.app_context():
+        for _ in range(3):
+            status, run_data = action_runner.run_action(action_type='request', action_data=url, device_data={}, browser=None)
+            assert status == 'success'
+            assert run_data['status_code'] == 200
+            assert run_data['response'] == 'ok'
+            assert set(run_data['timing']) == {'total', 'ttfb', 'download'}
+            assert run_data['timing']['total'] >= run_data['timing']['ttfb']
+
+    assert http_server.connection_count == 1
+
+
+def test_request_action_http_error(app, http_server):
+    url = f"http://127.0.0.1:{http_server.server_port}/error"
+    with app.app_context():
+        status, run_data = action_runner.run_action(action_type='request', action_data=url, device_data={}, browser=None)
+
+    assert status == 'failure'
+    assert run_data['error'] == 'HTTP Error'
+    assert run_data['status_code'] == 500
@@ -0,0 +1,140 @@
+import time
+import socket
+import pytest
+import multiprocessing
+
+import handler.ipmi as ipmi_handler
+import handler.bulk as bulk_handler
+import handler.action_runner as action_runner
+
+
+def _run_stand_in_bmc(port, power_state):
+    import pyghmi.ipmi.bmc as bmc
+    import pyghmi.ipmi.private.serversession as serversession
+
+    # The pyghmi BMC only implements the SHA-1 cipher suite, so reject the SHA-256 open session request
+    # the same way a real BMC without SHA-256 does, which makes the client retry with SHA-1
+    create_open_session_response = serversession.ServerSession.create_open_session_response
+
+    def sha1_only_open_session_response(self, request):
+        if request[12] != 1:
+            return bytearray([request[0], 0x11, 0, 0]) + request[4:8]
+        return create_open_session_response(self, request)
+
+    serversession.ServerSession.create_open_session_response = sha1_only_open_session_response
+
+    class StandInBmc(bmc.Bmc):
+        def get_power_state(self):
+            return power_state.value
+
+        def power_on(self):
+            power_state.value = 'on'
+
+        def power_off(self):
+            power_state.value = 'off'
+
+        def power_cycle(self):
+            power_state.value = 'on'
+
+    StandInBmc({'user': 'pass'}, port=port, address='127.0.0.1').listen()
+
+
+@pytest.fixture()
+def bmc(app):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    context = multiprocessing.get_context('spawn')
+    power_state = context.Manager().Value(str, 'off')
+    process = context.Process(target=_run_stand_in_bmc, args=(port, power_state), daemon=True)
+    process.start()
+    time.sleep(1)
+
+    app.config['ipmi_backend'] = 'native'
+    app.config['ipmi_port'] = port
+    yield power_state
+
+    with app.app_context():
+        ipmi_handler.close_all_sessions()
+    process.terminate()
+    process.join()
+
+
+@pytest.fixture()
+def device_data():
+    return {
+        'uid': 'test uid',
+        'ip': '127.0.0.1',
+        'username': 'user',
+        'password': 'pass',
+        'model': 'idrac9'
+    }
+
+
+def test_ipmi_native_power_action(app, bmc, device_data):
+    with app.app_context():
+        status, run_data = action_runner.run_action(action_type='power', action_data='status', device_data=device_data, browser=None)
+        assert status == 'success'
+        assert run_data == {'stdout': "Chassis Power is off\n", 'stderr': ""}
+
+        status, run_data = action_runner.run_action(action_type='power', action_data='on', device_data=device_data, browser=None)
+        assert status == 'success'
+        assert run_data == {'stdout': "Chassis Power Control: Up/On\n", 'stderr': ""}
+        assert bmc.value == 'on'
+
+        status, run_data = action_runner.run_action(action_type='ipmitool', action_data='chassis power status', device_data=device_data, browser=None)
+        assert status == 'success'
+        assert run_data['stdout'] == "Chassis Power is on\n"
+
+
+def test_ipmi_native_session_is_reused(app, bmc, device_data):
+    with app.app_context():
+        action_runner.run_action(action_type='power', action_data='status', device_data=device_data, browser=None)
+        session = ipmi_handler.get_session(ip='127.0.0.1', username='user', password='pass')
+        command = session.command
+
+        action_runner.run_action(action_type='power', action_data='off', device_data=device_data, browser=None)
+        assert ipmi_handler.get_session(ip='127.0.0.1', username='user', password='pass') is session
+        assert session.command is command
+        assert session.command.ipmi_session.logged
+
+
+def test_ipmi_native_idle_session_expires(app, bmc, device_data):
+    with app.app_context():
+        action_runner.run_action(action_type='power', action_data='status', device_data=device_data, browser=None)
+        session = ipmi_handler.get_session(ip='127.0.0.1', username='user', password='pass')
+        ipmi_session = session.command.ipmi_session
+
+        app.config['ipmi_session_idle_timeout'] = 0
+        time.sleep(0.1)
+        assert ipmi_handler.get_session(ip='127.0.0.1', username='user', password='pass') is not session
+        assert not ipmi_session.logged
+
+
+def test_ipmi_native_wrong_password(app, bmc, device_data):
+    device_data['password'] = 'wrong'
+    with app.app_context():
+        status, run_data = action_runner.run_action(action_type='power', action_data='status', device_data=device_data, browser=None)
+        assert status == 'failure'
+        assert run_data['message'] == 'IPMI error'
+
+
+def test_ipmi_native_bulk_work(app, bmc, client, headers, test_data, monkeypatch):
+    client.post('/api/v1/creds/', headers=headers, json=test_data['creds'])
+    client.post('/api/v1/device/', headers=headers, json={**test_data['device'], 'ipmi_ip': '127.0.0.1'})
+    client.post('/api/v1/action/', headers=headers, json={'name': 'power on', 'action_type': 'power', 'action_data': 'on'})
+    app.config['run_work'] = True
+    monkeypatch.setattr(bulk_handler, 'start_bulk_work', lambda work_id_list: None)
+
+    async def run_ipmitool(*, command_args, device):
+        pytest.fail("ipmitool was run with the native IPMI backend")
+
+    monkeypatch.setattr(bulk_handler, '_run_ipmitool', run_ipmitool)
+    work_list = client.post('/api/v1/work/bulk', headers=headers, json={'action': 'power on', 'device_uids': [test_data['device']['uid']]}).json['works']
+    bulk_handler.run_bulk_work(app, [work['work_id'] for work in work_list])
+
+    assert client.get(f"/api/v1/work/by-id?id={work_list[0]['work_id']}").json['works'][0]['status'] == 'success'
+    execution = client.get(f"/api/v1/execution/all/by-work-id?id={work_list[0]['work_id']}").json['executions'][0]
+    assert execution['run_data'] == {'stdout': "Chassis Power Control: Up/On\n", 'stderr': ""}
+    assert bmc.value == 'on'
@@ -0,0 +1,86 @@
+import re
+import random
+import pytest
+
+import helpers.matcher as matcher_helper
+
+
+def _compile_rule_set(regex_list, flags=0):
+    compiled_rules = []
+    for position, regex in enumerate(regex_list):
+        compiled_regex = re.compile(regex, flags)
+        compiled_rules.append(matcher_helper.CompiledRule(f"rule_{position}", position, compiled_regex, matcher_helper.get_required_literal(compiled_regex)))
+
+    return matcher_helper.CompiledRuleSet(1, compiled_rules, matcher_helper._build_prefilter(compiled_rules))
+
+
+def _find_matching_rule_without_prefilter(text, compiled_rule_set):
+    return next((rule for rule in compiled_rule_set.rules if rule.regex.search(text)), None)
+
+
+@pytest.mark.parametrize('regex', [
+    r'kernel panic|boot failure',
+    r'(no bootable device)?',
+    r'(?:press f2)*',
+    r'F2\s+to\sgo',
+    r'ab',
+])
+def test_required_literal_not_found(regex):
+    assert matcher_helper.get_required_literal(re.compile(regex)) is None
+
+
+@pytest.mark.parametrize('regex, flags, literal', [
+    (r'Kernel panic', 0, 'kernel panic'),
+    (r'kernel panic', re.IGNORECASE, 'kernel panic'),
+    (r'(?i)KERNEL PANIC', 0, 'kernel panic'),
+    (r'Press\s+F2 to enter setup', 0, 'f2 to enter setup'),
+    (r'Boot\.Error\d+', 0, 'boot.error'),
+    (r'(kernel|grub) panic: not syncing', 0, ' panic: not syncing'),
+    (r'(?:no boot device){1,3}', 0, 'no boot device'),
+    (r'(disk )?read error', 0, 'read error'),
+    (r'(grub|lilo) rescue', 0, ' rescue'),
+])
+def test_required_literal_found(regex, flags, literal):
+    assert matcher_helper.get_required_literal(re.compile(regex, flags)) == literal
+
+
+def test_find_matching_rule_with_ignore_case_rule_matches_any_case():
+    compiled_rule_set = _compile_rule_set([r'kernel panic'], re.IGNORECASE)
+
+    assert matcher_helper.find_matching_rule("--- KERNEL PANIC ---", compiled_rule_set).name == 'rule_0'
+    assert matcher_helper.find_matching_rule("all good", compiled_rule_set) is None
+
+
+def test_find_matching_rule_with_prefilter_keeps_rule_position_order():
+    compiled_rule_set = _compile_rule_set([r'read error', r'disk \d read error'])
+
+    assert matcher_helper.find_matching_rule("disk 0 read error", compiled_rule_set).name == 'rule_0'
+
+
+def test_find_matching_rule_with_prefilter_matches_same_rule_as_plain_regex():
+    regex_list = [
+        r'Kernel panic - not syncing',
+        r'(?i)no bootable device',
+        r'Press\s+F(1|2) to (continue|enter setup)',
+        r'Boot\.Error\d+',
+        r'grub|lilo',
+        r'(disk )?read error',
+        r'^Login:',
+        r'[0-9]+ MB OK',
+        r'(?:PXE-E\d\d){2}',
+        r'Ŝtart',
+    ]
+    fragment_list = [
+        'Kernel panic - not syncing', 'KERNEL PANIC - NOT SYNCING', 'No Bootable Device', 'Press  F2 to enter setup',
+        'Press F1 to continue', 'Boot.Error42', 'BootXError42', 'GRUB', 'lilo', 'disk read error', 'Read Error',
+        'Login:', '640 MB OK', 'PXE-E61PXE-E53', 'PXE-E61', 'Ŝtart', 'ŝtart', '\n', ' ', 'pan', 'ic',
+    ]
+    compiled_rule_set = _compile_rule_set(regex_list)
+    assert compiled_rule_set.prefilter is not None
+
+    generator = random.Random(0)
+    for _ in range(2000):
+        text = ''.join(generator.choice(fragment_list) for _ in range(generator.randint(0, 6)))
+        expected_rule = _find_matching_rule_without_prefilter(text, compiled_rule_set)
+        matching_rule = matcher_helper.find_matching_rule(text, compiled_rule_set)
+        assert matching_rule == expected_rule, text
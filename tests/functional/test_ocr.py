@@ -0,0 +1,124 @@
+import io
+import base64
+import pytest
+from PIL import Image
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import helpers.image as image_helper
+import helpers.matcher as matcher_helper
+import handler.ocr as ocr_handler
+
+
+class DeferredExecutor:
+    """Keeps the OCR submitted to the process pool until the test runs it, in the test process where the OCR engine is mocked"""
+
+    def __init__(self, *args, **kwargs):
+        self.job_list = []
+
+    def submit(self, func, *args):
+        future = Future()
+        self.job_list.append((func, args, future))
+        return future
+
+    def run_next(self):
+        func, args, future = self.job_list.pop(0)
+        try:
+            future.set_result(func(*args))
+        except Exception as err:
+            future.set_exception(err)
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class BrokenExecutor:
+    def submit(self, func, *args):
+        raise BrokenProcessPool("A child process terminated abruptly")
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def _get_png(color):
+    output = io.BytesIO()
+    Image.new('RGB', (64, 48), color).save(output, format='PNG')
+    return base64.b64encode(output.getvalue()).decode('ascii')
+
+
+@pytest.fixture()
+def async_ocr(app, monkeypatch, ocr_cache):
+    app.config['async_ocr'] = True
+    executor = DeferredExecutor()
+    matched_state_id_list = []
+    monkeypatch.setattr(ocr_handler, '_executor', executor)
+    monkeypatch.setattr(image_helper, 'tesserocr', None)
+    monkeypatch.setattr(image_helper, '_run_pytesseract', lambda image: f"screen of {image.getpixel((0, 0))}")
+    monkeypatch.setattr(matcher_helper, 'match_state', lambda state: matched_state_id_list.append(state.state_id))
+    yield executor, matched_state_id_list
+
+
+def test_async_ocr_completes_state_and_matches_rules(app, client, headers, test_data, async_ocr):
+    executor, matched_state_id_list = async_ocr
+    response = client.put('/api/v1/state/', headers=headers, json={**test_data['state'], 'screenshot': _get_png((0, 0, 255))})
+    assert response.json['state']['ocr_pending'] is True
+    assert len(executor.job_list) == 1
+
+    executor.run_next()
+    state = client.get(f"/api/v1/state/?id={test_data['state']['state_id']}").json['states'][0]
+    assert state['ocr_text'] == "screen of (0, 0, 255)"
+    assert state['ocr_pending'] is False
+    assert matched_state_id_list == [test_data['state']['state_id']]
+
+
+def test_async_ocr_discards_result_of_changed_screenshot(app, client, headers, test_data, async_ocr):
+    executor, matched_state_id_list = async_ocr
+    client.put('/api/v1/state/', headers=headers, json={**test_data['state'], 'screenshot': _get_png((0, 0, 255))})
+    client.put('/api/v1/state/', headers=headers, json={**test_data['state'], 'screenshot': _get_png((255, 0, 0))})
+
+    # the OCR of the first screenshot completes after the state got the second one
+    executor.run_next()
+    state = client.get(f"/api/v1/state/?id={test_data['state']['state_id']}").json['states'][0]
+    assert state['ocr_text'] == ''
+    assert state['ocr_pending'] is True
+    assert matched_state_id_list == []
+
+    executor.run_next()
+    state = client.get(f"/api/v1/state/?id={test_data['state']['state_id']}").json['states'][0]
+    assert state['ocr_text'] == "screen of (255, 0, 0)"
+    assert matched_state_id_list == [test_data['state']['state_id']]
+
+
+def test_async_ocr_failure_stores_empty_text_and_matches_rules(app, client, headers, test_data, async_ocr, monkeypatch):
+    executor, matched_state_id_list = async_ocr
+
+    def fail_ocr(image):
+        raise RuntimeError("tesseract crashed")
+
+    monkeypatch.setattr(image_helper, '_run_pytesseract', fail_ocr)
+    client.put('/api/v1/state/', headers=headers, json={**test_data['state'], 'screenshot': _get_png((0, 0, 255))})
+    executor.run_next()
+
+    state = client.get(f"/api/v1/state/?id={test_data['state']['state_id']}").json['states'][0]
+    assert state['ocr_text'] == ''
+    assert state['ocr_pending'] is False
+    assert matched_state_id_list == [test_data['state']['state_id']]
+
+
+def test_async_ocr_replaces_broken_process_pool(app, client, headers, test_data, async_ocr, monkeypatch):
+    executor, matched_state_id_list = async_ocr
+    new_executor_list = []
+
+    def start_executor(*args, **kwargs):
+        new_executor_list.append(DeferredExecutor())
+        return new_executor_list[-1]
+
+    monkeypatch.setattr(ocr_handler, '_executor', BrokenExecutor())
+    monkeypatch.setattr(ocr_handler, 'ProcessPoolExecutor', start_executor)
+    client.put('/api/v1/state/', headers=headers, json={**test_data['state'], 'screenshot': _get_png((0, 0, 255))})
+
+    assert len(new_executor_list) == 1
+    assert ocr_handler._executor is new_executor_list[0]
+    new_executor_list[0].run_next()
+    state = client.get(f"/api/v1/state/?id={test_data['state']['state_id']}").json['states'][0]
+    assert state['ocr_text'] == "screen of (0, 0, 255)"
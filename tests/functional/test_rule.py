@@ -1,3 +1,6 @@
+import base64
+
+import helpers.image as image_helper
 
 
 def test_rule_create_endpoint_with_state_id_expect_success(client, headers, test_data):
@@ -32,6 +35,22 @@ def test_rule_create_endpoint_with_screenshot_expect_success(client, headers, te
     assert new_rule['enabled'] == test_data['rule']['enabled']
 
 
+def test_rule_create_endpoint_with_screenshot_uses_ocr_profile_of_model(app, client, headers, test_data, ocr_cache):
+    app.config['ocr_profiles'] = {'iDRAC9': {'crop': [0, 10, 0, 0], 'grayscale': True}}
+    screenshot = base64.b64decode(test_data['state']['screenshot'].encode('ascii'))
+    with app.app_context():
+        profile = image_helper.get_ocr_profile('idrac9')
+        image_helper.cache_ocr_text(image_helper.get_image_hash(screenshot), "text without profile")
+        image_helper.cache_ocr_text(image_helper.get_ocr_cache_key(image_helper.get_image_hash(screenshot), profile), "text with profile")
+
+    assert profile == {'crop': [0, 10, 0, 0], 'grayscale': True}
+    client.post('/api/v1/action/', headers=headers, json=test_data['action'])
+    test_data['rule'].pop('state_id')
+    response = client.post('/api/v1/rule/', headers=headers, json={**test_data['rule'], **{'screenshot': test_data['state']['screenshot'], 'model': 'idrac9'}})
+    assert response.status_code == 200
+    assert response.json['rule']['ocr_text'] == "text with profile"
+
+
 def test_rule_create_endpoint_with_no_state_or_screenshot_failure(client, headers, test_data):
     test_data['rule'].pop('state_id')
     response = client.post('/api/v1/rule/', headers=headers, json=test_data['rule'])
@@ -95,6 +114,47 @@ def test_rule_update_endpoint_expect_success(client, headers, test_data):
     assert new_rule['enabled'] == test_data['rule']['enabled']
 
 
+def test_rule_update_endpoint_rematches_open_states(app, client, headers, test_data, ocr_cache):
+    screenshot = base64.b64decode(test_data['state']['screenshot'].encode('ascii'))
+    with app.app_context():
+        image_helper.cache_ocr_text(image_helper.get_image_hash(screenshot), test_data['state']['ocr_text'])
+
+    client.post('/api/v1/action/', headers=headers, json=test_data['action'])
+    client.put('/api/v1/state/', headers=headers, json=test_data['state'])
+    client.post('/api/v1/rule/', headers=headers, json=test_data['rule'])
+    response = client.get(f"/api/v1/state/?id={test_data['state']['state_id']}")
+    assert response.json['states'][0]['matched_rule'] == test_data['rule']['name']
+
+    client.put('/api/v1/rule/', headers=headers, json={'name': test_data['rule']['name'], 'regex': 'no such screen'})
+    response = client.get(f"/api/v1/state/?id={test_data['state']['state_id']}")
+    assert response.json['states'][0]['matched_rule'] is None
+
+
+def test_rule_changes_rematch_open_states_by_priority(app, client, headers, test_data, ocr_cache):
+    screenshot = base64.b64decode(test_data['state']['screenshot'].encode('ascii'))
+    with app.app_context():
+        image_helper.cache_ocr_text(image_helper.get_image_hash(screenshot), test_data['state']['ocr_text'])
+
+    client.post('/api/v1/action/', headers=headers, json=test_data['action'])
+    client.put('/api/v1/state/', headers=headers, json=test_data['state'])
+    client.post('/api/v1/rule/', headers=headers, json=test_data['rule'])
+    client.post('/api/v1/rule/', headers=headers, json={**test_data['rule'], **{'name': 'second rule', 'regex': 'idrac', 'after_rule': test_data['rule']['name']}})
+    response = client.get(f"/api/v1/state/?id={test_data['state']['state_id']}")
+    assert response.json['states'][0]['matched_rule'] == test_data['rule']['name']
+
+    client.put('/api/v1/rule/', headers=headers, json={'name': 'second rule', 'before_rule': test_data['rule']['name']})
+    response = client.get(f"/api/v1/state/?id={test_data['state']['state_id']}")
+    assert response.json['states'][0]['matched_rule'] == 'second rule'
+
+    client.delete('/api/v1/rule/?name=second rule')
+    response = client.get(f"/api/v1/state/?id={test_data['state']['state_id']}")
+    assert response.json['states'][0]['matched_rule'] == test_data['rule']['name']
+
+    client.put('/api/v1/rule/', headers=headers, json={'name': test_data['rule']['name'], 'enabled': False})
+    response = client.get(f"/api/v1/state/?id={test_data['state']['state_id']}")
+    assert response.json['states'][0]['matched_rule'] is None
+
+
 def test_rule_update_endpoint_expect_both_order_attr_cannot_be_set(client, headers, test_data):
     client.post('/api/v1/action/', headers=headers, json=test_data['action'])
     client.put('/api/v1/state/', headers=headers, json=test_data['state'])
@@ -1,5 +1,12 @@
 import io
+import types
 import base64
+import pytest
+from PIL import Image
+from concurrent.futures import Future
+
+import helpers.image as image_helper
+import handler.ocr as ocr_handler
 
 
 def test_state_create_endpoint_expect_success(client, headers, test_data):
@@ -39,6 +46,209 @@ def test_state_create_endpoint_updates_existing_unresolved_state_expect_success(
     assert response.json['states'][0]['device_uid'] == test_data['device']['uid']
 
 
+def test_state_create_endpoint_uses_cached_ocr_text(app, client, headers, test_data, ocr_cache):
+    screenshot = base64.b64decode(test_data['state']['screenshot'].encode('ascii'))
+    with app.app_context():
+        image_helper.cache_ocr_text(image_helper.get_image_hash(screenshot), "cached text")
+
+    response = client.put('/api/v1/state/', headers=headers, json=test_data['state'])
+    assert response.status_code == 200
+    assert response.json['state']['ocr_text'] == "cached text"
+
+
+def test_state_create_endpoint_uses_ocr_profile_of_device_model(app, client, headers, test_data, ocr_cache):
+    app.config['ocr_profiles'] = {test_data['device']['model'].lower(): {'crop': [0, 10, 0, 0], 'grayscale': True}}
+    client.post('/api/v1/creds/', headers=headers, json=test_data['creds'])
+    client.post('/api/v1/device/', headers=headers, json=test_data['device'])
+    screenshot = base64.b64decode(test_data['state']['screenshot'].encode('ascii'))
+    with app.app_context():
+        profile = image_helper.get_ocr_profile(test_data['device']['model'])
+        image_helper.cache_ocr_text(image_helper.get_image_hash(screenshot), "text without profile")
+        image_helper.cache_ocr_text(image_helper.get_ocr_cache_key(image_helper.get_image_hash(screenshot), profile), "text with profile")
+
+    response = client.put('/api/v1/state/', headers=headers, json=test_data['state'])
+    assert response.status_code == 200
+    assert response.json['state']['ocr_text'] == "text with profile"
+
+
+def test_preprocess_for_ocr_crops_and_binarizes_console():
+    # a gray console with white text pixels, inside a blue border and under a 10px toolbar
+    image = Image.new('RGB', (100, 80), (0, 0, 255))
+    image.paste((40, 40, 40), (10, 20, 90, 70))
+    image.paste((250, 250, 250), (30, 40, 50, 45))
+    image.paste((250, 250, 250), (0, 0, 100, 10))
+
+    processed_image = image_helper.preprocess_for_ocr(image, {'crop': [0, 10, 0, 0], 'trim_border': True, 'threshold': 128, 'invert': True, 'scale': 2})
+    assert processed_image.mode == 'L'
+    assert processed_image.size == (160, 100)
+    assert processed_image.getpixel((0, 0)) == 255
+    assert processed_image.getpixel((60, 45)) == 0
+
+
+def _get_console_png(line_width_list):
+    # a black console with a white bar per text line, 10px high every 14px, a line width of 0 is an empty line
+    image = Image.new('RGB', (200, 14 * len(line_width_list) + 10), (0, 0, 0))
+    for idx, line_width in enumerate(line_width_list):
+        if line_width:
+            image.paste((255, 255, 255), (5, 14 * idx + 10, 5 + line_width, 14 * idx + 20))
+
+    output = io.BytesIO()
+    image.save(output, format='PNG')
+    return output.getvalue()
+
+
+def test_ocr_engine_loads_tesserocr_once_per_thread(app, monkeypatch, ocr_cache):
+    loaded_api_list = []
+
+    class PyTessBaseAPI:
+        def __init__(self):
+            loaded_api_list.append(self)
+
+        def SetImage(self, image):
+            self.image = image
+
+        def GetUTF8Text(self):
+            return f"tesserocr {self.image.height}px"
+
+    monkeypatch.setattr(image_helper, 'tesserocr', types.SimpleNamespace(PyTessBaseAPI=PyTessBaseAPI))
+    with app.app_context():
+        assert image_helper.get_ocr_engine() == 'tesserocr'
+        assert image_helper.get_ocr_text(_get_console_png([100])) == "tesserocr 24px"
+        assert image_helper.get_ocr_text(_get_console_png([100, 50])) == "tesserocr 38px"
+        assert len(loaded_api_list) == 1
+
+        app.config['ocr_engine'] = 'pytesseract'
+        assert image_helper.get_ocr_engine() == 'pytesseract'
+
+
+def test_ocr_engine_falls_back_to_pytesseract(app, monkeypatch, ocr_cache):
+    monkeypatch.setattr(image_helper, '_run_pytesseract', lambda image: "pytesseract text")
+    monkeypatch.setattr(image_helper, 'tesserocr', None)
+    with app.app_context():
+        assert image_helper.get_ocr_engine() == 'pytesseract'
+        assert image_helper.get_ocr_text(_get_console_png([100])) == "pytesseract text"
+
+    # tesserocr is selected but not installed
+    assert image_helper.run_ocr(_get_console_png([100]), engine='tesserocr') == "pytesseract text"
+
+    def fail_to_load():
+        raise RuntimeError("Failed to init API, possibly an invalid tessdata path")
+
+    monkeypatch.setattr(image_helper, 'tesserocr', types.SimpleNamespace(PyTessBaseAPI=fail_to_load))
+    assert image_helper.run_ocr(_get_console_png([100]), engine='tesserocr') == "pytesseract text"
+    assert getattr(image_helper._tesserocr_local, 'api', None) is None
+
+
+def test_incremental_ocr_only_reads_changed_text_bands(app, monkeypatch, ocr_cache):
+    app.config['incremental_ocr'] = True
+    ocr_band_list = []
+
+    def run_pytesseract(image):
+        ocr_band_list.append(image)
+        return f"line of {image.getbbox()[2] - image.getbbox()[0]}px\n"
+
+    monkeypatch.setattr(image_helper, '_run_pytesseract', run_pytesseract)
+    monkeypatch.setattr(image_helper, 'tesserocr', None)
+
+    with app.app_context():
+        assert image_helper.get_ocr_text(_get_console_png([100, 50, 80])) == "line of 100px\nline of 50px\nline of 80px"
+        assert len(ocr_band_list) == 3
+        assert all(band.height == 14 for band in ocr_band_list)
+
+        # a countdown changed the second line only
+        assert image_helper.get_ocr_text(_get_console_png([100, 60, 80])) == "line of 100px\nline of 60px\nline of 80px"
+        assert len(ocr_band_list) == 4
+
+
+class InlineExecutor:
+    """Runs the OCR of the process pool in the test process, where the OCR engine is mocked"""
+
+    def submit(self, func, *args):
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+
+@pytest.mark.parametrize('async_ocr', [False, True])
+def test_incremental_ocr_text_matches_multi_line_rule(app, client, headers, test_data, monkeypatch, ocr_cache, async_ocr):
+    app.config['incremental_ocr'] = True
+    app.config['async_ocr'] = async_ocr
+    monkeypatch.setattr(image_helper, '_run_pytesseract', lambda image: f"line of {image.getbbox()[2] - image.getbbox()[0]}px\n")
+    monkeypatch.setattr(image_helper, 'tesserocr', None)
+    monkeypatch.setattr(ocr_handler, '_get_executor', lambda replace_broken=False: InlineExecutor())
+
+    # a rule written against the whole page text, where an empty line of the screen is an empty line of the text
+    screenshot = base64.b64decode(test_data['state']['screenshot'].encode('ascii'))
+    with app.app_context():
+        image_helper.cache_ocr_text(image_helper.get_image_hash(screenshot), test_data['state']['ocr_text'])
+    client.post('/api/v1/action/', headers=headers, json=test_data['action'])
+    test_data['rule'].pop('state_id')
+    client.post('/api/v1/rule/', headers=headers, json={
+        **test_data['rule'],
+        **{'screenshot': test_data['state']['screenshot'], 'regex': r"line of 100px\nline of 50px\n\nline of 80px"}
+    })
+
+    console_screenshot = base64.b64encode(_get_console_png([100, 50, 0, 80])).decode('ascii')
+    client.put('/api/v1/state/', headers=headers, json={**test_data['state'], 'screenshot': console_screenshot})
+    state = client.get(f"/api/v1/state/?id={test_data['state']['state_id']}").json['states'][0]
+    assert state['ocr_text'] == "line of 100px\nline of 50px\n\nline of 80px"
+    assert state['matched_rule'] == test_data['rule']['name']
+
+
+@pytest.mark.parametrize('max_distance', [0, 4])
+def test_state_create_endpoint_with_seen_again_screenshot_only_updates_last_seen(app, client, headers, test_data, ocr_cache, max_distance):
+    app.config['duplicate_screenshot_max_distance'] = max_distance
+    screenshot = base64.b64decode(test_data['state']['screenshot'].encode('ascii'))
+    with app.app_context():
+        image_helper.cache_ocr_text(image_helper.get_image_hash(screenshot), "first text")
+
+    first_state = client.put('/api/v1/state/', headers=headers, json=test_data['state']).json['state']
+
+    image_helper.clear_ocr_cache()
+    with app.app_context():
+        image_helper.cache_ocr_text(image_helper.get_image_hash(screenshot), "second text")
+
+    seen_again_state = client.put('/api/v1/state/', headers=headers, json=test_data['state']).json['state']
+    assert seen_again_state['ocr_text'] == "first text"
+    assert seen_again_state['last_updated'] == first_state['last_updated']
+    assert seen_again_state['last_seen'] > first_state['last_seen']
+
+    app.config['duplicate_screenshot_max_distance'] = -1
+    updated_state = client.put('/api/v1/state/', headers=headers, json=test_data['state']).json['state']
+    assert updated_state['ocr_text'] == "second text"
+
+
+def test_state_create_endpoint_with_changed_text_line_runs_ocr(app, client, headers, test_data, ocr_cache):
+    app.config['duplicate_screenshot_max_distance'] = 0
+    first_screenshot = _get_console_png([100, 50, 80])
+    # a slightly longer second line, which the difference hash does not see
+    second_screenshot = _get_console_png([100, 52, 80])
+    assert image_helper.get_hash_distance(
+        image_helper.get_screenshot_hash(Image.open(io.BytesIO(first_screenshot))),
+        image_helper.get_screenshot_hash(Image.open(io.BytesIO(second_screenshot)))
+    ) == 0
+
+    with app.app_context():
+        image_helper.cache_ocr_text(image_helper.get_image_hash(first_screenshot), "Booting in 10 seconds")
+        image_helper.cache_ocr_text(image_helper.get_image_hash(second_screenshot), "No boot device available - strike F1")
+
+    first_state = client.put('/api/v1/state/', headers=headers, json={**test_data['state'], 'screenshot': image_helper.encode_image(first_screenshot)}).json['state']
+    second_state = client.put('/api/v1/state/', headers=headers, json={**test_data['state'], 'screenshot': image_helper.encode_image(second_screenshot)}).json['state']
+    assert second_state['ocr_text'] == "No boot device available - strike F1"
+    assert second_state['screenshot'] == image_helper.encode_image(second_screenshot)
+    assert second_state['last_updated'] > first_state['last_updated']
+
+
+def test_screenshot_hash_distance():
+    image = Image.open(io.BytesIO(_get_console_png([100, 50, 80])))
+    screenshot_hash = image_helper.get_screenshot_hash(image)
+    assert len(screenshot_hash) == image_helper.SCREENSHOT_HASH_SIZE ** 2 // 4
+
+    assert image_helper.get_hash_distance(screenshot_hash, image_helper.get_screenshot_hash(image.convert('L'))) == 0
+    other_hash = image_helper.get_screenshot_hash(Image.open(io.BytesIO(_get_console_png([20, 190, 150]))))
+    assert image_helper.get_hash_distance(screenshot_hash, other_hash) > 0
+
+
 def test_state_create_endpoint_with_file_expect_success(client, headers, test_data):
     data = {'screenshot': (io.BytesIO(base64.b64decode(test_data['state']['screenshot'].encode('ascii'))), "screenshot.png")}
     response = client.post(f"/api/v1/state/?device_uid={test_data['state']['device_uid']}", data=data)
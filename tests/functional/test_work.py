@@ -1,3 +1,17 @@
+import os
+import time
+import pytest
+from freezegun import freeze_time
+from datetime import datetime, timedelta
+from selenium.webdriver.common.keys import Keys
+
+from models.work import WorkLastAssigned
+import services.work as work_service
+import handler.bulk as bulk_handler
+import handler.work as work_handler
+import handler.action_runner as action_runner
+import handler.console as console_helper
+import handler.console_pool as console_pool
 
 
 def test_work_create_endpoint_expect_success(client, headers, test_data):
@@ -13,6 +27,7 @@ def test_work_create_endpoint_expect_success(client, headers, test_data):
     assert new_work['device_uid'] == test_data['device']['uid']
     assert new_work['actions'][0]['name'] == test_data['action']['name']
     assert new_work['trigger'] == f"Manual - Rule: {test_data['rule']['name']}"
+    assert new_work['priority'] == work_service.MANUAL_WORK_PRIORITY
 
 
 def test_work_create_endpoint_no_rule_expect_success(client, headers, test_data):
@@ -98,6 +113,359 @@ def test_work_assign_endpoint_expect_success(client, headers, test_data):
     assert assignment['device_data']['password'] == test_data['creds']['password']
 
 
+def test_work_claim_expect_single_claimer(app, client, headers, test_data):
+    client.post('/api/v1/creds/', headers=headers, json=test_data['creds'])
+    client.post('/api/v1/device/', headers=headers, json=test_data['device'])
+    client.post('/api/v1/action/', headers=headers, json=test_data['action'])
+    test_data['work'].pop('rule')
+    client.post('/api/v1/work/', headers=headers, json=test_data['work'])
+
+    with app.app_context():
+        assert work_service.claim(test_data['work']['work_id']) is True
+        assert work_service.claim(test_data['work']['work_id']) is False
+
+    response = client.post('/api/v1/work/assign')
+    assert response.status_code == 200
+    assert response.json['assignment'] is None
+
+
+def test_work_get_assignment_by_resource_class(app, client, headers, test_data):
+    client.post('/api/v1/creds/', headers=headers, json=test_data['creds'])
+    client.post('/api/v1/device/', headers=headers, json=test_data['device'])
+    client.post('/api/v1/action/', headers=headers, json=test_data['action'])
+    test_data['work'].pop('rule')
+    client.post('/api/v1/work/', headers=headers, json=test_data['work'])
+
+    with app.app_context():
+        assert work_service.get_assignment(requires_console=True) is None
+        assignment = work_service.get_assignment(requires_console=False)
+        assert assignment['work_id'] == test_data['work']['work_id']
+        assert assignment['requires_console'] is False
+
+
+def test_work_get_assignment_by_priority_and_fairness(app, client, headers, test_data):
+    client.post('/api/v1/creds/', headers=headers, json=test_data['creds'])
+    client.post('/api/v1/device/', headers=headers, json=test_data['device'])
+    client.post('/api/v1/device/', headers=headers, json={**test_data['device'], 'uid': 'other uid'})
+    client.post('/api/v1/action/', headers=headers, json=test_data['action'])
+
+    def work_data(device_uid, trigger, priority):
+        return {
+            'state_id': None,
+            'device_uid': device_uid,
+            'actions': [{'name': 'test action', 'type': 'ipmitool', 'data': 'lan print'}],
+            'trigger': trigger,
+            'requires_console': False,
+            'priority': priority
+        }
+
+    with app.app_context():
+        work_service.create_many([
+            work_data('test uid', 'zombie screenshot', work_service.ZOMBIE_SCREENSHOT_WORK_PRIORITY),
+            work_data('test uid', 'Rule - noisy rule', work_service.RULE_WORK_PRIORITY),
+            work_data('test uid', 'Rule - noisy rule', work_service.RULE_WORK_PRIORITY),
+            work_data('other uid', 'Rule - other rule', work_service.RULE_WORK_PRIORITY),
+            work_data('other uid', 'Manual - Actions: test action', work_service.MANUAL_WORK_PRIORITY)
+        ])
+
+        assignment_list = [work_service.get_assignment() for _ in range(5)]
+        assert [(assignment['device_data']['uid'], assignment['trigger']) for assignment in assignment_list] == [
+            ('other uid', 'Manual - Actions: test action'),
+            ('test uid', 'Rule - noisy rule'),
+            ('other uid', 'Rule - other rule'),
+            ('test uid', 'Rule - noisy rule'),
+            ('test uid', 'zombie screenshot')
+        ]
+
+
+def test_work_get_assignment_fairness_with_work_history(app, client, headers, test_data):
+    client.post('/api/v1/creds/', headers=headers, json=test_data['creds'])
+    client.post('/api/v1/device/', headers=headers, json=test_data['device'])
+    client.post('/api/v1/device/', headers=headers, json={**test_data['device'], 'uid': 'other uid'})
+
+    def work_data(device_uid, trigger):
+        return {
+            'state_id': None,
+            'device_uid': device_uid,
+            'actions': [{'name': 'test action', 'type': 'ipmitool', 'data': 'lan print'}],
+            'trigger': trigger,
+            'requires_console': False,
+            'priority': work_service.RULE_WORK_PRIORITY
+        }
+
+    with app.app_context():
+        with freeze_time(datetime.now() - timedelta(days=2)):
+            work_service.create_many_claimed([work_data('other uid', 'Rule - other rule')] * 5000)
+        with freeze_time(datetime.now() - timedelta(days=1)):
+            work_service.create_many_claimed([work_data('test uid', 'Rule - noisy rule')] * 5000)
+
+        work_service.create_many([work_data('test uid', 'Rule - noisy rule')])
+        work_service.create_many([work_data('other uid', 'Rule - other rule')])
+
+        assignment_list = [work_service.get_assignment() for _ in range(3)]
+        assert [(assignment['device_data']['uid'], assignment['trigger']) for assignment in assignment_list[:2]] == [
+            ('other uid', 'Rule - other rule'),
+            ('test uid', 'Rule - noisy rule')
+        ]
+        assert assignment_list[2] is None
+        # one last assignment per device and per trigger, however long the work history is
+        assert app.session.query(WorkLastAssigned).count() == 4
+
+
+def test_work_bulk_endpoint_runs_action_on_selected_devices(app, client, headers, test_data, tmp_path, monkeypatch):
+    client.post('/api/v1/creds/', headers=headers, json=test_data['creds'])
+    for idx in range(20):
+        client.post('/api/v1/device/', headers=headers, json={**test_data['device'], 'uid': f"bulk uid {idx}", 'metadata': {'rack': 'a'}})
+    client.post('/api/v1/device/', headers=headers, json={**test_data['device'], 'metadata': {'rack': 'b'}})
+    client.post('/api/v1/action/', headers=headers, json={'name': 'power cycle', 'action_type': 'power', 'action_data': 'cycle'})
+    started_work_id_list = []
+    app.config['run_work'] = True
+    monkeypatch.setattr(bulk_handler, 'start_bulk_work', started_work_id_list.extend)
+
+    response = client.post('/api/v1/work/bulk', headers=headers, json={'action': 'power cycle', 'metadata': {'rack': 'a'}})
+    assert response.status_code == 200
+    assert len(response.json['works']) == 20
+    assert response.json['skipped_devices'] == []
+    assert all(work['trigger'] == 'Bulk - Actions: power cycle' and work['assigned'] for work in response.json['works'])
+    assert started_work_id_list == [work['work_id'] for work in response.json['works']]
+
+    # A stand-in for the ipmitool binary which takes a while to answer, like a real BMC
+    ipmitool = tmp_path / 'ipmitool'
+    ipmitool.write_text('#!/bin/sh\nsleep 0.2\necho "Chassis Power Control: $(echo "$@" | cut -d" " -f12)"\n')
+    ipmitool.chmod(0o755)
+    monkeypatch.setenv('PATH', f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    app.config['bulk_ipmi_concurrency'] = 10
+
+    start_time = time.time()
+    bulk_handler.run_bulk_work(app, [work['work_id'] for work in response.json['works']])
+    # 20 works of 0.2 seconds each take 4 seconds when run one by one
+    assert time.time() - start_time < 2
+
+    for work in response.json['works']:
+        work_response = client.get(f"/api/v1/work/by-id?id={work['work_id']}")
+        assert work_response.json['works'][0]['status'] == 'success'
+
+        execution_response = client.get(f"/api/v1/execution/all/by-work-id?id={work['work_id']}")
+        assert len(execution_response.json['executions']) == 1
+        assert execution_response.json['executions'][0]['action_name'] == 'power cycle'
+        assert execution_response.json['executions'][0]['run_data']['stdout'] == "Chassis Power Control: cycle\n"
+
+
+def test_work_bulk_failing_work_does_not_cancel_other_works(app, client, headers, test_data, monkeypatch):
+    client.post('/api/v1/creds/', headers=headers, json=test_data['creds'])
+    for idx in range(3):
+        client.post('/api/v1/device/', headers=headers, json={**test_data['device'], 'uid': f"bulk uid {idx}"})
+    client.post('/api/v1/action/', headers=headers, json={'name': 'power cycle', 'action_type': 'power', 'action_data': 'cycle'})
+    app.config['run_work'] = True
+    monkeypatch.setattr(bulk_handler, 'start_bulk_work', lambda work_id_list: None)
+    work_list = client.post('/api/v1/work/bulk', headers=headers, json={'action': 'power cycle', 'device_uids': [f"bulk uid {idx}" for idx in range(3)]}).json['works']
+    work_id_by_uid = {work['device_uid']: work['work_id'] for work in work_list}
+
+    async def run_ipmitool(*, command_args, device):
+        if device['uid'] == 'bulk uid 0':
+            raise RuntimeError("ipmitool crashed")
+        return 'success', {'stdout': '', 'stderr': ''}
+
+    monkeypatch.setattr(bulk_handler, '_run_ipmitool', run_ipmitool)
+    # the work was already completed (e.g. by fail_stuck_work) while ipmitool ran
+    with app.app_context():
+        work_service.complete_by_id(work_id=work_id_by_uid['bulk uid 1'], status='failure')
+
+    bulk_handler.run_bulk_work(app, list(work_id_by_uid.values()))
+
+    work_status_by_uid = {
+        uid: client.get(f"/api/v1/work/by-id?id={work_id}").json['works'][0]['status'] for uid, work_id in work_id_by_uid.items()
+    }
+    assert work_status_by_uid == {'bulk uid 0': 'failure', 'bulk uid 1': 'failure', 'bulk uid 2': 'success'}
+
+
+def test_work_bulk_endpoint_without_run_work_leaves_works_for_executors(app, client, headers, test_data, monkeypatch):
+    client.post('/api/v1/creds/', headers=headers, json=test_data['creds'])
+    for idx in range(2):
+        client.post('/api/v1/device/', headers=headers, json={**test_data['device'], 'uid': f"bulk uid {idx}"})
+    client.post('/api/v1/action/', headers=headers, json={'name': 'power cycle', 'action_type': 'power', 'action_data': 'cycle'})
+    monkeypatch.setattr(bulk_handler, 'start_bulk_work', lambda work_id_list: pytest.fail("bulk work started without run_work"))
+
+    response = client.post('/api/v1/work/bulk', headers=headers, json={'action': 'power cycle', 'device_uids': ['bulk uid 0', 'bulk uid 1']})
+    assert response.status_code == 200
+    assert [work['assigned'] for work in response.json['works']] == [None, None]
+
+    assignment_list = [client.post('/api/v1/work/assign').json['assignment'] for _ in range(3)]
+    assert sorted(assignment['work_id'] for assignment in assignment_list[:2]) == sorted(work['work_id'] for work in response.json['works'])
+    assert assignment_list[2] is None
+
+
+def test_work_bulk_endpoint_skips_devices_with_pending_work(client, headers, test_data):
+    client.post('/api/v1/creds/', headers=headers, json=test_data['creds'])
+    client.post('/api/v1/device/', headers=headers, json=test_data['device'])
+    client.post('/api/v1/action/', headers=headers, json=test_data['action'])
+    test_data['work'].pop('rule')
+    client.post('/api/v1/work/', headers=headers, json=test_data['work'])
+
+    response = client.post('/api/v1/work/bulk', headers=headers, json={'action': test_data['action']['name'], 'device_uids': [test_data['device']['uid']]})
+    assert response.status_code == 200
+    assert response.json['works'] == []
+    assert response.json['skipped_devices'] == [test_data['device']['uid']]
+
+
+def test_work_bulk_endpoint_expect_requires_device_selector(client, headers, test_data):
+    client.post('/api/v1/action/', headers=headers, json=test_data['action'])
+    response = client.post('/api/v1/work/bulk', headers=headers, json={'action': test_data['action']['name']})
+    assert response.status_code == 422
+    assert response.json['message'] == "One of 'device_uids', 'metadata' or 'zombie' must be set for bulk work"
+
+
+def test_work_bulk_endpoint_expect_action_not_supported(client, headers, test_data):
+    client.post('/api/v1/action/', headers=headers, json={'name': 'press enter', 'action_type': 'keystroke', 'action_data': 'keys.ENTER'})
+    response = client.post('/api/v1/work/bulk', headers=headers, json={'action': 'press enter', 'zombie': True})
+    assert response.status_code == 422
+    assert response.json['message'] == "Action 'press enter' of type 'keystroke' is not supported for bulk work"
+
+
+def test_work_sleep_action_parks_work(app, client, headers, test_data):
+    client.post('/api/v1/creds/', headers=headers, json=test_data['creds'])
+    client.post('/api/v1/device/', headers=headers, json=test_data['device'])
+    client.post('/api/v1/action/', headers=headers, json={'name': 'long sleep', 'action_type': 'sleep', 'action_data': '300'})
+    client.post('/api/v1/action/', headers=headers, json={'name': 'short sleep', 'action_type': 'sleep', 'action_data': '0'})
+    response = client.post('/api/v1/work/', headers=headers, json={'device_uid': test_data['device']['uid'], 'actions': ['long sleep', 'short sleep']})
+    work_id = response.json['work']['work_id']
+
+    with app.app_context():
+        start_time = time.time()
+        work_handler.run_work_assignment(**work_service.get_assignment())
+        assert time.time() - start_time < 5
+
+        work = work_service.get_by_id(work_id)
+        assert work.status == 'PENDING'
+        assert work.assigned is None
+        assert work.actions_completed == 1
+        assert work.resume_at > datetime.now() + timedelta(seconds=290)
+        # Parked work is not claimed before it should resume
+        assert work_service.get_assignment() is None
+
+        with freeze_time(datetime.now() + timedelta(seconds=301)):
+            assignment = work_service.get_assignment()
+            assert assignment['actions_completed'] == 1
+            work_handler.run_work_assignment(**assignment)
+
+        assert work_service.get_by_id(work_id).status == 'success'
+
+    response = client.get(f"/api/v1/execution/all/by-work-id?id={work_id}")
+    assert [execution['action_name'] for execution in response.json['executions']] == ['long sleep', 'short sleep']
+    assert response.json['executions'][0]['run_data']['message'] == "Parked work for 300 seconds"
+
+
+class KeystrokeBrowser:
+    w3c = True
+    current_url = 'https://bmc/console'
+    window_handles = ['console']
+
+    def execute(self, command, params):
+        pass
+
+
+def test_work_console_works_of_device_run_in_one_console(app, client, headers, test_data, monkeypatch):
+    opened_list = []
+
+    def open_console(**device_data):
+        opened_list.append(KeystrokeBrowser())
+        return opened_list[-1]
+
+    monkeypatch.setattr(console_helper, 'open_console', open_console)
+    monkeypatch.setattr(console_helper, 'close_console', lambda *, browser, model: None)
+    app.config['pause_between_keys'] = 0
+    app.config['pause_between_chars'] = 0
+
+    client.post('/api/v1/creds/', headers=headers, json=test_data['creds'])
+    client.post('/api/v1/device/', headers=headers, json=test_data['device'])
+    client.post('/api/v1/action/', headers=headers, json={'name': 'press enter', 'action_type': 'keystroke', 'action_data': 'keys.ENTER'})
+    response = client.post('/api/v1/work/', headers=headers, json={'device_uid': test_data['device']['uid'], 'actions': ['press enter']})
+    manual_work_id = response.json['work']['work_id']
+
+    with app.app_context():
+        work_service.create_many([
+            {
+                'state_id': None,
+                'device_uid': test_data['device']['uid'],
+                'actions': [{'name': 'press enter', 'type': 'keystroke', 'data': 'keys.ENTER'}],
+                'trigger': 'zombie screenshot',
+                'requires_console': True,
+                'priority': work_service.ZOMBIE_SCREENSHOT_WORK_PRIORITY
+            }
+        ])
+
+        work_handler.run_work_assignment(**work_service.get_assignment())
+
+        work_list = work_service.get_all_by_device(test_data['device']['uid'])
+        assert [work.status for work in work_list] == ['success', 'success']
+        assert work_service.get_assignment() is None
+
+    # both works ran in the console opened for the first one, and each has its own execution
+    assert len(opened_list) == 1
+    for work in work_list:
+        response = client.get(f"/api/v1/execution/all/by-work-id?id={work.work_id}")
+        assert [execution['action_name'] for execution in response.json['executions']] == ['press enter']
+    assert work_list[0].work_id == manual_work_id
+
+    app.config['console_session_ttl'] = 0
+    console_pool.close_expired_consoles(app)
+
+
+def test_work_failing_console_work_closes_console_and_fails_only_that_work(app, client, headers, test_data, monkeypatch):
+    closed_list = []
+    monkeypatch.setattr(console_helper, 'open_console', lambda **device_data: KeystrokeBrowser())
+    monkeypatch.setattr(console_helper, 'close_console', lambda *, browser, model: closed_list.append(browser))
+    app.config['pause_between_keys'] = 0
+    app.config['pause_between_chars'] = 0
+
+    client.post('/api/v1/creds/', headers=headers, json=test_data['creds'])
+    client.post('/api/v1/device/', headers=headers, json=test_data['device'])
+    client.post('/api/v1/action/', headers=headers, json={'name': 'press enter', 'action_type': 'keystroke', 'action_data': 'keys.ENTER'})
+    client.post('/api/v1/action/', headers=headers, json={'name': 'press escape', 'action_type': 'keystroke', 'action_data': 'keys.ESCAPE'})
+    client.post('/api/v1/work/', headers=headers, json={'device_uid': test_data['device']['uid'], 'actions': ['press enter']})
+    with app.app_context():
+        work_service.create_many([
+            {
+                'state_id': None,
+                'device_uid': test_data['device']['uid'],
+                'actions': [{'name': action_name, 'type': 'keystroke', 'data': action_data}],
+                'trigger': trigger,
+                'requires_console': True,
+                'priority': priority
+            }
+            for action_name, action_data, trigger, priority in [
+                ('press escape', 'keys.ESCAPE', 'Rule - test rule', work_service.RULE_WORK_PRIORITY),
+                ('press enter', 'keys.ENTER', 'zombie screenshot', work_service.ZOMBIE_SCREENSHOT_WORK_PRIORITY)
+            ]
+        ])
+        work_id_list = [work.work_id for work in work_service.get_all_by_device(test_data['device']['uid'])]
+
+    run_action = action_runner.run_action
+
+    def run_action_failing_on_escape(*, action_type, action_data, device_data, browser):
+        if action_data[0].keys == Keys.ESCAPE:
+            raise RuntimeError("browser crashed")
+        return run_action(action_type=action_type, action_data=action_data, device_data=device_data, browser=browser)
+
+    monkeypatch.setattr(action_runner, 'run_action', run_action_failing_on_escape)
+
+    with app.app_context():
+        work_handler.run_work_assignment(**work_service.get_assignment())
+
+        # the failed batched work is completed and its console is closed, the next work is left for a new console
+        assert [work_service.get_by_id(work_id).status for work_id in work_id_list] == ['success', 'failure', 'PENDING']
+        assert work_service.get_by_id(work_id_list[2]).assigned is None
+        assert len(closed_list) == 1
+        assert console_pool._in_use_count == 0
+
+        # a work completed by someone else while it ran does not leak the console
+        assignment = work_service.get_assignment()
+        work_service.complete_by_id(work_id=assignment['work_id'], status='failure')
+        work_handler.run_work_assignment(**assignment)
+        assert len(closed_list) == 2
+        assert console_pool._in_use_count == 0
+
+
 def test_work_assign_endpoint_with_params_expect_success(client, headers, test_data):
     client.post('/api/v1/creds/', headers=headers, json=test_data['creds'])
     client.post('/api/v1/device/', headers=headers, json=test_data['device'])
@@ -124,6 +492,16 @@ def test_work_assign_endpoint_with_params_expect_success(client, headers, test_d
     assert assignment['device_data']['password'] == test_data['creds']['password']
 
 
+def test_work_assign_endpoint_with_keystroke_action_expect_text_data(client, headers, test_data):
+    client.post('/api/v1/creds/', headers=headers, json=test_data['creds'])
+    client.post('/api/v1/device/', headers=headers, json=test_data['device'])
+    client.post('/api/v1/action/', headers=headers, json={'name': 'type password', 'action_type': 'keystroke', 'action_data': '{cred::password};keys.ENTER'})
+    client.post('/api/v1/work/', headers=headers, json={'device_uid': test_data['device']['uid'], 'actions': ['type password']})
+    response = client.post('/api/v1/work/assign')
+    assert response.status_code == 200
+    assert response.json['assignment']['action_list'][0]['data'] == f"{test_data['creds']['password']};keys.ENTER"
+
+
 def test_work_assign_endpoint_with_missing_metadata_expect_work_failure(client, headers, test_data):
     client.post('/api/v1/creds/', headers=headers, json=test_data['creds'])
     client.post('/api/v1/device/', headers=headers, json={**test_data['device'], **{'metadata': {}}})